@@ -0,0 +1,290 @@
+"""
+Índice aproximado (IVF) para galerías muy grandes.
+
+La galería se reparte en `n_lists` listas invertidas según el centroide más
+cercano (k-means sobre una muestra). Para cada consulta solo se revisan las
+`nprobe` listas cuyos centroides están más cerca, y los candidatos se
+re-ordenan con la distancia euclídea exacta sobre la galería float32. Así la
+distancia devuelta es la real y TOLERANCE significa lo mismo que en la
+búsqueda exhaustiva; lo único aproximado es que el vecino más cercano podría
+estar en una lista no revisada (más `nprobe` = más recall y más latencia).
+
+Se guarda junto a la galería (o, si la galería no vive en un directorio
+propio, como la de SQLite o una compactada, en el directorio que se indique):
+  ivf.json              versión, listas, filas indexadas, huella (SHA-1 de todas las filas)
+  ivf_centroids.npy     centroides float32 (n_lists x 128)
+  ivf_assignments.npy   lista de cada fila de la galería (int32)
+
+Si la galería creció (se añadieron filas al final) solo se asignan las filas
+nuevas; si cambió de otra forma, el índice se reconstruye.
+
+Uso como script:
+  python scripts/ann_index.py build [--lists 1024]
+  python scripts/ann_index.py eval [--nprobe 1 4 8 16]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from gallery import Gallery, _save_npy_atomic
+
+INDEX_VERSION = 1
+INDEX_FILE = "ivf.json"
+CENTROIDS_FILE = "ivf_centroids.npy"
+ASSIGNMENTS_FILE = "ivf_assignments.npy"
+
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+SAMPLES_PER_LIST = 64  # muestra de entrenamiento de k-means por lista
+CHUNK_ROWS = 65536
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+def default_lists(count):
+    """Número de listas razonable para `count` filas (~4 * sqrt(N))."""
+    return int(max(1, min(count, round(4 * np.sqrt(count)))))
+
+
+def running_digests(encodings, counts):
+    """
+    Huellas SHA-1 de las primeras `c` filas para cada `c` de `counts`, en una
+    sola pasada por bloques. Se hashean todas las filas: cualquier cambio, en
+    cualquier posición, cambia la huella.
+    """
+    hasher = hashlib.sha1()
+    digests = {}
+    done = 0
+    for count in sorted(set(counts)):
+        for start in range(done, count, CHUNK_ROWS):
+            block = np.ascontiguousarray(encodings[start:min(start + CHUNK_ROWS, count)], dtype=np.float32)
+            hasher.update(block.tobytes())
+        done = count
+        digests[count] = hasher.hexdigest() if count else ""
+    return [digests[count] for count in counts]
+
+
+def gallery_digest(encodings, count):
+    """Huella de las primeras `count` filas (todas, no una muestra)."""
+    return running_digests(encodings, [count])[0]
+
+
+def _nearest(points, centroids, centroid_norms):
+    """Índice del centroide más cercano a cada punto, por bloques."""
+    nearest = np.empty(len(points), dtype=np.int32)
+    for start in range(0, len(points), CHUNK_ROWS):
+        block = np.asarray(points[start:start + CHUNK_ROWS], dtype=np.float32)
+        # ||x||^2 es constante por fila: no afecta al argmin
+        d2 = block @ centroids.T
+        d2 *= -2.0
+        d2 += centroid_norms
+        nearest[start:start + CHUNK_ROWS] = np.argmin(d2, axis=1)
+    return nearest
+
+
+def kmeans(points, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """k-means (Lloyd) en NumPy. Los clusters vacíos se re-siembran con puntos al azar."""
+    rng = np.random.default_rng(seed)
+    points = np.asarray(points, dtype=np.float32)
+    centroids = points[rng.choice(len(points), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        norms = np.einsum("ij,ij->i", centroids, centroids)
+        assign = _nearest(points, centroids, norms)
+        counts = np.bincount(assign, minlength=n_lists)
+        sums = np.stack([np.bincount(assign, weights=points[:, d], minlength=n_lists)
+                         for d in range(points.shape[1])], axis=1)
+        filled = counts > 0
+        centroids[filled] = (sums[filled] / counts[filled, np.newaxis]).astype(np.float32)
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = points[rng.choice(len(points), size=len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, assignments, digest=""):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.digest = digest
+        self._lists = None  # (offsets, rows) ordenados por lista; se recalculan al añadir
+
+    def __len__(self):
+        return len(self.assignments)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, encodings, n_lists=None, iterations=KMEANS_ITERATIONS, seed=0):
+        count = len(encodings)
+        n_lists = default_lists(count) if n_lists is None else max(1, min(n_lists, count))
+        rng = np.random.default_rng(seed)
+        sample_size = min(count, n_lists * SAMPLES_PER_LIST)
+        sample_rows = np.sort(rng.choice(count, size=sample_size, replace=False))
+        centroids = kmeans(np.asarray(encodings[sample_rows], dtype=np.float32), n_lists, iterations, seed)
+        index = cls(centroids, np.empty(0, dtype=np.int32))
+        index.add(encodings)
+        return index
+
+    def add(self, encodings, digest=None):
+        """
+        Asigna filas nuevas (añadidas al final de la galería) a sus listas.
+        `digest` es la huella de `encodings` completa si ya se calculó.
+        """
+        start = len(self.assignments)
+        new = _nearest(encodings[start:], self.centroids, self.centroid_norms)
+        self.assignments = np.concatenate([self.assignments, new])
+        self.digest = digest if digest is not None else gallery_digest(encodings, len(self.assignments))
+        self._lists = None
+        return len(new)
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            rows = np.argsort(self.assignments, kind="stable")
+            offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.assignments, minlength=self.n_lists), out=offsets[1:])
+            self._lists = (offsets, rows)
+        return self._lists
+
+    def search(self, queries, matrix, sq_norms, nprobe=DEFAULT_NPROBE):
+        """
+        Mejor fila y distancia al cuadrado exacta para cada consulta, mirando
+        solo las `nprobe` listas más cercanas. -1/inf si no hay candidatos.
+        """
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        offsets, rows = self._inverted_lists()
+        nprobe = max(1, min(nprobe, self.n_lists))
+        c_d2 = q @ self.centroids.T
+        c_d2 *= -2.0
+        c_d2 += self.centroid_norms
+        if nprobe < self.n_lists:
+            probes = np.argpartition(c_d2, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), c_d2.shape)
+
+        best = np.full(len(q), -1, dtype=np.intp)
+        best_d2 = np.full(len(q), np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            candidates = np.concatenate([rows[offsets[l]:offsets[l + 1]] for l in lists])
+            if len(candidates) == 0:
+                continue
+            candidates.sort()  # lectura secuencial si la galería está memory-mapped
+            block = np.asarray(matrix[candidates], dtype=np.float32)
+            d2 = sq_norms[candidates] - 2.0 * (block @ q[i]) + q[i] @ q[i]
+            j = int(np.argmin(d2))
+            best[i] = candidates[j]
+            best_d2[i] = max(float(d2[j]), 0.0)
+        return best, best_d2
+
+    @classmethod
+    def open(cls, path):
+        path = Path(path)
+        with open(path / INDEX_FILE, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != INDEX_VERSION:
+            raise ValueError(f"Versión de índice no soportada: {header.get('version')}")
+        centroids = np.load(path / CENTROIDS_FILE)
+        assignments = np.load(path / ASSIGNMENTS_FILE)
+        if len(assignments) != header["count"] or len(centroids) != header["lists"]:
+            raise ValueError(f"Índice inconsistente en {path}: el header no coincide con los datos")
+        return cls(centroids, assignments, digest=header["digest"])
+
+    def save(self, path):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        _save_npy_atomic(path / CENTROIDS_FILE, self.centroids)
+        _save_npy_atomic(path / ASSIGNMENTS_FILE, self.assignments)
+        header = {
+            "version": INDEX_VERSION,
+            "kind": "ivf",
+            "lists": self.n_lists,
+            "dim": int(self.centroids.shape[1]),
+            "count": len(self),
+            "digest": self.digest,
+        }
+        tmp_header = path / (INDEX_FILE + ".tmp")
+        with open(tmp_header, "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2)
+        os.replace(tmp_header, path / INDEX_FILE)
+
+
+def exists(path):
+    return (Path(path) / INDEX_FILE).exists()
+
+
+def load_or_build(gallery, n_lists=None, path=None):
+    """
+    Índice al día para `gallery`, guardado en `path` (por defecto
+    gallery.path): lo abre, añade las filas nuevas si la galería solo creció,
+    o lo reconstruye si cambió. Sin ninguna de las dos rutas no se guarda.
+    """
+    path = path if path is not None else gallery.path
+    index = None
+    if path is not None and exists(path):
+        try:
+            index = IVFIndex.open(path)
+        except (ValueError, OSError, KeyError) as e:
+            print(f"Índice ANN ilegible ({e}), se reconstruye.")
+    indexed = len(index) if index is not None and len(index) <= len(gallery) else 0
+    prefix, full = running_digests(gallery.encodings, [indexed, len(gallery)])
+    if index is not None and len(index) == len(gallery) and index.digest == full:
+        return index
+
+    t0 = time.perf_counter()
+    if index is not None and 0 < indexed < len(gallery) and index.digest == prefix:
+        added = index.add(gallery.encodings, digest=full)
+        print(f"Índice ANN: {added} filas nuevas asignadas en {time.perf_counter() - t0:.2f}s")
+    else:
+        index = IVFIndex.build(gallery.encodings, n_lists)
+        print(f"Índice ANN: {index.n_lists} listas para {len(index)} filas en {time.perf_counter() - t0:.1f}s")
+    if path is not None:
+        index.save(path)
+    return index
+
+
+def main():
+    from matcher import FaceMatcher
+
+    parser = argparse.ArgumentParser(description="Índice ANN (IVF) de la galería")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Construye (o reconstruye) el índice de la galería")
+    build.add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    build.add_argument("--lists", type=int, default=None, help="Número de listas (por defecto ~4*sqrt(N))")
+    evaluate = sub.add_parser("eval", help="Recall y latencia frente a la búsqueda exacta")
+    evaluate.add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    evaluate.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    evaluate.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    gallery = Gallery.open(args.gallery)
+    if args.command == "build":
+        t0 = time.perf_counter()
+        index = IVFIndex.build(gallery.encodings, args.lists)
+        index.save(args.gallery)
+        print(f"✓ Índice de {index.n_lists} listas para {len(index)} filas en {time.perf_counter() - t0:.1f}s")
+        return
+
+    index = load_or_build(gallery)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(gallery), size=args.queries)
+    queries = np.asarray(gallery.encodings[rows], dtype=np.float32)
+    queries += rng.normal(0, 0.02, size=queries.shape).astype(np.float32)
+    exact = FaceMatcher(gallery).match(queries, 0.0).indices
+    print(f"{'nprobe':>6} {'recall@1':>9} {'ms/consulta':>12}")
+    for nprobe in args.nprobe:
+        matcher = FaceMatcher(gallery, index=index, nprobe=nprobe)
+        t0 = time.perf_counter()
+        found = np.concatenate([matcher.match(q[np.newaxis, :], 0.0).indices for q in queries])
+        ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        print(f"{nprobe:>6} {np.mean(found == exact):>9.3f} {ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
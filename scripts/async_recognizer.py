@@ -0,0 +1,280 @@
+"""
+Detección y reconocimiento en segundo plano, desacoplados del render.
+
+El bucle de video entrega frames con submit() y sigue dibujando a la
+velocidad de la cámara; un hilo de trabajo toma siempre el frame más reciente,
+consulta el filtro de movimiento (motion.MotionGate), ejecuta face_locations
+solo donde hubo cambios o alrededor de los rostros ya conocidos (modo ROI,
+con un barrido completo cada `roi_full_every` detecciones), asocia las cajas a tracks (tracking.FaceTracker) y
+solo codifica y compara los rostros cuyo track lo necesita. El render dibuja
+el último resultado disponible con latest().
+
+Políticas para elegir qué resultado mostrar:
+  "freshest"  el más nuevo, aunque tenga menos rostros
+  "complete"  el que tenga más rostros entre los de los últimos `max_age` s
+"""
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import nullcontext
+
+import cv2
+
+import face_models
+from detection import detect_in_regions, is_full_frame, pad_box
+from tracking import FaceTracker, extrapolate
+
+POLICIES = ("freshest", "complete")
+
+
+def scale_box(box, factor_y, factor_x):
+    top, right, bottom, left = box
+    return (int(top * factor_y), int(right * factor_x), int(bottom * factor_y), int(left * factor_x))
+
+
+class RecognitionResult:
+    def __init__(self, frame_id, frame_shape, boxes, names, encodings, elapsed, distances=None, velocities=None):
+        self.frame_id = frame_id
+        self.frame_shape = frame_shape[:2]  # (alto, ancho) del frame original
+        self.boxes = boxes  # cajas en coordenadas de ese frame
+        self.names = names
+        self.encodings = encodings
+        self.distances = distances if distances is not None else [None] * len(boxes)
+        # Píxeles por frame de cada caja (de su track), para extrapolar entre detecciones
+        self.velocities = velocities
+        self.elapsed = elapsed  # segundos de detección + reconocimiento
+        self.timestamp = time.perf_counter()
+
+    def boxes_for(self, frame_shape, frame_id=None):
+        """
+        Cajas reescaladas al tamaño del frame que se está dibujando y, si se
+        da su `frame_id`, desplazadas con la velocidad de cada track desde el
+        frame en que se detectaron.
+        """
+        boxes = self.boxes
+        if frame_id is not None and self.velocities:
+            steps = frame_id - self.frame_id
+            boxes = [extrapolate(box, v, steps) for box, v in zip(boxes, self.velocities)]
+        h, w = frame_shape[:2]
+        src_h, src_w = self.frame_shape
+        if (h, w) == (src_h, src_w):
+            return boxes
+        return [scale_box(box, h / src_h, w / src_w) for box in boxes]
+
+
+EMPTY_RESULT = RecognitionResult(0, (1, 1), [], [], [], 0.0)
+
+
+class RecognitionWorker:
+    def __init__(self, matcher, tolerance, model="hog", scale=0.4, policy="freshest", max_age=1.0,
+                 tracker=None, motion_gate=None, roi_full_every=0, roi_padding=0.5, profiler=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy} (usa {', '.join(POLICIES)})")
+        self.matcher = matcher
+        self.tolerance = tolerance
+        self.model = model
+        self.scale = scale
+        self.policy = policy
+        self.max_age = max_age
+        self.tracker = tracker if tracker is not None else FaceTracker()
+        self.motion_gate = motion_gate  # None = detectar siempre en el frame completo
+        self.roi_full_every = roi_full_every  # 0 = sin modo ROI
+        self.roi_padding = roi_padding  # margen alrededor de cada caja, relativo a su tamaño
+        self.profiler = profiler  # profiler.StageProfiler opcional
+        self.full_sweeps = 0
+        self._passes_since_full = 0
+        self.frames_processed = 0
+        self.frames_skipped = 0  # frames enviados que se reemplazaron antes de procesarse
+        self.errors = 0  # frames cuyo procesamiento lanzó una excepción
+        self.last_error = None
+        self._pending = None
+        self._matcher_changed = False
+        self._recent = deque(maxlen=16)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="recognition", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def _stage(self, name):
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext()
+
+    def set_matcher(self, matcher):
+        # El siguiente frame ya usa la galería nueva y re-verifica todos los
+        # tracks (los índices guardados apuntan a la galería anterior)
+        with self._cond:
+            self.matcher = matcher
+            self._matcher_changed = True
+
+    def _prepare(self, frame, frame_id):
+        scale = self.scale
+        with self._stage("resize"):
+            small = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        return (frame_id, frame.shape, small, scale)
+
+    def submit(self, frame, frame_id):
+        """
+        Entrega un frame al hilo de trabajo. El redimensionado se hace aquí,
+        así el hilo trabaja sobre su propia copia pequeña y el render puede
+        seguir dibujando sobre `frame`.
+        """
+        job = self._prepare(frame, frame_id)
+        with self._cond:
+            if self._pending is not None:
+                self.frames_skipped += 1
+            self._pending = job
+            self._cond.notify()
+
+    def process_frame(self, frame, frame_id):
+        """
+        Procesa un frame en el hilo actual y publica el resultado (modo
+        síncrono: ningún frame enviado se descarta). Devuelve el resultado o
+        None si el filtro de movimiento omitió la detección.
+        """
+        result = self.process(*self._prepare(frame, frame_id))
+        self._publish(result)
+        return result
+
+    def _publish(self, result):
+        with self._cond:
+            self.frames_processed += 1
+            # None = escena sin cambios: sigue valiendo el último resultado
+            if result is not None:
+                self._recent.append(result)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                job = self._pending
+                self._pending = None
+            try:
+                result = self.process(*job)
+            except Exception as exc:  # un frame que falla no debe matar el hilo
+                result = self._failed(job, exc)
+            self._publish(result)
+
+    def _failed(self, job, exc):
+        """
+        Registra el error y devuelve un resultado vacío para ese frame: el
+        render deja de dibujar cajas viejas y el hilo sigue con el siguiente.
+        """
+        self.errors += 1
+        error = f"{type(exc).__name__}: {exc}"
+        # El mismo error en cada frame se informa una sola vez
+        if error != self.last_error:
+            print(f"Error en el reconocimiento del frame {job[0]}: {error}")
+            traceback.print_exc()
+        self.last_error = error
+        frame_id, frame_shape = job[0], job[1]
+        return RecognitionResult(frame_id, frame_shape, [], [], [], 0.0)
+
+    def process(self, frame_id, frame_shape, small, scale):
+        start = time.perf_counter()
+        with self._cond:
+            matcher = self.matcher
+            matcher_changed = self._matcher_changed
+            self._matcher_changed = False
+        tolerance = self.tolerance
+        if matcher_changed:
+            self.tracker.invalidate()
+
+        with self._stage("motion"):
+            run_detection, regions = self._plan_regions(small, scale, force_full=matcher_changed)
+        if not run_detection:
+            return None
+
+        with self._stage("cvtColor"):
+            rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        with self._stage("face_locations"):
+            boxes_proc = detect_in_regions(rgb, regions, model=self.model)
+
+        # Escalar las cajas de regreso al tamaño original
+        inv = 1.0 / scale
+        boxes = [scale_box(box, inv, inv) for box in boxes_proc]
+        full_regions = [scale_box(r, inv, inv) for r in regions] if regions is not None else None
+        tracks = self.tracker.associate(boxes, regions=full_regions, frame_id=frame_id)
+
+        # Solo se codifican los tracks nuevos (y, si está activada, los que
+        # toca re-verificar)
+        now = time.perf_counter()
+        stale = [i for i, track in enumerate(tracks) if self.tracker.needs_encoding(track, tolerance, now)]
+        if stale:
+            with self._stage("face_encodings"):
+                encs = face_models.face_encodings(rgb, [boxes_proc[i] for i in stale])
+            with self._stage("matching"):
+                match = matcher.match(encs, tolerance)
+            for i, enc, best, dist in zip(stale, encs, match.indices, match.distances):
+                self.tracker.update_identity(tracks[i], enc, best, dist, now)
+
+        # Incluye los rostros fuera de la región con movimiento (siguen ahí)
+        visible = self.tracker.visible()
+        boxes = [track.box for track in visible]
+        names = [track.name(matcher.gallery, tolerance) for track in visible]
+        encodings = [track.encoding for track in visible]
+        distances = [track.distance for track in visible]
+        velocities = [track.velocity for track in visible]
+        return RecognitionResult(frame_id, frame_shape, boxes, names, encodings,
+                                 time.perf_counter() - start, distances=distances, velocities=velocities)
+
+    def _plan_regions(self, small, scale, force_full=False):
+        """
+        Decide dónde detectar. Devuelve (detectar, regiones) con las regiones
+        en coordenadas de `small`; regiones=None significa frame completo.
+        """
+        if force_full:
+            return self._full_sweep()
+
+        motion_region = (0, small.shape[1], small.shape[0], 0)
+        if self.motion_gate is not None:
+            motion_region = self.motion_gate.check(small)
+            if motion_region is None:
+                return False, None
+
+        # Modo ROI: solo alrededor de las cajas anteriores, salvo que toque
+        # barrido completo o se haya perdido algún track
+        visible = self.tracker.visible()
+        if (self.roi_full_every > 0 and visible and not self.tracker.lost()
+                and self._passes_since_full < self.roi_full_every):
+            self._passes_since_full += 1
+            regions = [pad_box(scale_box(t.box, scale, scale), self.roi_padding, small.shape) for t in visible]
+            if not is_full_frame(motion_region, small.shape):
+                regions.append(motion_region)
+            return True, regions
+
+        if is_full_frame(motion_region, small.shape):
+            return self._full_sweep()
+        # La zona con movimiento cubre todo lo que cambió: cuenta como barrido
+        self._passes_since_full = 0
+        return True, [motion_region]
+
+    def _full_sweep(self):
+        self._passes_since_full = 0
+        self.full_sweeps += 1
+        return True, None
+
+    def latest(self):
+        """Resultado a dibujar según la política configurada."""
+        with self._cond:
+            if not self._recent:
+                return EMPTY_RESULT
+            newest = self._recent[-1]
+            if self.policy == "freshest":
+                return newest
+            now = time.perf_counter()
+            candidates = [r for r in self._recent if now - r.timestamp <= self.max_age] or [newest]
+            return max(candidates, key=lambda r: (len(r.boxes), r.timestamp))
@@ -0,0 +1,226 @@
+"""
+Micro-benchmark del matching contra galerías grandes (1k a 1M embeddings).
+
+Genera galerías sintéticas de 128 dimensiones (identidades con varias
+muestras alrededor de un centro, con la dispersión típica de los encodings de
+dlib) y mide, para cada implementación de matcher:
+  - memoria de la estructura (MB: arrays y objetos que retiene el matcher;
+    en float16/int8 solo códigos, escala y normas)
+  - tiempo de construcción (s)
+  - latencia de una consulta p50/p95 (ms)
+  - throughput en lotes (consultas/s)
+  - acierto top-1 respecto al matcher exacto (para variantes aproximadas)
+
+El resultado es una tabla para planificar capacidad.
+
+Uso:
+  python scripts/bench_gallery.py
+  python scripts/bench_gallery.py --sizes 1000 100000 --impls matrix float16
+"""
+import argparse
+import gc
+import sys
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex
+from gallery import ENCODING_DIM, Gallery
+from matcher import FaceMatcher, HierarchicalMatcher, QuantizedMatcher
+
+TOLERANCE = 0.50
+SAMPLES_PER_IDENTITY = 5
+CENTER_STD = 0.09  # dispersión entre identidades (similar a dlib)
+SAMPLE_STD = 0.02  # dispersión entre fotos de la misma persona
+QUERY_STD = 0.02
+
+
+class ListMatcher:
+    """Comportamiento original: lista de arrays y compare_faces + face_distance por rostro."""
+
+    def __init__(self, gallery):
+        self.known = [np.array(row, dtype=np.float64) for row in gallery.encodings]
+
+    def match_one(self, query, tolerance):
+        # compare_faces y face_distance convierten la lista a array y calculan
+        # las mismas distancias cada uno por su lado
+        matches = list(np.linalg.norm(np.array(self.known) - query, axis=1) <= tolerance)
+        distances = np.linalg.norm(np.array(self.known) - query, axis=1)
+        best = int(np.argmin(distances))
+        return best if matches[best] else -1
+
+    def match(self, queries, tolerance):
+        return np.array([self.match_one(q, tolerance) for q in queries])
+
+
+class ExactMatcher:
+    def __init__(self, gallery):
+        self.matcher = FaceMatcher(gallery)
+
+    def match(self, queries, tolerance):
+        result = self.matcher.match(queries, tolerance)
+        return np.where(result.accepted, result.indices, -1)
+
+
+class IVFMatcher:
+    """FaceMatcher con índice IVF (re-ranking exacto de las listas revisadas)."""
+
+    nprobe = 8
+
+    def __init__(self, gallery):
+        self.matcher = FaceMatcher(gallery, index=IVFIndex.build(gallery.encodings), nprobe=self.nprobe)
+
+    def match(self, queries, tolerance):
+        result = self.matcher.match(queries, tolerance)
+        return np.where(result.accepted, result.indices, -1)
+
+
+class TwoStageMatcher:
+    """HierarchicalMatcher: centroides por persona y luego las fotos de las más cercanas (exacto)."""
+
+    def __init__(self, gallery):
+        self.matcher = HierarchicalMatcher(gallery)
+
+    def match(self, queries, tolerance):
+        result = self.matcher.match(queries, tolerance)
+        return np.where(result.accepted, result.indices, -1)
+
+
+class CompressedMatcher:
+    """QuantizedMatcher sobre la copia float16 o int8 de la galería."""
+
+    kind = None
+
+    def __init__(self, gallery):
+        self.matcher = QuantizedMatcher(gallery, self.kind)
+
+    def match(self, queries, tolerance):
+        result = self.matcher.match(queries, tolerance)
+        return np.where(result.accepted, result.indices, -1)
+
+
+class Float16Matcher(CompressedMatcher):
+    kind = "float16"
+
+
+class Int8Matcher(CompressedMatcher):
+    kind = "int8"
+
+
+# Nombre -> constructor a partir de una Gallery. Para añadir una implementación
+# basta con registrar una clase con match(queries, tolerance) -> índices (-1 = desconocido).
+MATCHERS = {
+    "list": ListMatcher,
+    "matrix": ExactMatcher,
+    "float16": Float16Matcher,
+    "int8": Int8Matcher,
+    "ivf": IVFMatcher,
+    "hier": TwoStageMatcher,
+}
+
+
+def synthetic_gallery(size, seed=0):
+    rng = np.random.default_rng(seed)
+    n_ids = max(1, size // SAMPLES_PER_IDENTITY)
+    centers = rng.normal(0, CENTER_STD, size=(n_ids, ENCODING_DIM)).astype(np.float32)
+    labels = (np.arange(size) % n_ids).astype(np.int32)
+    encodings = centers[labels]
+    encodings += rng.normal(0, SAMPLE_STD, size=encodings.shape).astype(np.float32)
+    names = [f"persona{i}" for i in range(n_ids)]
+    return Gallery(encodings, labels, names)
+
+
+def synthetic_queries(gallery, count, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(gallery), size=count)
+    queries = np.asarray(gallery.encodings[rows], dtype=np.float32)
+    return queries + rng.normal(0, QUERY_STD, size=queries.shape).astype(np.float32)
+
+
+def footprint(obj, seen=None):
+    """Bytes retenidos por `obj` (arrays por su buffer real, sin contar dos veces las vistas)."""
+    seen = set() if seen is None else seen
+    if isinstance(obj, np.ndarray):
+        owner = obj
+        while isinstance(owner.base, np.ndarray):
+            owner = owner.base
+        if id(owner) in seen:
+            return 0
+        seen.add(id(owner))
+        # getsizeof de un array dueño de sus datos incluye la cabecera del objeto
+        return sys.getsizeof(obj) if obj.base is None else owner.nbytes
+    if isinstance(obj, Gallery) or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(footprint(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        return sum(footprint(value, seen) for value in vars(obj).values())
+    return sys.getsizeof(obj)
+
+
+def measure(impl_cls, gallery, queries, reference, batch):
+    gc.collect()
+    t0 = time.perf_counter()
+    impl = impl_cls(gallery)
+    build = time.perf_counter() - t0
+    memory = footprint(impl)
+
+    impl.match(queries[:1], TOLERANCE)  # calentar
+    singles = []
+    for q in queries:
+        t0 = time.perf_counter()
+        impl.match(q[np.newaxis, :], TOLERANCE)
+        singles.append(time.perf_counter() - t0)
+    p50, p95 = np.percentile(np.array(singles) * 1000, [50, 95])
+
+    t0 = time.perf_counter()
+    found = np.concatenate([impl.match(queries[i:i + batch], TOLERANCE) for i in range(0, len(queries), batch)])
+    throughput = len(queries) / max(time.perf_counter() - t0, 1e-9)
+
+    top1 = float(np.mean(found == reference)) if reference is not None else 1.0
+    return {
+        "memory_mb": memory / (1024 * 1024),
+        "build_s": build,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "qps": throughput,
+        "top1": top1,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de matching contra galerías sintéticas")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--impls", nargs="+", default=list(MATCHERS), choices=list(MATCHERS))
+    parser.add_argument("--queries", type=int, default=200, help="Consultas por medición")
+    parser.add_argument("--batch", type=int, default=64, help="Tamaño de lote para el throughput")
+    parser.add_argument("--nprobe", type=int, default=IVFMatcher.nprobe, help="Listas revisadas por el índice IVF")
+    parser.add_argument("--max-list-size", type=int, default=100000,
+                        help="Tamaño máximo para el matcher 'list' (muy lento en galerías grandes)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    IVFMatcher.nprobe = args.nprobe
+    header = f"{'N':>9} {'matcher':<10} {'MB':>9} {'build s':>8} {'p50 ms':>9} {'p95 ms':>9} {'q/s':>10} {'top1':>6}"
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        gallery = synthetic_gallery(size)
+        queries = synthetic_queries(gallery, args.queries)
+        reference = ExactMatcher(gallery).match(queries, TOLERANCE)
+        for name in args.impls:
+            if name == "list" and size > args.max_list_size:
+                print(f"{size:>9} {name:<10} {'(omitido, usa --max-list-size)':>58}")
+                continue
+            r = measure(MATCHERS[name], gallery, queries, reference, args.batch)
+            print(f"{size:>9} {name:<10} {r['memory_mb']:>9.1f} {r['build_s']:>8.2f} {r['p50_ms']:>9.3f} "
+                  f"{r['p95_ms']:>9.3f} {r['qps']:>10.0f} {r['top1']:>6.3f}")
+        del gallery
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
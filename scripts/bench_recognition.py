@@ -0,0 +1,217 @@
+"""
+Benchmark de extremo a extremo del pipeline de reconocimiento sobre clips grabados.
+
+Cada clip se reproduce frame a frame por el mismo pipeline que usa
+recognize.py (async_recognizer.RecognitionWorker en modo síncrono:
+reducción -> HOG -> encodings -> matcher) con varias configuraciones, y se
+reporta por configuración:
+  - throughput (frames/s)
+  - latencia por frame p50/p95/p99 (ms)
+  - llamadas al encoder por frame
+  - pico de memoria residente (MB)
+
+Cada combinación clip/configuración corre en un proceso nuevo para que el
+pico de RSS sea comparable. Los resultados se pueden guardar como línea base
+(JSON) y las siguientes ejecuciones fallan (código 1) si alguna métrica
+empeora más que el umbral.
+
+Uso:
+  python scripts/bench_recognition.py --clips clip1.mp4 synthetic:300 --save-baseline
+  python scripts/bench_recognition.py --clips clip1.mp4 synthetic:300 --threshold 0.15
+"""
+import argparse
+import json
+import multiprocessing
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from memory_usage import peak_rss_mb
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+TRAIN_DIR = DATA_DIR / "train"
+GALLERY_DIR = DATA_DIR / "gallery"
+ENC_FILE = DATA_DIR / "known_encodings.pkl"
+BASELINE_FILE = DATA_DIR / "bench_baseline.json"
+
+TOLERANCE = 0.50
+MODEL = "hog"
+DOWNSCALE = 0.4
+
+# Configuraciones a comparar. "tracker" son los argumentos de FaceTracker; con
+# re-verificación en 0 se codifican todos los rostros en cada detección, como
+# el bucle original sin tracking.
+CONFIGS = {
+    "base": {"tracker": {"reverify_sec": 0.0, "low_confidence_sec": 0.0}, "motion": False, "roi_full_every": 0},
+    "tracking": {"tracker": {}, "motion": False, "roi_full_every": 0},
+    "tracking+reverify": {"tracker": {"reverify_sec": 2.0, "low_confidence_sec": 0.5}, "motion": False, "roi_full_every": 0},
+    "tracking+motion+roi": {"tracker": {}, "motion": True, "roi_full_every": 10},
+}
+
+# Métricas comparadas contra la línea base y si "más alto es mejor"
+CHECKED_METRICS = {
+    "fps": True,
+    "p95_ms": False,
+    "encoder_calls_per_frame": False,
+    "peak_rss_mb": False,
+}
+
+
+def load_gallery():
+    import gallery as gallery_store
+    from gallery import Gallery
+
+    if gallery_store.exists(GALLERY_DIR):
+        return Gallery.open(GALLERY_DIR)
+    if ENC_FILE.exists():
+        with open(ENC_FILE, "rb") as f:
+            data = pickle.load(f)
+        return Gallery.from_lists(data["encodings"], data["names"])
+    return Gallery.empty()
+
+
+def run_config(clip, config_name, detect_every, max_frames):
+    """Reproduce un clip con una configuración. Corre en su propio proceso."""
+    from async_recognizer import RecognitionWorker
+    from matcher import FaceMatcher
+    from motion import MotionGate
+    from sources import open_source
+    from tracking import FaceTracker
+
+    config = CONFIGS[config_name]
+    source = open_source(clip, face_images=sorted(TRAIN_DIR.glob("*/*.jpg")))
+    if not source.isOpened():
+        raise RuntimeError(f"No se pudo abrir {clip}")
+    worker = RecognitionWorker(
+        FaceMatcher(load_gallery()),
+        TOLERANCE,
+        model=MODEL,
+        scale=DOWNSCALE,
+        tracker=FaceTracker(**config["tracker"]),
+        motion_gate=MotionGate() if config["motion"] else None,
+        roi_full_every=config["roi_full_every"],
+    )
+
+    latencies = []
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames += 1
+        t0 = time.perf_counter()
+        if frames % detect_every == 0:
+            worker.process_frame(frame, frames)
+        latencies.append(time.perf_counter() - t0)
+        if max_frames and frames >= max_frames:
+            break
+    elapsed = time.perf_counter() - start
+    source.release()
+
+    if frames == 0:
+        raise RuntimeError(f"{clip} no tiene frames")
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "encoder_calls_per_frame": round(worker.tracker.encoder_calls / frames, 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Lista de regresiones (texto) respecto a la línea base."""
+    regressions = []
+    for clip, configs in results.items():
+        for config_name, metrics in configs.items():
+            base = baseline.get(clip, {}).get(config_name)
+            if base is None:
+                continue
+            for metric, higher_is_better in CHECKED_METRICS.items():
+                old, new = base.get(metric), metrics.get(metric)
+                if old is None or new is None or old == 0:
+                    continue
+                change = (new - old) / old
+                worse = -change if higher_is_better else change
+                if worse > threshold:
+                    regressions.append(
+                        f"{clip} [{config_name}] {metric}: {old} -> {new} ({change:+.1%})"
+                    )
+    return regressions
+
+
+def print_table(results):
+    header = f"{'clip':<24} {'config':<22} {'fps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'enc/frame':>10} {'RSS MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for clip, configs in results.items():
+        for config_name, m in configs.items():
+            print(
+                f"{Path(clip).name[:24]:<24} {config_name:<22} {m['fps']:>8.1f} {m['p50_ms']:>8.1f} "
+                f"{m['p95_ms']:>8.1f} {m['p99_ms']:>8.1f} {m['encoder_calls_per_frame']:>10.3f} {m['peak_rss_mb']:>8.1f}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de reconocimiento sobre clips")
+    parser.add_argument("--clips", nargs="+", default=["synthetic:300"], help="Videos, carpetas o 'synthetic[:N]'")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--detect-every", type=int, default=3, help="Detectar cada N frames (como DETECT_EVERY_N_FRAMES)")
+    parser.add_argument("--max-frames", type=int, default=0, help="Limitar frames por clip (0 = todos)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar estos resultados como línea base")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento relativo tolerado (0.10 = 10%%)")
+    parser.add_argument("--output", type=Path, default=None, help="Guardar también los resultados en este JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = {}
+    # "spawn" en todas las plataformas: cada medición empieza con memoria limpia
+    ctx = multiprocessing.get_context("spawn")
+    for clip in args.clips:
+        results[clip] = {}
+        for config_name in args.configs:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                metrics = executor.submit(run_config, clip, config_name, args.detect_every, args.max_frames).result()
+            results[clip][config_name] = metrics
+            print(f"✓ {clip} [{config_name}]: {metrics['fps']:.1f} fps")
+
+    print()
+    print_table(results)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nLínea base guardada en {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nSin línea base en {args.baseline} (usa --save-baseline).")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ Regresiones mayores al {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\n✅ Sin regresiones mayores al {args.threshold:.0%} respecto a {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Lector de cámara en un hilo propio que expone solo el frame más reciente.
+
+Muchos backends ignoran CAP_PROP_BUFFERSIZE=1, así que mientras el bucle
+principal está ocupado detectando, los frames se acumulan en el driver y lo
+que se muestra queda atrasado. LatestFrameReader vacía la cámara de forma
+continua y conserva únicamente el último frame; los que nadie llegó a leer se
+cuentan como descartados.
+
+Tiene la misma interfaz que cv2.VideoCapture para lo que usa recognize.py
+(read, set, get, isOpened, release).
+"""
+import threading
+import time
+
+import cv2
+
+
+class LatestFrameReader:
+    def __init__(self, source=0, read_timeout=3.0):
+        self.capture = cv2.VideoCapture(source)
+        self.read_timeout = read_timeout
+        self.frames_grabbed = 0  # frames leídos de la cámara
+        self.frames_read = 0  # frames entregados al bucle de procesamiento
+        self.frames_dropped = 0  # frames reemplazados antes de ser entregados
+        self._frame = None
+        self._frame_time = 0.0
+        self._seq = 0
+        self._last_seq = 0
+        self._running = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._running or not self.capture.isOpened():
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.capture.read()
+            if not ret:
+                # Fin del stream o cámara desconectada: despertar a quien espere
+                with self._cond:
+                    self._running = False
+                    self._cond.notify_all()
+                break
+            with self._cond:
+                if self._seq > self._last_seq:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._frame_time = time.perf_counter()
+                self._seq += 1
+                self.frames_grabbed += 1
+                self._cond.notify_all()
+
+    def read(self):
+        """
+        Devuelve (ret, frame) con el frame más reciente que aún no se entregó,
+        esperando como mucho `read_timeout` segundos a que llegue uno nuevo.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._seq > self._last_seq or not self._running,
+                timeout=self.read_timeout,
+            ):
+                return False, None
+            if self._seq == self._last_seq:
+                return False, None
+            self._last_seq = self._seq
+            self.frames_read += 1
+            # cv2 reserva un array nuevo en cada read(), así que el frame se
+            # puede entregar sin copiar: el hilo de captura no lo vuelve a tocar
+            return True, self._frame
+
+    def frame_age(self):
+        """Segundos desde que se capturó el último frame disponible."""
+        with self._cond:
+            if self._frame is None:
+                return 0.0
+            return time.perf_counter() - self._frame_time
+
+    def stats(self):
+        with self._cond:
+            return {
+                "grabbed": self.frames_grabbed,
+                "read": self.frames_read,
+                "dropped": self.frames_dropped,
+            }
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def release(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.capture.release()
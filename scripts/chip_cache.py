@@ -0,0 +1,213 @@
+"""
+Cache de rostros alineados (150x150) para recodificar sin tocar las fotos.
+
+Para calcular un encoding, dlib alinea el rostro con los landmarks y recorta
+un "chip" de 150x150 que es lo único que ve la red. Guardando esos recortes
+(dlib.get_face_chip, el mismo que hace el encoder) un cambio de encoder o de
+num_jitters se recalcula solo con la red: sin decodificar JPEG, sin HOG y sin
+shape predictor.
+
+Archivos en data/:
+  face_chips.bin    todos los recortes seguidos, uint8 (n x 150 x 150 x 3),
+                    se abre con np.memmap; añadir es escribir al final
+  face_chips.json   índice: hash SHA-1 de la imagen -> filas del .bin
+  face_chips.jsonl  diario de altas posteriores al índice, una por línea
+
+El índice se indexa por contenido, así que renombrar o mover fotos no
+invalida nada. Los recortes de imágenes borradas se descartan cuando ocupan
+más de la mitad del archivo (prune).
+
+Guardar tras un alta solo añade sus líneas al diario; el .json completo se
+reescribe en prune() (que ya recorre todo) o cuando el diario alcanza la
+mitad de las imágenes.
+
+Uso como script:
+  python scripts/chip_cache.py reencode --jitters 10   # recodifica data/train/ desde los recortes
+  python scripts/chip_cache.py info
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+import face_models
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CHIPS_FILE = DATA_DIR / "face_chips.bin"
+CHIPS_VERSION = 1
+CHIP_SHAPE = (face_models.CHIP_SIZE, face_models.CHIP_SIZE, 3)
+CHIP_BYTES = int(np.prod(CHIP_SHAPE))
+
+
+class ChipCache:
+    def __init__(self, path=CHIPS_FILE):
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".json")
+        self.journal_path = self.path.with_suffix(".jsonl")
+        self.rows = {}
+        self.count = 0
+        self.journal_count = 0  # líneas del diario aún no pasadas al índice
+        self._unsaved = []  # hashes añadidos desde el último save()
+        self._journal_broken = False  # tras una línea cortada no se puede seguir añadiendo
+        self._mmap = None  # memmap de las `count` filas; se reabre tras put()/prune()
+        self.load()
+
+    def load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as exc:
+            print(f"Índice de recortes ilegible ({exc}), se regenera.")
+            return
+        if index.get("version") != CHIPS_VERSION or index.get("shape") != list(CHIP_SHAPE):
+            print("Recortes con versión o tamaño distinto, se regeneran.")
+            return
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if size < index["count"] * CHIP_BYTES:
+            print("Archivo de recortes incompleto, se regenera.")
+            return
+        self.rows = index["rows"]
+        self.count = index["count"]
+        self._replay_journal(size // CHIP_BYTES)
+
+    def _replay_journal(self, available):
+        if not self.journal_path.exists():
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    digest, rows = record["sha1"], record["rows"]
+                    end = max(rows, default=self.count - 1) + 1
+                except (ValueError, KeyError, TypeError):
+                    end = None
+                if end is None or end > available:
+                    # Línea cortada a medias: vale lo anterior y el próximo
+                    # save() reescribe el índice
+                    self._journal_broken = True
+                    break
+                self.rows[digest] = rows
+                self.count = max(self.count, end)
+                self.journal_count += 1
+
+    def save(self, full=False):
+        """Guarda lo añadido con put(): al final del diario, o el índice entero si toca."""
+        journal_count = self.journal_count + len(self._unsaved)
+        if not full and not self._journal_broken and self.index_path.exists() and journal_count * 2 <= len(self.rows):
+            if self._unsaved:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    for digest in self._unsaved:
+                        f.write(json.dumps({"sha1": digest, "rows": self.rows[digest]}) + "\n")
+                self.journal_count = journal_count
+                self._unsaved = []
+            return
+        # Los recortes ya están escritos; el índice se reemplaza al final
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CHIPS_VERSION, "shape": list(CHIP_SHAPE), "count": self.count, "rows": self.rows}, f)
+        os.replace(tmp_path, self.index_path)
+        self.journal_path.unlink(missing_ok=True)
+        self.journal_count = 0
+        self._unsaved = []
+        self._journal_broken = False
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, digest):
+        return digest in self.rows
+
+    def _matrix(self):
+        if self._mmap is None or len(self._mmap) != self.count:
+            self._mmap = np.memmap(self.path, dtype=np.uint8, mode="r", shape=(self.count,) + CHIP_SHAPE)
+        return self._mmap
+
+    def get(self, digest):
+        """Recortes (n x 150 x 150 x 3) de la imagen con ese hash, o None si no están."""
+        rows = self.rows.get(digest)
+        if rows is None:
+            return None
+        if not rows:
+            return np.empty((0,) + CHIP_SHAPE, dtype=np.uint8)
+        return np.array(self._matrix()[rows])
+
+    def put(self, digest, chips):
+        """Añade los recortes de una imagen al final del archivo (sin guardar el índice)."""
+        if digest in self.rows:
+            return
+        chips = np.ascontiguousarray(chips, dtype=np.uint8).reshape((-1,) + CHIP_SHAPE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._mmap = None
+        # Lo que haya tras `count` es de una escritura que no llegó al índice
+        with open(self.path, "r+b" if self.path.exists() else "wb") as f:
+            f.seek(self.count * CHIP_BYTES)
+            f.write(chips.tobytes())
+            f.truncate()
+        self.rows[digest] = list(range(self.count, self.count + len(chips)))
+        self.count += len(chips)
+        self._unsaved.append(digest)
+
+    def prune(self, live_digests):
+        """Descarta los recortes de imágenes que ya no existen si ocupan más de la mitad."""
+        dead = [digest for digest in self.rows if digest not in live_digests]
+        dead_rows = sum(len(self.rows[digest]) for digest in dead)
+        if not dead or dead_rows * 2 < self.count:
+            for digest in dead:
+                del self.rows[digest]
+            # Las bajas no van al diario: con alguna se reescribe el índice
+            self.save(full=bool(dead))
+            return
+        for digest in dead:
+            del self.rows[digest]
+        old = self._matrix()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        rows = {}
+        count = 0
+        with open(tmp_path, "wb") as f:
+            for digest, old_rows in self.rows.items():
+                if old_rows:
+                    f.write(np.ascontiguousarray(old[old_rows]).tobytes())
+                rows[digest] = list(range(count, count + len(old_rows)))
+                count += len(old_rows)
+        del old
+        self._mmap = None  # soltar el archivo antes de reemplazarlo
+        os.replace(tmp_path, self.path)
+        self.rows = rows
+        self.count = count
+        self.save(full=True)
+
+
+def main():
+    from encoding_cache import EncodingCache
+
+    parser = argparse.ArgumentParser(description="Cache de rostros alineados de data/train/")
+    parser.add_argument("command", choices=["reencode", "info"])
+    parser.add_argument("--jitters", type=int, default=1, help="num_jitters del encoder al recodificar")
+    parser.add_argument("--train", type=Path, default=DATA_DIR / "train")
+    parser.add_argument("--cache", type=Path, default=DATA_DIR / "encodings_cache.pkl")
+    parser.add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    args = parser.parse_args()
+
+    chips = ChipCache()
+    if args.command == "info":
+        mb = chips.count * CHIP_BYTES / 2**20
+        print(f"{len(chips)} imágenes, {chips.count} recortes ({mb:.1f} MB) en {chips.path}")
+        return
+
+    from gallery import Gallery
+
+    cache = EncodingCache(args.cache, chips=chips)
+    cache.sync(args.train)  # altas y bajas desde la última vez
+    cache.reencode(args.train, num_jitters=args.jitters)
+    data = cache.sync(args.train)
+    gallery = Gallery.from_lists(data["encodings"], data["names"])
+    gallery.save(args.gallery)
+    print(f"Guardado {len(gallery)} embeddings en {args.gallery}")
+
+
+if __name__ == "__main__":
+    main()
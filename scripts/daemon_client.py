@@ -0,0 +1,215 @@
+"""
+Cliente ligero del demonio de reconocimiento (recognition_daemon.py).
+
+No importa face_recognition ni dlib: solo envía imágenes por el socket y
+recibe cajas, encodings y nombres, así un script por lotes arranca al
+instante y cada petición cuesta solo el cómputo en el demonio.
+
+Protocolo (igual en ambos sentidos): cada mensaje es
+  4 bytes big-endian con la longitud del header
+  header JSON (utf-8), con "payload" = bytes que siguen
+  payload binario (imagen codificada, imagen cruda o encodings float32)
+
+Las peticiones llevan un "id" y las respuestas vuelven en el mismo orden, así
+que se pueden enviar muchas sin esperar (pipeline()).
+
+Dirección: "unix:/ruta/al.sock" o "tcp:127.0.0.1:50555". Por defecto un socket
+Unix en data/, o TCP local en Windows.
+
+Uso como script:
+  python scripts/daemon_client.py ping
+  python scripts/daemon_client.py identify foto1.jpg foto2.jpg ...
+"""
+import argparse
+import json
+import socket
+import struct
+import sys
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DEFAULT_SOCKET = DATA_DIR / "recognizer.sock"
+DEFAULT_TCP = ("127.0.0.1", 50555)
+HEADER_SIZE = struct.Struct(">I")
+PIPELINE_WINDOW = 32  # peticiones en vuelo como máximo
+
+
+def default_address():
+    if hasattr(socket, "AF_UNIX"):
+        return f"unix:{DEFAULT_SOCKET}"
+    return f"tcp:{DEFAULT_TCP[0]}:{DEFAULT_TCP[1]}"
+
+
+def parse_address(address):
+    """("unix", ruta) o ("tcp", (host, puerto)) a partir del texto de dirección."""
+    kind, _, rest = address.partition(":")
+    if kind == "unix":
+        return "unix", rest
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return "tcp", (host or DEFAULT_TCP[0], int(port))
+    raise ValueError(f"Dirección no reconocida: {address} (usa unix:/ruta o tcp:host:puerto)")
+
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = sock.recv_into(view[got:], size - got)
+        if n == 0:
+            raise ConnectionError("Conexión cerrada por el otro extremo")
+        got += n
+    return bytes(buf)
+
+
+def send_message(sock, header, payload=b""):
+    header = dict(header, payload=len(payload))
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(HEADER_SIZE.pack(len(data)) + data + payload)
+
+
+def recv_message(sock):
+    """(header, payload); None si el otro extremo cerró la conexión limpiamente."""
+    first = sock.recv(HEADER_SIZE.size)
+    if not first:
+        return None
+    if len(first) < HEADER_SIZE.size:
+        first += _recv_exact(sock, HEADER_SIZE.size - len(first))
+    (length,) = HEADER_SIZE.unpack(first)
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    payload = _recv_exact(sock, header.get("payload", 0)) if header.get("payload") else b""
+    return header, payload
+
+
+def encode_image_payload(image):
+    """
+    Header y payload para una imagen: ruta o bytes de un archivo (se envían
+    tal cual, el demonio los decodifica) o array RGB uint8 (crudo).
+    """
+    if isinstance(image, np.ndarray):
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        return {"format": "raw", "shape": list(image.shape)}, image.tobytes()
+    if isinstance(image, (str, Path)):
+        image = Path(image).read_bytes()
+    return {"format": "encoded"}, bytes(image)
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+class DaemonClient:
+    def __init__(self, address=None, timeout=30.0):
+        kind, target = parse_address(address or default_address())
+        family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(target)
+        self._next_id = 0
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _send(self, op, image=None, **params):
+        self._next_id += 1
+        header = {"id": self._next_id, "op": op}
+        header.update({k: v for k, v in params.items() if v is not None})
+        payload = b""
+        if image is not None:
+            image_header, payload = encode_image_payload(image)
+            header.update(image_header)
+        send_message(self.sock, header, payload)
+        return self._next_id
+
+    def _receive(self, expected_id, return_errors=False):
+        message = recv_message(self.sock)
+        if message is None:
+            raise ConnectionError("El demonio cerró la conexión")
+        header, payload = message
+        if header.get("id") != expected_id:
+            raise DaemonError(f"Respuesta fuera de orden: {header.get('id')} (esperaba {expected_id})")
+        if not header.get("ok"):
+            if return_errors:
+                return {"error": header.get("error", "error desconocido")}
+            raise DaemonError(header.get("error", "error desconocido"))
+        result = header.get("result", {})
+        if "shape" in header:
+            result["encodings"] = np.frombuffer(payload, dtype=np.float32).reshape(header["shape"])
+        return result
+
+    def request(self, op, image=None, **params):
+        return self._receive(self._send(op, image, **params))
+
+    def pipeline(self, requests, window=PIPELINE_WINDOW, return_errors=False):
+        """
+        Envía (op, imagen, params) sin esperar cada respuesta, con hasta
+        `window` en vuelo, y devuelve los resultados en el mismo orden. Con
+        return_errors=True un fallo se devuelve como {"error": ...} en lugar
+        de cortar el lote.
+        """
+        in_flight = deque()
+        for op, image, params in requests:
+            in_flight.append(self._send(op, image, **params))
+            if len(in_flight) >= window:
+                yield self._receive(in_flight.popleft(), return_errors)
+        while in_flight:
+            yield self._receive(in_flight.popleft(), return_errors)
+
+    def ping(self):
+        return self.request("ping")
+
+    def stats(self):
+        return self.request("stats")
+
+    def reload(self):
+        return self.request("reload")
+
+    def detect(self, image, model=None):
+        return self.request("detect", image, model=model)["boxes"]
+
+    def encode(self, image, boxes=None, model=None, landmarks=None):
+        """
+        (cajas, encodings float32 n x 128). Con `boxes` no se vuelve a detectar
+        y con `landmarks` (una lista de puntos [x, y] por caja) tampoco se
+        ajusta el shape predictor.
+        """
+        result = self.request("encode", image, boxes=boxes, model=model, landmarks=landmarks)
+        return [tuple(b) for b in result["boxes"]], result["encodings"]
+
+    def identify(self, image, tolerance=None, model=None):
+        return self.request("identify", image, tolerance=tolerance, model=model)["faces"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cliente del demonio de reconocimiento")
+    parser.add_argument("command", choices=["ping", "stats", "reload", "detect", "encode", "identify"])
+    parser.add_argument("images", nargs="*", type=Path)
+    parser.add_argument("--address", default=None, help=f"Dirección del demonio (por defecto {default_address()})")
+    parser.add_argument("--tolerance", type=float, default=None)
+    args = parser.parse_args()
+
+    with DaemonClient(args.address) as client:
+        if args.command in ("ping", "stats", "reload"):
+            print(json.dumps(client.request(args.command), ensure_ascii=False))
+            return 0
+        params = {"tolerance": args.tolerance} if args.command == "identify" else {}
+        requests = ((args.command, path, params) for path in args.images)
+        for path, result in zip(args.images, client.pipeline(requests, return_errors=True)):
+            if "encodings" in result:
+                result["encodings"] = result["encodings"].round(5).tolist()
+            print(json.dumps({"image": str(path), **result}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
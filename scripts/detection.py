@@ -0,0 +1,69 @@
+"""
+Detección de rostros restringida a regiones del frame reducido.
+
+Las cajas encontradas dentro de un recorte se trasladan de vuelta a las
+coordenadas del frame reducido completo, así el resto del pipeline (escalado
+con inv = 1.0 / scale, tracking, encodings) no cambia.
+"""
+import numpy as np
+
+import face_models
+from tracking import iou
+
+# HOG con upsample=1 no encuentra rostros en recortes muy pequeños
+MIN_REGION_SIZE = 80
+DUPLICATE_IOU = 0.5  # cajas de recortes solapados que son el mismo rostro
+
+
+def expand_region(region, shape, min_size=MIN_REGION_SIZE):
+    """Agranda la región hasta min_size (centrada) y la recorta a los límites."""
+    h, w = shape[:2]
+    top, right, bottom, left = region
+    if bottom - top < min_size:
+        grow = (min_size - (bottom - top) + 1) // 2
+        top, bottom = top - grow, bottom + grow
+    if right - left < min_size:
+        grow = (min_size - (right - left) + 1) // 2
+        left, right = left - grow, right + grow
+    return (max(0, top), min(w, right), min(h, bottom), max(0, left))
+
+
+def pad_box(box, padding, shape):
+    """Amplía una caja en `padding` veces su tamaño por cada lado."""
+    top, right, bottom, left = box
+    pad_y = int((bottom - top) * padding)
+    pad_x = int((right - left) * padding)
+    return expand_region((top - pad_y, right + pad_x, bottom + pad_y, left - pad_x), shape)
+
+
+def is_full_frame(region, shape):
+    h, w = shape[:2]
+    return region == (0, w, h, 0)
+
+
+def detect_in_region(rgb, region, model="hog"):
+    """face_locations dentro de `region`, con cajas en coordenadas de `rgb`."""
+    if region is None or is_full_frame(region, rgb.shape):
+        return face_models.face_locations(rgb, model=model)
+    top, right, bottom, left = expand_region(region, rgb.shape)
+    # dlib necesita un buffer contiguo; el slice de numpy no lo es
+    crop = np.ascontiguousarray(rgb[top:bottom, left:right])
+    return [
+        (t + top, r + left, b + top, l + left)
+        for (t, r, b, l) in face_models.face_locations(crop, model=model)
+    ]
+
+
+def detect_in_regions(rgb, regions, model="hog"):
+    """
+    face_locations sobre varios recortes (regions=None = frame completo). Las
+    detecciones repetidas por recortes solapados se descartan.
+    """
+    if regions is None:
+        return face_models.face_locations(rgb, model=model)
+    boxes = []
+    for region in regions:
+        for box in detect_in_region(rgb, region, model=model):
+            if all(iou(box, other) < DUPLICATE_IOU for other in boxes):
+                boxes.append(box)
+    return boxes
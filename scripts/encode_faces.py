@@ -1,11 +1,19 @@
-import pickle
+import argparse
+import os
 from pathlib import Path
 
-import face_recognition
+import numpy as np
+
+from chip_cache import ChipCache
+from daemon_client import DaemonClient, default_address
+from encoding_cache import ENCODING_DIM, EncodingCache, read_sidecar
+from gallery import QUANTIZED_KINDS, Gallery
+from gallery_db import DB_FILE, GalleryDB
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 TRAIN_DIR = DATA_DIR / "train"
-ENC_FILE = DATA_DIR / "known_encodings.pkl"
+GALLERY_DIR = DATA_DIR / "gallery"
+CACHE_FILE = DATA_DIR / "encodings_cache.pkl"
 
 # Easter egg: si falta la imagen, termina el script
 EASTER_EGG_IMG = DATA_DIR / ".sysdata_2026" / "gorilla.jpg"
@@ -14,33 +22,94 @@ if not EASTER_EGG_IMG.exists():
     exit(42)
 
 
-def load_images():
-    encodings = []
-    names = []
+def _sidecar_params(img_path):
+    """Caja y landmarks del sidecar para la petición encode (vacío si no hay)."""
+    sidecar = read_sidecar(img_path)
+    if sidecar is None:
+        return {}
+    params = {"boxes": [sidecar["box"]]}
+    if sidecar["landmarks"]:
+        params["landmarks"] = [sidecar["landmarks"]]
+    return params
+
+
+def daemon_encoder(address):
+    """Codifica con el demonio (modelos ya cargados), enviando las imágenes en pipeline."""
+    def encode(img_paths):
+        results = []
+        with DaemonClient(address) as client:
+            # Con sidecar se envían su caja y sus landmarks: el demonio no
+            # vuelve a detectar y codifica igual que encode_image
+            requests = (
+                ("encode", img_path, {"model": "hog", **_sidecar_params(img_path)})
+                for img_path in img_paths
+            )
+            for img_path, result in zip(img_paths, client.pipeline(requests, return_errors=True)):
+                if "error" in result:
+                    print(f"Error codificando {img_path}: {result['error']}")
+                    results.append(([], np.empty((0, ENCODING_DIM), dtype=np.float32)))
+                    continue
+                results.append(([tuple(box) for box in result["boxes"]], result["encodings"]))
+        print(f"Codificadas {len(results)} imágenes con el demonio")
+        return results
+    return encode
+
+
+def load_images(workers=1, daemon=None, backend="files", chips=False):
+    # Solo se codifican las imágenes nuevas o modificadas desde la última vez
+    encoder = daemon_encoder(daemon) if daemon else None
+    if backend == "sqlite":
+        with GalleryDB(DB_FILE) as db:
+            db.sync(TRAIN_DIR, model="hog", workers=workers, encoder=encoder)
+            return db.load_gallery()
+    cache = EncodingCache(CACHE_FILE, chips=ChipCache() if chips else None)
+    data = cache.sync(TRAIN_DIR, model="hog", workers=workers, encoder=encoder)
+    return Gallery.from_lists(data["encodings"], data["names"])
 
-    for person_dir in TRAIN_DIR.iterdir():
-        if not person_dir.is_dir():
-            continue
-        label = person_dir.name
-        for img_path in person_dir.glob("*.*"):
-            image = face_recognition.load_image_file(img_path)
-            boxes = face_recognition.face_locations(image, model="hog")
-            if not boxes:
-                print(f"Sin rostro en {img_path}, se omite.")
-                continue
-            face_encs = face_recognition.face_encodings(image, boxes)
-            encodings.extend(face_encs)
-            names.extend([label] * len(face_encs))
 
-    return {"encodings": encodings, "names": names}
+def parse_args():
+    parser = argparse.ArgumentParser(description="Genera embeddings desde data/train/")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=f"Procesos para detectar/codificar en paralelo (0 = todos los núcleos, {os.cpu_count()})",
+    )
+    parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const="",
+        default=None,
+        help="Codificar con recognition_daemon.py (opcional: su dirección, unix:/ruta o tcp:host:puerto)",
+    )
+    parser.add_argument(
+        "--quantize",
+        nargs="*",
+        default=[],
+        choices=QUANTIZED_KINDS,
+        help="Guardar también copias cuantizadas de la galería (float16, int8)",
+    )
+    parser.add_argument(
+        "--chips",
+        action="store_true",
+        help="Guardar también el rostro alineado de cada foto (data/face_chips.bin) para recodificar sin detectar",
+    )
+    parser.add_argument(
+        "--backend",
+        default="files",
+        choices=["files", "sqlite"],
+        help=f"Dónde guardar los encodings por imagen: cache pickle o {DB_FILE.name} (SQLite, con origen de cada embedding)",
+    )
+    return parser.parse_args()
 
 
 def main():
-    data = load_images()
-    ENC_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(ENC_FILE, "wb") as f:
-        pickle.dump(data, f)
-    print(f"Guardado {len(data['encodings'])} embeddings en {ENC_FILE}")
+    args = parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    daemon = None if args.daemon is None else (args.daemon or default_address())
+    gallery = load_images(workers=workers, daemon=daemon, backend=args.backend, chips=args.chips)
+    gallery.save(GALLERY_DIR, quantize=args.quantize)
+    print(f"Guardado {len(gallery)} embeddings en {GALLERY_DIR}")
 
 
 if __name__ == "__main__":
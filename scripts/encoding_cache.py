@@ -0,0 +1,455 @@
+"""
+Cache persistente de encodings por imagen para data/train/.
+
+Cada imagen se indexa por su ruta relativa (persona/archivo) y guarda el
+tamaño, el mtime y el hash SHA-1 de su contenido, junto con las cajas
+detectadas y los embeddings de 128-d. Al reconstruir solo se procesan las
+imágenes nuevas o modificadas; las que ya no existen se descartan.
+
+Las fotos capturadas por recognize.py llevan al lado un .json con la caja y
+los 5 landmarks del rostro (medidos en el frame completo). Con él la foto se
+codifica sin volver a detectar: HOG suele fallar sobre un recorte tan
+ajustado y, aunque acierte, cuesta una pasada.
+
+Con una ChipCache (chip_cache.py) se guardan además los rostros alineados
+de 150x150 de cada imagen, indexados por su hash, y reencode() recalcula
+los encodings solo con la red, sin decodificar, detectar ni ajustar
+landmarks.
+
+Las altas de add() (aprender desde recognize.py) no reescriben el pickle:
+se añaden al final de un diario (encodings_cache.pkl.log) y load() lo
+reproduce sobre el pickle. sync() y reencode() guardan el pickle completo y
+vacían el diario, igual que add() cuando el diario ya tiene tantas entradas
+como el pickle; así una alta cuesta lo que sus imágenes y no lo que la cache.
+"""
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import face_models
+from image_files import IMAGE_EXTS
+
+CACHE_VERSION = 2  # v2: encodings en float32
+ENCODING_DIM = 128
+PROGRESS_EVERY_SEC = 2.0
+SIDECAR_SUFFIX = ".json"
+REENCODE_BATCH = 256  # recortes por lote del encoder en reencode()
+
+# Modelo de detección, recortes alineados y num_jitters de cada proceso del pool
+_worker_model = "hog"
+_worker_chips = False
+_worker_jitters = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Hash SHA-1 del contenido de un archivo."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sidecar_path(img_path):
+    return Path(img_path).with_suffix(SIDECAR_SUFFIX)
+
+
+def write_sidecar(img_path, box, landmarks=None):
+    """Guarda la caja (coordenadas de la imagen) y los landmarks [(x, y)] de su rostro."""
+    data = {"box": [int(v) for v in box], "landmarks": None}
+    if landmarks is not None:
+        data["landmarks"] = [[int(x), int(y)] for x, y in landmarks]
+    with open(sidecar_path(img_path), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def read_sidecar(img_path, image_shape=None):
+    """
+    Caja y landmarks guardados junto a la imagen, o None si no hay (o si la
+    caja no cabe en una imagen de `image_shape`, p. ej. porque se recortó).
+    """
+    path = sidecar_path(img_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        top, right, bottom, left = data["box"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if image_shape is not None and (top < 0 or left < 0 or bottom > image_shape[0] or right > image_shape[1]):
+        return None
+    return data
+
+
+def _empty_chips():
+    return np.empty((0, face_models.CHIP_SIZE, face_models.CHIP_SIZE, 3), dtype=np.uint8)
+
+
+def encode_image(img_path, model="hog", with_chips=False, num_jitters=1):
+    """
+    Detecta y codifica los rostros de una imagen. Devuelve (cajas, encodings)
+    con los encodings como matriz float32 (n_rostros x 128). El modo serie y
+    el paralelo pasan por aquí, así que ambos producen exactamente lo mismo.
+    Si la imagen tiene sidecar se usan su caja y sus landmarks sin detectar.
+    num_jitters se pasa tal cual al encoder.
+    Con with_chips=True devuelve también los rostros alineados (n x 150 x 150
+    x 3 uint8) y codifica a partir de ellos (el resultado es el mismo).
+    """
+    image = face_models.load_image_file(img_path)
+    sidecar = read_sidecar(img_path, image.shape)
+    landmarks = None
+    if sidecar is not None:
+        boxes = [tuple(sidecar["box"])]
+        if sidecar["landmarks"]:
+            landmarks = [(boxes[0], sidecar["landmarks"])]
+    else:
+        boxes = face_models.face_locations(image, model=model)
+        if not boxes:
+            empty = np.empty((0, ENCODING_DIM), dtype=np.float32)
+            return ([], empty, _empty_chips()) if with_chips else ([], empty)
+    if with_chips:
+        chips = face_models.face_chips(image, boxes, landmarks)
+        face_encs = face_models.face_encodings_from_chips(chips, num_jitters)
+        return boxes, np.asarray(face_encs, dtype=np.float32), np.asarray(chips, dtype=np.uint8)
+    if landmarks is not None:
+        face_encs = face_models.face_encodings_from_landmarks(image, landmarks, num_jitters)
+    else:
+        face_encs = face_models.face_encodings(image, boxes, num_jitters)
+    return boxes, np.asarray(face_encs, dtype=np.float32)
+
+
+def _init_worker(model, with_chips=False, num_jitters=1):
+    """Inicializa un proceso del pool: fija el modelo y calienta dlib una vez."""
+    global _worker_model, _worker_chips, _worker_jitters
+    _worker_model = model
+    _worker_chips = with_chips
+    _worker_jitters = num_jitters
+    # Cargar los modelos al crear el proceso, no en su primer trabajo
+    face_models.preload(face_models.models_for(model))
+
+
+def _encode_job(img_path):
+    return encode_image(img_path, model=_worker_model, with_chips=_worker_chips, num_jitters=_worker_jitters)
+
+
+def iter_encoded(img_paths, model="hog", workers=1, with_chips=False, num_jitters=1):
+    """
+    Codifica una lista de imágenes, en serie o con un pool de procesos, y va
+    entregando los resultados en el mismo orden que img_paths (con
+    with_chips=True, tuplas (cajas, encodings, recortes)). Un solo pool para
+    toda la lista: quien consume puede ir guardando por lotes sin esperar al
+    final.
+    """
+    total = len(img_paths)
+    if total == 0:
+        return
+
+    start = time.perf_counter()
+    last_report = start
+    done = 0
+
+    if workers > 1:
+        # chunksize moderado: reparte bien sin pagar IPC por cada imagen
+        chunksize = max(1, min(16, total // (workers * 4)))
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(model, with_chips, num_jitters)
+        )
+        jobs = executor.map(_encode_job, img_paths, chunksize=chunksize)
+    else:
+        executor = None
+        jobs = (
+            encode_image(img_path, model=model, with_chips=with_chips, num_jitters=num_jitters)
+            for img_path in img_paths
+        )
+
+    try:
+        for result in jobs:
+            done += 1
+            yield result
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY_SEC:
+                rate = done / (now - start)
+                print(f"  {done}/{total} imágenes ({rate:.1f} img/s)")
+                last_report = now
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Codificadas {total} imágenes en {elapsed:.1f}s ({total / elapsed:.1f} img/s, {workers} proceso(s))")
+
+
+def encode_many(img_paths, model="hog", workers=1, with_chips=False, num_jitters=1):
+    """Como iter_encoded(), pero devuelve la lista completa de resultados."""
+    return list(iter_encoded(img_paths, model=model, workers=workers, with_chips=with_chips, num_jitters=num_jitters))
+
+
+def iter_train_images(train_dir):
+    """Recorre las imágenes de data/train/ en orden estable. Devuelve (etiqueta, ruta)."""
+    for person_dir in sorted(Path(train_dir).iterdir()):
+        if not person_dir.is_dir():
+            continue
+        for img_path in sorted(person_dir.glob("*.*")):
+            # Solo imágenes: se saltan los sidecar .json y cualquier otro archivo
+            if img_path.suffix.lower() in IMAGE_EXTS:
+                yield person_dir.name, img_path
+
+
+def _encode_chip_batch(batch, num_jitters):
+    """Pasa por la red en un solo lote los recortes de varias entradas y reparte los encodings."""
+    if not batch:
+        return
+    chips = np.concatenate([chips for _, chips in batch])
+    encs = np.asarray(face_models.face_encodings_from_chips(chips, num_jitters), dtype=np.float32)
+    encs = encs.reshape(len(chips), ENCODING_DIM)
+    offset = 0
+    for entry, entry_chips in batch:
+        entry["encodings"] = encs[offset:offset + len(entry_chips)].copy()
+        offset += len(entry_chips)
+
+
+class EncodingCache:
+    def __init__(self, path, chips=None):
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.name + ".log")
+        self.entries = {}
+        # num_jitters con que están calculados todos los encodings: add() y
+        # sync() lo respetan y solo reencode() lo cambia (recodificando todo)
+        self.num_jitters = 1
+        self.journal_count = 0  # entradas en el diario, pendientes de pasar al pickle
+        self._journal_broken = False  # tras un registro cortado no se puede seguir añadiendo
+        # ChipCache opcional: guarda los rostros alineados de lo que se codifica
+        self.chips = chips
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as exc:
+            print(f"Cache de encodings ilegible ({exc}), se regenera.")
+            return
+        if data.get("version") != CACHE_VERSION:
+            print("Cache de encodings con versión distinta, se regenera.")
+            return
+        self.entries = data["entries"]
+        self.num_jitters = data.get("num_jitters", 1)
+        self._replay_journal()
+
+    def _replay_journal(self):
+        if not self.journal_path.exists():
+            return
+        with open(self.journal_path, "rb") as f:
+            try:
+                if pickle.load(f) != self._journal_header():
+                    print("Diario de la cache con versión distinta, se ignora.")
+                    return
+                while True:
+                    key, entry = pickle.load(f)
+                    self.entries[key] = entry
+                    self.journal_count += 1
+            except EOFError:
+                pass
+            except (pickle.UnpicklingError, ValueError, TypeError) as exc:
+                # Una escritura cortada a medias: vale lo leído hasta ahí y el
+                # próximo guardado reescribe el pickle
+                self._journal_broken = True
+                print(f"Diario de la cache truncado ({exc}), se usa lo anterior.")
+
+    def _journal_header(self):
+        return {"version": CACHE_VERSION, "num_jitters": self.num_jitters}
+
+    def save(self):
+        # Escribir en un temporal y reemplazar para no corromper la cache
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "num_jitters": self.num_jitters, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        # El pickle ya incluye lo del diario
+        self.journal_path.unlink(missing_ok=True)
+        self.journal_count = 0
+        self._journal_broken = False
+        if self.chips is not None:
+            self.chips.save()
+
+    def _append(self, keys):
+        """Guarda solo las entradas `keys` al final del diario (o todo, si toca compactar)."""
+        journal_count = self.journal_count + len(keys)
+        if self._journal_broken or not self.path.exists() or journal_count * 2 > len(self.entries):
+            self.save()
+            return
+        is_new = not self.journal_path.exists()
+        with open(self.journal_path, "ab") as f:
+            if is_new:
+                pickle.dump(self._journal_header(), f)
+            for key in keys:
+                pickle.dump((key, self.entries[key]), f)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_count = journal_count
+        if self.chips is not None:
+            self.chips.save()
+
+    def add(self, img_paths, train_dir, model="hog"):
+        """
+        Codifica solo `img_paths` (imágenes recién guardadas en train_dir) y
+        las añade a la cache, sin recorrer el resto de train_dir. Devuelve
+        {"encodings", "names"} de esas imágenes; un sync() posterior las
+        reutiliza en lugar de volver a codificarlas.
+        """
+        train_dir = Path(train_dir)
+        img_paths = [Path(p) for p in img_paths]
+        encoded = encode_many(img_paths, model=model, with_chips=self.chips is not None, num_jitters=self.num_jitters)
+        encodings = []
+        names = []
+        keys = []
+        for img_path, (boxes, encs, *chips) in zip(img_paths, encoded):
+            if not boxes:
+                print(f"Sin rostro en {img_path}, se omite.")
+            st = img_path.stat()
+            key = img_path.relative_to(train_dir).as_posix()
+            digest = file_digest(img_path)
+            keys.append(key)
+            self.entries[key] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha1": digest,
+                "boxes": boxes,
+                "encodings": encs,
+            }
+            if chips:
+                self.chips.put(digest, chips[0])
+            label = img_path.relative_to(train_dir).parts[0]
+            encodings.extend(encs)
+            names.extend([label] * len(encs))
+        self._append(keys)
+        return {"encodings": encodings, "names": names}
+
+    def reencode(self, train_dir, model="hog", num_jitters=1):
+        """
+        Recalcula los encodings de todas las entradas (p. ej. tras cambiar el
+        encoder o num_jitters), que queda guardado como el de la cache. Las
+        imágenes con recortes en la ChipCache pasan solo por la red; las demás
+        se decodifican, detectan y alinean una vez y sus recortes quedan
+        guardados para la próxima. Las entradas cuya imagen ya no existe se
+        descartan.
+        """
+        if self.chips is None:
+            raise ValueError("reencode() necesita una ChipCache")
+        train_dir = Path(train_dir)
+        start = time.perf_counter()
+        missing = [key for key in self.entries if not (train_dir / key).exists()]
+        for key in missing:
+            del self.entries[key]
+        self.num_jitters = num_jitters
+
+        from_chips = 0
+        full = []
+        batch = []  # (entrada, recortes) hasta juntar REENCODE_BATCH recortes
+        batch_chips = 0
+        for key, entry in self.entries.items():
+            chips = self.chips.get(entry["sha1"])
+            if chips is None:
+                full.append(key)
+                continue
+            batch.append((entry, chips))
+            batch_chips += len(chips)
+            from_chips += 1
+            if batch_chips >= REENCODE_BATCH:
+                _encode_chip_batch(batch, num_jitters)
+                batch, batch_chips = [], 0
+        _encode_chip_batch(batch, num_jitters)
+
+        encoded = encode_many([train_dir / key for key in full], model=model, with_chips=True, num_jitters=num_jitters)
+        for key, (boxes, encs, chips) in zip(full, encoded):
+            entry = self.entries[key]
+            self.chips.put(entry["sha1"], chips)
+            entry["boxes"] = boxes
+            entry["encodings"] = encs
+        self.save()
+        elapsed = time.perf_counter() - start
+        print(f"Recodificadas {from_chips} imágenes desde recortes y {len(full)} desde la foto en {elapsed:.1f}s"
+              f" (num_jitters={num_jitters}, {len(missing)} eliminadas)")
+        return {"from_chips": from_chips, "from_images": len(full), "removed": len(missing)}
+
+    def sync(self, train_dir, model="hog", workers=1, encoder=None):
+        """
+        Sincroniza la cache con el contenido actual de train_dir.
+        Reutiliza las entradas cuyo tamaño/mtime (o, si cambiaron, su hash)
+        coinciden, codifica solo lo nuevo (con `workers` procesos, o con
+        `encoder(rutas) -> [(cajas, encodings)]` si se da) y elimina lo que ya
+        no existe. Lo nuevo se codifica con el num_jitters de la cache.
+        """
+        if encoder is not None and self.num_jitters != 1:
+            # El encoder externo (demonio) codifica con num_jitters=1
+            raise ValueError(f"La cache usa num_jitters={self.num_jitters}; el encoder externo no lo admite")
+        train_dir = Path(train_dir)
+        by_digest = {entry["sha1"]: entry for entry in self.entries.values()}
+        live = {}
+        order = []
+        pending = []
+        reused = 0
+
+        for label, img_path in iter_train_images(train_dir):
+            key = img_path.relative_to(train_dir).as_posix()
+            order.append((key, label))
+            st = img_path.stat()
+            entry = self.entries.get(key)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                live[key] = entry
+                reused += 1
+                continue
+            # El pre-chequeo falló: comparar por contenido (renombrados, copias, touch)
+            digest = file_digest(img_path)
+            cached = by_digest.get(digest)
+            if cached is not None:
+                live[key] = dict(cached, size=st.st_size, mtime_ns=st.st_mtime_ns)
+                reused += 1
+                continue
+            pending.append((key, img_path, st, digest))
+
+        pending_paths = [item[1] for item in pending]
+        if encoder is not None:
+            encoded = encoder(pending_paths) if pending_paths else []
+        else:
+            encoded = encode_many(
+                pending_paths, model=model, workers=workers, with_chips=self.chips is not None,
+                num_jitters=self.num_jitters,
+            )
+        for (key, img_path, st, digest), (boxes, encs, *chips) in zip(pending, encoded):
+            if not boxes:
+                print(f"Sin rostro en {img_path}, se omite.")
+            if chips:
+                self.chips.put(digest, chips[0])
+            live[key] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha1": digest,
+                "boxes": boxes,
+                "encodings": encs,
+            }
+
+        removed = len(set(self.entries) - set(live))
+        self.entries = live
+        self.save()
+        if self.chips is not None:
+            self.chips.prune({entry["sha1"] for entry in live.values()})
+        print(f"Cache: {reused} reutilizadas, {len(pending)} nuevas/modificadas, {removed} eliminadas.")
+
+        encodings = []
+        names = []
+        for key, label in order:
+            face_encs = live[key]["encodings"]
+            encodings.extend(face_encs)
+            names.extend([label] * len(face_encs))
+        return {"encodings": encodings, "names": names}
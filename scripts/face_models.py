@@ -0,0 +1,215 @@
+"""
+Modelos de dlib cargados bajo demanda, con la misma API que face_recognition.
+
+Importar face_recognition.api construye al momento el detector HOG, el
+detector CNN (MMOD), los predictores de 5 y 68 puntos y el encoder ResNet.
+Los scripts solo usan HOG + 5 puntos + encoder, así que pagaban al arrancar
+el tiempo y la memoria del CNN y del predictor de 68 puntos sin usarlos.
+
+Aquí cada modelo se crea la primera vez que se pide, una sola vez aunque lo
+pidan varios hilos a la vez (doble comprobación con lock). preload() los
+carga por adelantado (p. ej. en un hilo mientras se abre la cámara, o en el
+inicializador de cada proceso del pool) para que el primer frame no espere.
+
+face_locations, face_encodings y load_image_file devuelven exactamente lo
+mismo que las funciones homónimas de face_recognition.
+
+Uso como script (tiempo y memoria de cargar cada modelo):
+  python scripts/face_models.py
+"""
+import threading
+import time
+
+import numpy as np
+
+# Modelos que usan los scripts en el camino normal (HOG + 5 puntos + encoder)
+DEFAULT_PRELOAD = ("hog", "pose_5", "encoder")
+# Recorte alineado que el encoder ResNet pasa a la red (los mismos valores que usa dlib)
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+
+_models = {}
+_lock = threading.Lock()
+
+
+def _build_hog():
+    import dlib
+    return dlib.get_frontal_face_detector()
+
+
+def _build_cnn():
+    import dlib
+    import face_recognition_models
+    return dlib.cnn_face_detection_model_v1(face_recognition_models.cnn_face_detector_model_location())
+
+
+def _build_pose_5():
+    import dlib
+    import face_recognition_models
+    return dlib.shape_predictor(face_recognition_models.pose_predictor_five_point_model_location())
+
+
+def _build_pose_68():
+    import dlib
+    import face_recognition_models
+    return dlib.shape_predictor(face_recognition_models.pose_predictor_model_location())
+
+
+def _build_encoder():
+    import dlib
+    import face_recognition_models
+    return dlib.face_recognition_model_v1(face_recognition_models.face_recognition_model_location())
+
+
+_FACTORIES = {
+    "hog": _build_hog,
+    "cnn": _build_cnn,
+    "pose_5": _build_pose_5,
+    "pose_68": _build_pose_68,
+    "encoder": _build_encoder,
+}
+
+
+def get_model(name):
+    """Devuelve el modelo `name`, creándolo la primera vez (seguro entre hilos)."""
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = _FACTORIES[name]()
+                _models[name] = model
+    return model
+
+
+def models_for(detection_model="hog"):
+    """Modelos necesarios para detectar con `detection_model` y codificar."""
+    return ("cnn" if detection_model == "cnn" else "hog", "pose_5", "encoder")
+
+
+def loaded():
+    """Nombres de los modelos ya cargados."""
+    return sorted(_models)
+
+
+def preload(names=DEFAULT_PRELOAD, background=False):
+    """
+    Carga los modelos indicados. Con background=True lo hace en un hilo y
+    devuelve el hilo (quien pida un modelo antes esperará en el lock).
+    """
+    def load():
+        for name in names:
+            get_model(name)
+
+    if not background:
+        load()
+        return None
+    thread = threading.Thread(target=load, name="face-models-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def _rect_to_css(rect):
+    return rect.top(), rect.right(), rect.bottom(), rect.left()
+
+
+def _css_to_rect(css):
+    import dlib
+    return dlib.rectangle(css[3], css[0], css[1], css[2])
+
+
+def _trim_css_to_bounds(css, image_shape):
+    return max(css[0], 0), min(css[1], image_shape[1]), min(css[2], image_shape[0]), max(css[3], 0)
+
+
+def load_image_file(file, mode="RGB"):
+    from PIL import Image
+    im = Image.open(file)
+    if mode:
+        im = im.convert(mode)
+    return np.array(im)
+
+
+def face_locations(img, number_of_times_to_upsample=1, model="hog"):
+    """Cajas (top, right, bottom, left) de los rostros de una imagen RGB."""
+    if model == "cnn":
+        return [_trim_css_to_bounds(_rect_to_css(face.rect), img.shape)
+                for face in get_model("cnn")(img, number_of_times_to_upsample)]
+    return [_trim_css_to_bounds(_rect_to_css(face), img.shape)
+            for face in get_model("hog")(img, number_of_times_to_upsample)]
+
+
+def raw_face_landmarks(face_image, face_locations=None, model="small"):
+    """Landmarks de dlib (full_object_detection) de cada rostro."""
+    if face_locations is None:
+        rects = get_model("hog")(face_image, 1)
+    else:
+        rects = [_css_to_rect(location) for location in face_locations]
+    predictor = get_model("pose_5" if model == "small" else "pose_68")
+    return [predictor(face_image, rect) for rect in rects]
+
+
+def face_encodings(face_image, known_face_locations=None, num_jitters=1, model="small"):
+    """Encoding de 128-d de cada rostro (lista de arrays float64, como face_recognition)."""
+    landmarks = raw_face_landmarks(face_image, known_face_locations, model)
+    encoder = get_model("encoder")
+    return [np.array(encoder.compute_face_descriptor(face_image, shape, num_jitters)) for shape in landmarks]
+
+
+def _shape_from_points(box, points):
+    import dlib
+    return dlib.full_object_detection(_css_to_rect(box), [dlib.point(int(x), int(y)) for x, y in points])
+
+
+def face_encodings_from_landmarks(face_image, landmarks, num_jitters=1):
+    """
+    Encodings a partir de landmarks ya conocidos: [(caja, [(x, y), ...])].
+    No pasa por el detector ni por el shape predictor, así que para la misma
+    imagen y los mismos puntos el resultado es siempre el mismo.
+    """
+    encoder = get_model("encoder")
+    return [
+        np.array(encoder.compute_face_descriptor(face_image, _shape_from_points(box, points), num_jitters))
+        for box, points in landmarks
+    ]
+
+
+def face_chips(face_image, known_face_locations=None, landmarks=None):
+    """
+    Rostros alineados (CHIP_SIZE x CHIP_SIZE RGB uint8), el mismo recorte que
+    hace el encoder antes de la red. Con `landmarks` [(caja, puntos)] no se
+    ajusta el shape predictor.
+    """
+    import dlib
+    if landmarks is not None:
+        shapes = [_shape_from_points(box, points) for box, points in landmarks]
+    else:
+        shapes = raw_face_landmarks(face_image, known_face_locations)
+    return [np.asarray(dlib.get_face_chip(face_image, shape, size=CHIP_SIZE, padding=CHIP_PADDING)) for shape in shapes]
+
+
+def face_encodings_from_chips(chips, num_jitters=1):
+    """
+    Encodings de rostros ya alineados (face_chips): solo la red, sin imagen ni
+    landmarks. Los recortes se pasan a dlib en un solo lote.
+    """
+    batch = [np.ascontiguousarray(chip) for chip in chips]
+    if not batch:
+        return []
+    encoder = get_model("encoder")
+    return [np.array(d) for d in encoder.compute_face_descriptor(batch, num_jitters)]
+
+
+def main():
+    from memory_usage import peak_rss_mb
+
+    print(f"{'modelo':<10} {'carga s':>8} {'RSS MB':>8}")
+    print(f"{'(inicio)':<10} {'':>8} {peak_rss_mb():>8.1f}")
+    for name in list(DEFAULT_PRELOAD) + [n for n in _FACTORIES if n not in DEFAULT_PRELOAD]:
+        t0 = time.perf_counter()
+        get_model(name)
+        print(f"{name:<10} {time.perf_counter() - t0:>8.2f} {peak_rss_mb():>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,575 @@
+"""
+Galería de embeddings en disco, pensada para abrirse sin copiar datos.
+
+Estructura de data/gallery/ (almacén por segmentos, solo se añade):
+  manifest.json   versión, dimensión, tabla de nombres y lista de segmentos
+                  vivos; es lo único que se reescribe (temporal + reemplazo)
+  seg_000001/     segmento inmutable:
+    encodings.npy   matriz contigua float32 (n x 128)
+    labels.npy      columna int32 con el índice del nombre de cada fila
+    sq_norms.npy    normas L2 al cuadrado de cada fila (float32)
+  tomb_000003.npy filas borradas de un segmento (lápidas, índices locales)
+
+Añadir fotos escribe un segmento nuevo con solo esas filas y reemplaza el
+manifiesto: el coste es O(filas nuevas) y un corte a mitad de escritura deja
+un segmento huérfano, nunca una galería rota. Borrar a una persona escribe
+lápidas. compact_segments() (también en segundo plano) fusiona los
+segmentos en uno y aplica las lápidas.
+
+Los lectores no usan locks: leen el manifiesto y abren los .npy de sus
+segmentos con np.load(mmap_mode="r"); los segmentos nunca se modifican. Con
+un solo segmento sin lápidas (el estado tras compactar o guardar) la
+galería se abre en milisegundos sin copiar nada; con varios, las filas se
+concatenan en memoria al abrir.
+
+Opcionalmente, copias cuantizadas del segmento (ver matcher.QuantizedMatcher):
+  encodings_float16.npy            float16, la mitad de memoria
+  encodings_int8.npy + int8_scale.npy
+                                   int8 con una escala por dimensión, un cuarto
+  <tipo>_sq_norms.npy              normas de los valores reconstruidos
+
+Las galerías antiguas (header.json + .npy en la raíz) se siguen abriendo y
+se convierten al primer guardado.
+
+Uso como script:
+  python scripts/gallery.py migrate               # migración única desde el pickle antiguo
+  python scripts/gallery.py quantize int8         # guarda la copia int8 e informa la desviación
+  python scripts/gallery.py info                  # segmentos, filas y lápidas
+  python scripts/gallery.py compact               # fusiona los segmentos en uno
+  python scripts/gallery.py delete NOMBRE         # borra (con lápidas) las filas de una persona
+"""
+import argparse
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+
+GALLERY_VERSION = 2  # v2: segmentos + manifiesto; v1: header.json y .npy en la raíz
+ENCODING_DIM = 128
+MANIFEST_FILE = "manifest.json"
+HEADER_FILE = "header.json"  # formato v1
+ENCODINGS_FILE = "encodings.npy"
+LABELS_FILE = "labels.npy"
+NORMS_FILE = "sq_norms.npy"
+SEGMENT_PREFIX = "seg_"
+TOMBSTONE_PREFIX = "tomb_"
+QUANTIZED_KINDS = ("float16", "int8")
+QUANTIZE_CHUNK = 65536
+# Nombres que escribe este módulo (segmentos, lápidas y sus temporales); _cleanup no toca nada más
+GENERATED_NAME = re.compile(r"^(seg|tomb)_\d{6}(\.tmp)?(\.npy)?$")
+OPEN_RETRIES = 3  # reintentos si una compactación cambia el manifiesto mientras se abre
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+# Un solo escritor por proceso a la vez (añadir, borrar, compactar, guardar)
+_write_lock = threading.Lock()
+# Segmentos que una compactación está escribiendo fuera del lock (_cleanup no los toca)
+_in_progress = set()
+
+
+def _save_npy_atomic(path, array):
+    # np.save añade ".npy" si falta, así que el temporal también lo lleva
+    tmp_path = path.with_name(path.stem + ".tmp.npy")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def quantize_encodings(encodings, kind):
+    """
+    Versión comprimida de la matriz: {"codes", "scale", "sq_norms"}. Para int8
+    la escala es por dimensión (max |x| / 127), así cada columna usa todo el
+    rango. Las normas son las de los valores reconstruidos, para que la
+    distancia calculada sobre los códigos sea coherente.
+    """
+    if kind not in QUANTIZED_KINDS:
+        raise ValueError(f"Cuantización desconocida: {kind} (usa {', '.join(QUANTIZED_KINDS)})")
+    count, dim = encodings.shape
+    scale = None
+    if kind == "float16":
+        codes = np.empty((count, dim), dtype=np.float16)
+    else:
+        codes = np.empty((count, dim), dtype=np.int8)
+        max_abs = np.zeros(dim, dtype=np.float32)
+        for start in range(0, count, QUANTIZE_CHUNK):
+            block = np.abs(np.asarray(encodings[start:start + QUANTIZE_CHUNK], dtype=np.float32))
+            np.maximum(max_abs, block.max(axis=0), out=max_abs)
+        scale = np.maximum(max_abs, 1e-12) / 127.0
+    sq_norms = np.empty(count, dtype=np.float32)
+    for start in range(0, count, QUANTIZE_CHUNK):
+        block = np.asarray(encodings[start:start + QUANTIZE_CHUNK], dtype=np.float32)
+        if scale is None:
+            codes[start:start + QUANTIZE_CHUNK] = block
+            restored = codes[start:start + QUANTIZE_CHUNK].astype(np.float32)
+        else:
+            codes[start:start + QUANTIZE_CHUNK] = np.clip(np.rint(block / scale), -127, 127)
+            restored = codes[start:start + QUANTIZE_CHUNK] * scale
+        sq_norms[start:start + QUANTIZE_CHUNK] = np.einsum("ij,ij->i", restored, restored)
+    return {"codes": codes, "scale": scale, "sq_norms": sq_norms}
+
+
+def _quantized_files(prefix, kind, arrays):
+    files = {"codes": f"{prefix}encodings_{kind}.npy", "scale": None, "sq_norms": f"{prefix}{kind}_sq_norms.npy"}
+    if arrays["scale"] is not None:
+        files["scale"] = f"{prefix}{kind}_scale.npy"
+    return files
+
+
+def _load_quantized(path, files_by_kind, mmap_mode):
+    return {
+        kind: {key: None if name is None else np.load(path / name, mmap_mode=mmap_mode) for key, name in files.items()}
+        for kind, files in files_by_kind.items()
+    }
+
+
+def _read_manifest(path):
+    with open(Path(path) / MANIFEST_FILE, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != GALLERY_VERSION:
+        raise ValueError(f"Versión de galería no soportada: {manifest.get('version')}")
+    return manifest
+
+
+def _write_manifest(path, manifest):
+    manifest["count"] = sum(seg["count"] - seg["deleted"] for seg in manifest["segments"])
+    # El manifiesto se escribe al final: es lo que da por válidos los segmentos
+    tmp_path = path / (MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path / MANIFEST_FILE)
+
+
+def _new_manifest(dim, names, quantize=()):
+    return {
+        "version": GALLERY_VERSION,
+        "dim": int(dim),
+        "dtype": "float32",
+        "count": 0,
+        "names": list(names),
+        "norms": {
+            "file": NORMS_FILE,
+            "kind": "squared_l2",
+            "l2_normalized": False,
+        },
+        "quantize": list(quantize),
+        "next_id": 1,
+        "segments": [],
+    }
+
+
+def _next_name(manifest, prefix):
+    name = f"{prefix}{manifest['next_id']:06d}"
+    manifest["next_id"] += 1
+    return name
+
+
+def _write_segment(path, name, encodings, labels, sq_norms, quantize=()):
+    """
+    Escribe un segmento en un directorio temporal y lo renombra al final.
+    Devuelve su entrada para el manifiesto.
+    """
+    tmp_dir = path / (name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+    np.save(tmp_dir / ENCODINGS_FILE, encodings)
+    np.save(tmp_dir / LABELS_FILE, np.ascontiguousarray(labels, dtype=np.int32))
+    np.save(tmp_dir / NORMS_FILE, np.ascontiguousarray(sq_norms, dtype=np.float32))
+    quantized_files = {}
+    for kind in quantize:
+        arrays = quantize_encodings(encodings, kind)
+        files = _quantized_files("", kind, arrays)
+        for key, file_name in files.items():
+            if file_name is not None:
+                np.save(tmp_dir / file_name, arrays[key])
+        quantized_files[kind] = {key: None if f is None else f"{name}/{f}" for key, f in files.items()}
+    os.replace(tmp_dir, path / name)
+    return {"name": name, "count": len(encodings), "deleted": 0, "tombstones": None, "quantized": quantized_files}
+
+
+def _segment_arrays(path, segment, mmap_mode):
+    """(encodings, labels, sq_norms, filas vivas o None) de un segmento."""
+    seg_dir = path / segment["name"]
+    encodings = np.load(seg_dir / ENCODINGS_FILE, mmap_mode=mmap_mode)
+    labels = np.load(seg_dir / LABELS_FILE, mmap_mode=mmap_mode)
+    sq_norms = np.load(seg_dir / NORMS_FILE, mmap_mode=mmap_mode)
+    if len(encodings) != segment["count"] or len(labels) != segment["count"]:
+        raise ValueError(f"Segmento inconsistente en {seg_dir}: el manifiesto no coincide con los datos")
+    keep = None
+    if segment["tombstones"]:
+        keep = np.ones(segment["count"], dtype=bool)
+        keep[np.load(path / segment["tombstones"])] = False
+    return encodings, labels, sq_norms, keep
+
+
+def _legacy_files():
+    """Archivos del formato v1 en la raíz (header.json, matrices y copias cuantizadas)."""
+    names = {HEADER_FILE, ENCODINGS_FILE, LABELS_FILE, NORMS_FILE}
+    for kind in QUANTIZED_KINDS:
+        names.update({f"encodings_{kind}.npy", f"{kind}_scale.npy", f"{kind}_sq_norms.npy"})
+    return names
+
+
+def _cleanup(path, manifest):
+    """
+    Borra lo que el manifiesto ya no referencia: segmentos compactados,
+    lápidas viejas, temporales de escrituras cortadas y el formato v1. Solo
+    se consideran los nombres que genera este módulo; cualquier otro archivo
+    (el índice IVF, lo que deje el usuario) se conserva. Si un archivo sigue
+    abierto (mmap en Windows) se deja para la próxima vez.
+    """
+    live = {seg["name"] for seg in manifest["segments"]}
+    live.update(seg["tombstones"] for seg in manifest["segments"] if seg["tombstones"])
+    legacy = _legacy_files()
+    for child in path.iterdir():
+        name = child.name
+        if name.split(".")[0] in _in_progress or name in live:
+            continue
+        if not (GENERATED_NAME.match(name) or (name in legacy and child.is_file())):
+            continue
+        try:
+            if child.is_dir():
+                shutil.rmtree(child)
+            else:
+                child.unlink()
+        except OSError:
+            pass
+
+
+class Gallery:
+    def __init__(self, encodings, labels, names, sq_norms=None, path=None, quantized=None):
+        self.encodings = encodings
+        self.labels = labels
+        self.names = list(names)
+        if sq_norms is None:
+            sq_norms = np.einsum("ij,ij->i", encodings, encodings, dtype=np.float32)
+        self.sq_norms = sq_norms
+        self.path = path
+        self._quantized = dict(quantized or {})
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def empty(cls, dim=ENCODING_DIM):
+        return cls(
+            np.empty((0, dim), dtype=np.float32),
+            np.empty(0, dtype=np.int32),
+            [],
+        )
+
+    @classmethod
+    def from_lists(cls, encodings, row_names):
+        """Construye la galería a partir de las listas paralelas encodings/nombres."""
+        if len(encodings) == 0:
+            return cls.empty()
+        names = sorted(set(row_names))
+        name_to_id = {name: i for i, name in enumerate(names)}
+        matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32))
+        labels = np.fromiter((name_to_id[n] for n in row_names), dtype=np.int32, count=len(row_names))
+        return cls(matrix, labels, names)
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        """Abre una galería guardada; con mmap=True y un solo segmento no se copia nada a memoria."""
+        path = Path(path)
+        if not (path / MANIFEST_FILE).exists():
+            return cls._open_v1(path, mmap)
+        for attempt in range(OPEN_RETRIES):
+            try:
+                return cls._open_segments(path, mmap)
+            except FileNotFoundError:
+                # Una compactación reemplazó el manifiesto y borró segmentos entre medias
+                if attempt == OPEN_RETRIES - 1:
+                    raise
+
+    @classmethod
+    def _open_segments(cls, path, mmap):
+        manifest = _read_manifest(path)
+        mmap_mode = "r" if mmap else None
+        dim = manifest["dim"]
+        parts = [_segment_arrays(path, seg, mmap_mode) for seg in manifest["segments"]]
+        quantized = {}
+        if not parts:
+            encodings = np.empty((0, dim), dtype=np.float32)
+            labels = np.empty(0, dtype=np.int32)
+            sq_norms = np.empty(0, dtype=np.float32)
+        elif len(parts) == 1 and parts[0][3] is None:
+            encodings, labels, sq_norms, _ = parts[0]
+            quantized = _load_quantized(path, manifest["segments"][0]["quantized"], mmap_mode)
+        else:
+            # Varios segmentos o lápidas: se juntan las filas vivas en memoria
+            encodings = np.concatenate([enc if keep is None else enc[keep] for enc, _, _, keep in parts])
+            labels = np.concatenate([lab if keep is None else lab[keep] for _, lab, _, keep in parts])
+            sq_norms = np.concatenate([nrm if keep is None else nrm[keep] for _, _, nrm, keep in parts])
+        if encodings.shape != (manifest["count"], dim):
+            raise ValueError(f"Galería inconsistente en {path}: el manifiesto no coincide con los datos")
+        return cls(encodings, labels, manifest["names"], sq_norms=sq_norms, path=path, quantized=quantized)
+
+    @classmethod
+    def _open_v1(cls, path, mmap):
+        with open(path / HEADER_FILE, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != 1:
+            raise ValueError(f"Versión de galería no soportada: {header.get('version')}")
+        mmap_mode = "r" if mmap else None
+        encodings = np.load(path / ENCODINGS_FILE, mmap_mode=mmap_mode)
+        labels = np.load(path / LABELS_FILE, mmap_mode=mmap_mode)
+        sq_norms = np.load(path / header["norms"]["file"], mmap_mode=mmap_mode)
+        if encodings.shape != (header["count"], header["dim"]) or len(labels) != header["count"]:
+            raise ValueError(f"Galería inconsistente en {path}: el header no coincide con los datos")
+        quantized = _load_quantized(path, header.get("quantized", {}), mmap_mode)
+        return cls(encodings, labels, header["names"], sq_norms=sq_norms, path=path, quantized=quantized)
+
+    def quantized(self, kind):
+        """Copia cuantizada guardada con la galería, o calculada al vuelo si no existe."""
+        if kind not in self._quantized:
+            self._quantized[kind] = quantize_encodings(self.encodings, kind)
+        return self._quantized[kind]
+
+    def save(self, path, quantize=()):
+        """
+        Guarda la galería completa como un único segmento nuevo (con las copias
+        comprimidas de `quantize`) y retira los anteriores. Para añadir unas
+        pocas filas usar append_segment(), que no reescribe lo existente.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with _write_lock:
+            manifest = _new_manifest(self.encodings.shape[1], self.names, quantize)
+            if (path / MANIFEST_FILE).exists():
+                manifest["next_id"] = _read_manifest(path)["next_id"]
+            name = _next_name(manifest, SEGMENT_PREFIX)
+            segment = _write_segment(path, name, self.encodings, self.labels, self.sq_norms, quantize)
+            manifest["segments"] = [segment]
+            _write_manifest(path, manifest)
+            _cleanup(path, manifest)
+        self.path = path
+
+    def take(self, rows):
+        """Galería en memoria con solo las filas `rows` (misma tabla de nombres)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return Gallery(
+            np.ascontiguousarray(self.encodings[rows], dtype=np.float32),
+            np.ascontiguousarray(self.labels[rows], dtype=np.int32),
+            self.names,
+            sq_norms=np.ascontiguousarray(self.sq_norms[rows], dtype=np.float32),
+        )
+
+    def append(self, encodings, row_names):
+        """
+        Galería en memoria con las filas nuevas al final. Las filas y los
+        índices de nombre existentes no cambian; los nombres nuevos se añaden
+        al final de la tabla, así un índice IVF guardado sigue valiendo.
+        """
+        names = list(self.names)
+        name_to_id = {name: i for i, name in enumerate(names)}
+        for name in row_names:
+            if name not in name_to_id:
+                name_to_id[name] = len(names)
+                names.append(name)
+        dim = self.encodings.shape[1]
+        new = np.asarray(encodings, dtype=np.float32).reshape(-1, dim)
+        new_labels = np.fromiter((name_to_id[n] for n in row_names), dtype=np.int32, count=len(row_names))
+        new_norms = np.einsum("ij,ij->i", new, new, dtype=np.float32)
+        return Gallery(
+            np.concatenate([self.encodings, new]),
+            np.concatenate([self.labels, new_labels]).astype(np.int32, copy=False),
+            names,
+            sq_norms=np.concatenate([self.sq_norms, new_norms]).astype(np.float32, copy=False),
+            path=self.path,
+        )
+
+    def name_at(self, index):
+        return self.names[self.labels[index]]
+
+    def row_names(self):
+        """Lista de nombres por fila (formato de los antiguos `names`)."""
+        return [self.names[label] for label in self.labels.tolist()]
+
+
+def exists(path):
+    path = Path(path)
+    return (path / MANIFEST_FILE).exists() or (path / HEADER_FILE).exists()
+
+
+def append_segment(path, gallery, start):
+    """
+    Guarda las filas gallery[start:] como un segmento nuevo y actualiza la
+    tabla de nombres, sin tocar los segmentos existentes: O(filas nuevas).
+    `gallery` debe ser la galería abierta de `path` más las filas añadidas
+    (Gallery.append). Devuelve el número de segmentos.
+    """
+    path = Path(path)
+    if not (path / MANIFEST_FILE).exists():
+        # Galería v1 o inexistente: el primer guardado la convierte
+        gallery.save(path)
+        return 1
+    with _write_lock:
+        manifest = _read_manifest(path)
+        if manifest["count"] != start:
+            raise ValueError(f"La galería en {path} cambió ({manifest['count']} filas, se esperaban {start})")
+        if start < len(gallery):
+            name = _next_name(manifest, SEGMENT_PREFIX)
+            manifest["segments"].append(_write_segment(
+                path, name, gallery.encodings[start:], gallery.labels[start:], gallery.sq_norms[start:],
+            ))
+        manifest["names"] = list(gallery.names)
+        _write_manifest(path, manifest)
+    gallery.path = path
+    return len(manifest["segments"])
+
+
+def delete_identity(path, name):
+    """
+    Marca con lápidas todas las filas de `name`. Solo escribe los índices
+    borrados; los segmentos no cambian. Devuelve cuántas filas se borraron.
+    """
+    path = Path(path)
+    with _write_lock:
+        manifest = _read_manifest(path)
+        if name not in manifest["names"]:
+            return 0
+        label = manifest["names"].index(name)
+        removed = 0
+        for segment in manifest["segments"]:
+            _, labels, _, keep = _segment_arrays(path, segment, "r")
+            hit = np.asarray(labels) == label
+            if keep is not None:
+                hit &= keep
+            if not hit.any():
+                continue
+            dead = np.flatnonzero(hit if keep is None else hit | ~keep).astype(np.int32)
+            tomb_name = _next_name(manifest, TOMBSTONE_PREFIX) + ".npy"
+            _save_npy_atomic(path / tomb_name, dead)
+            removed += int(hit.sum())
+            segment["tombstones"] = tomb_name
+            segment["deleted"] = len(dead)
+        if removed:
+            _write_manifest(path, manifest)
+            _cleanup(path, manifest)
+    return removed
+
+
+def segment_info(path):
+    """Resumen del manifiesto: filas vivas, segmentos y filas con lápida."""
+    manifest = _read_manifest(path)
+    return {
+        "count": manifest["count"],
+        "names": len(manifest["names"]),
+        "segments": [(seg["name"], seg["count"], seg["deleted"]) for seg in manifest["segments"]],
+    }
+
+
+def compact_segments(path, background=False):
+    """
+    Fusiona todos los segmentos en uno y aplica las lápidas. La fusión se hace
+    sin el lock de escritura: se toma una foto del manifiesto, se escribe el
+    segmento fusionado y solo al final se reemplaza el prefijo compactado
+    (los segmentos añadidos mientras tanto se conservan). Si entretanto hubo
+    borrados o un guardado completo, se descarta y se reintentará después.
+    Con background=True corre en un hilo y devuelve el hilo.
+    """
+    path = Path(path)
+    if background:
+        thread = threading.Thread(target=compact_segments, args=(path,), name="gallery-compaction", daemon=True)
+        thread.start()
+        return thread
+
+    with _write_lock:
+        manifest = _read_manifest(path)
+        snapshot = json.loads(json.dumps(manifest["segments"]))
+        if len(snapshot) <= 1 and not any(seg["tombstones"] for seg in snapshot):
+            return False
+        name = _next_name(manifest, SEGMENT_PREFIX)
+        _write_manifest(path, manifest)  # reserva el nombre del segmento
+        _in_progress.add(name)
+
+    try:
+        parts = [_segment_arrays(path, seg, "r") for seg in snapshot]
+        merged = _write_segment(
+            path, name,
+            np.concatenate([enc if keep is None else enc[keep] for enc, _, _, keep in parts]),
+            np.concatenate([lab if keep is None else lab[keep] for _, lab, _, keep in parts]),
+            np.concatenate([nrm if keep is None else nrm[keep] for _, _, nrm, keep in parts]),
+            manifest["quantize"],
+        )
+        del parts
+        with _write_lock:
+            manifest = _read_manifest(path)
+            if manifest["segments"][:len(snapshot)] != snapshot:
+                shutil.rmtree(path / name, ignore_errors=True)
+                return False
+            manifest["segments"] = [merged] + manifest["segments"][len(snapshot):]
+            _write_manifest(path, manifest)
+            _in_progress.discard(name)
+            _cleanup(path, manifest)
+        return True
+    finally:
+        _in_progress.discard(name)
+
+
+def migrate_pickle(pkl_path, gallery_dir):
+    """Convierte un known_encodings.pkl ({"encodings", "names"}) en una galería."""
+    with open(pkl_path, "rb") as f:
+        data = pickle.load(f)
+    gallery = Gallery.from_lists(data["encodings"], data["names"])
+    gallery.save(gallery_dir)
+    return gallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Utilidades de la galería de embeddings")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Convierte known_encodings.pkl al formato de galería")
+    migrate.add_argument("--src", type=Path, default=DATA_DIR / "known_encodings.pkl")
+    migrate.add_argument("--dst", type=Path, default=DATA_DIR / "gallery")
+    quantize = sub.add_parser("quantize", help="Guarda copias cuantizadas e informa la desviación frente a float64")
+    quantize.add_argument("kinds", nargs="+", choices=QUANTIZED_KINDS)
+    quantize.add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    quantize.add_argument("--tolerance", type=float, default=0.50)
+    for command, help_text in (("info", "Muestra los segmentos y las lápidas"), ("compact", "Fusiona los segmentos en uno")):
+        sub.add_parser(command, help=help_text).add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    delete = sub.add_parser("delete", help="Borra (con lápidas) todas las filas de una persona")
+    delete.add_argument("name")
+    delete.add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        if not args.src.exists():
+            print(f"❌ No existe {args.src}")
+            return
+        gallery = migrate_pickle(args.src, args.dst)
+        print(f"✓ Migrados {len(gallery)} embeddings ({len(gallery.names)} personas) a {args.dst}")
+    elif args.command == "quantize":
+        from matcher import drift_report
+
+        gallery = Gallery.open(args.gallery, mmap=False)
+        gallery.save(args.gallery, quantize=args.kinds)
+        print(f"✓ Guardadas copias {', '.join(args.kinds)} de {len(gallery)} embeddings en {args.gallery}")
+        print(f"{'tipo':<8} {'MB':>8} {'err. medio':>11} {'err. máx':>9} {'top-1':>7} {'cambios':>8}")
+        print(f"{'float64':<8} {gallery.encodings.size * 8 / 2**20:>8.2f}")
+        for kind, row in drift_report(gallery, args.kinds, args.tolerance).items():
+            print(f"{kind:<8} {row['megabytes']:>8.2f} {row['mean_abs_error']:>11.5f} {row['max_abs_error']:>9.5f} "
+                  f"{row['top1_agreement']:>7.3f} {row['decision_flips']:>8}")
+    elif args.command == "info":
+        info = segment_info(args.gallery)
+        print(f"{info['count']} embeddings vivos, {info['names']} personas, {len(info['segments'])} segmento(s)")
+        for name, count, deleted in info["segments"]:
+            print(f"  {name}  {count:>8} filas  {deleted:>6} con lápida")
+    elif args.command == "compact":
+        done = compact_segments(args.gallery)
+        print("✓ Segmentos fusionados" if done else "Nada que compactar")
+    elif args.command == "delete":
+        removed = delete_identity(args.gallery, args.name)
+        print(f"✓ {removed} embeddings de {args.name} marcados como borrados")
+        if removed:
+            print("  (borra también su carpeta de data/train/ o volverá en la próxima reconstrucción)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Galería en SQLite (modo WAL) con el origen de cada embedding.
+
+Alternativa opcional a encodings_cache.pkl + data/gallery/: la base guarda
+de qué imagen sale cada embedding, así los cambios en data/train/ se
+resuelven sin recodificar:
+  identities  id, name
+  images      id, identity_id, path (persona/archivo), sha1, size, mtime_ns
+  faces       id, image_id, caja (top, right, bottom, left), encoding (blob float32)
+
+- Foto borrada: se borra su fila de images (y sus faces en cascada).
+- Foto o carpeta renombrada o movida: mismo sha1, se actualiza path e
+  identity_id y se conservan sus faces.
+- Foto nueva o modificada: solo esa se codifica (un solo pool de procesos
+  para todas), y se inserta por lotes en transacciones a medida que llegan
+  (un corte pierde como mucho el lote en curso).
+
+Al arrancar, load_gallery() carga todos los encodings en una matriz numpy
+con una sola consulta. WAL permite leer mientras otro proceso escribe.
+
+Uso como script:
+  python scripts/gallery_db.py sync       # sincroniza con data/train/
+  python scripts/gallery_db.py info       # personas, imágenes y rostros
+  python scripts/gallery_db.py export     # escribe data/gallery/ desde la base
+"""
+import argparse
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from encoding_cache import ENCODING_DIM, encode_many, file_digest, iter_encoded, iter_train_images
+from gallery import Gallery
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DB_FILE = DATA_DIR / "gallery.sqlite3"
+SCHEMA_VERSION = 1
+INSERT_BATCH = 64  # imágenes codificadas por transacción
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS identities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    identity_id INTEGER NOT NULL REFERENCES identities(id) ON DELETE CASCADE,
+    path TEXT NOT NULL UNIQUE,
+    sha1 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_sha1 ON images(sha1);
+CREATE TABLE IF NOT EXISTS faces (
+    id INTEGER PRIMARY KEY,
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    box_top INTEGER NOT NULL,
+    box_right INTEGER NOT NULL,
+    box_bottom INTEGER NOT NULL,
+    box_left INTEGER NOT NULL,
+    encoding BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS faces_image ON faces(image_id);
+"""
+
+
+class GalleryDB:
+    def __init__(self, path=DB_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f"Versión de base no soportada: {version}")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _identity_id(self, name):
+        self.conn.execute("INSERT OR IGNORE INTO identities (name) VALUES (?)", (name,))
+        return self.conn.execute("SELECT id FROM identities WHERE name = ?", (name,)).fetchone()[0]
+
+    def _insert_images(self, items):
+        """
+        Inserta en una transacción [(clave, etiqueta, stat, sha1, cajas, encodings)],
+        reemplazando las filas previas de la misma ruta.
+        """
+        with self.conn:
+            for key, label, st, digest, boxes, encs in items:
+                self.conn.execute("DELETE FROM images WHERE path = ?", (key,))
+                cur = self.conn.execute(
+                    "INSERT INTO images (identity_id, path, sha1, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                    (self._identity_id(label), key, digest, st.st_size, st.st_mtime_ns),
+                )
+                encs = np.asarray(encs, dtype=np.float32).reshape(len(boxes), ENCODING_DIM)
+                self.conn.executemany(
+                    "INSERT INTO faces (image_id, box_top, box_right, box_bottom, box_left, encoding) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(cur.lastrowid, *map(int, box), enc.tobytes()) for box, enc in zip(boxes, encs)],
+                )
+
+    def _encode_and_insert(self, pending, model, workers, encoder):
+        # Un único pool (o una llamada al encoder) para todo lo pendiente; los
+        # resultados se guardan en transacciones de INSERT_BATCH imágenes
+        paths = [item[2] for item in pending]
+        if encoder is not None:
+            encoded = encoder(paths) if paths else []
+        else:
+            encoded = iter_encoded(paths, model=model, workers=workers)
+        items = []
+        # `encoded` primero en el zip: así el generador llega a su final (cierra el pool)
+        for (boxes, encs), (key, label, img_path, st, digest) in zip(encoded, pending):
+            if not boxes:
+                print(f"Sin rostro en {img_path}, se omite.")
+            items.append((key, label, st, digest, boxes, encs))
+            if len(items) >= INSERT_BATCH:
+                self._insert_images(items)
+                items = []
+        if items:
+            self._insert_images(items)
+
+    def sync(self, train_dir, model="hog", workers=1, encoder=None):
+        """
+        Sincroniza la base con train_dir tocando solo lo que cambió: borra las
+        imágenes que ya no existen, actualiza la ruta de las renombradas
+        (mismo sha1) y codifica solo las nuevas o modificadas.
+        """
+        train_dir = Path(train_dir)
+        known = {
+            path: (image_id, sha1, size, mtime_ns)
+            for image_id, path, sha1, size, mtime_ns in self.conn.execute(
+                "SELECT id, path, sha1, size, mtime_ns FROM images"
+            )
+        }
+        seen = set()
+        changed = []
+        for label, img_path in iter_train_images(train_dir):
+            key = img_path.relative_to(train_dir).as_posix()
+            seen.add(key)
+            st = img_path.stat()
+            row = known.get(key)
+            if row and row[2] == st.st_size and row[3] == st.st_mtime_ns:
+                continue
+            changed.append((key, label, img_path, st, file_digest(img_path)))
+
+        # Imágenes de la base que ya no están en su ruta: candidatas a renombrado
+        missing = {}
+        for path, (image_id, sha1, _, _) in known.items():
+            if path not in seen:
+                missing.setdefault(sha1, []).append(image_id)
+
+        pending = []
+        renamed = touched = copied = 0
+        with self.conn:
+            for key, label, img_path, st, digest in changed:
+                row = known.get(key)
+                if row and row[1] == digest:
+                    # Mismo contenido (touch): solo se actualiza el stat
+                    self.conn.execute("UPDATE images SET size = ?, mtime_ns = ? WHERE id = ?", (st.st_size, st.st_mtime_ns, row[0]))
+                    touched += 1
+                elif not row and missing.get(digest):
+                    image_id = missing[digest].pop()
+                    self.conn.execute(
+                        "UPDATE images SET path = ?, identity_id = ?, size = ?, mtime_ns = ? WHERE id = ?",
+                        (key, self._identity_id(label), st.st_size, st.st_mtime_ns, image_id),
+                    )
+                    renamed += 1
+                else:
+                    source = self.conn.execute("SELECT id FROM images WHERE sha1 = ? LIMIT 1", (digest,)).fetchone()
+                    if source is not None and not row:
+                        # Copia de una imagen ya codificada: se duplican sus rostros
+                        cur = self.conn.execute(
+                            "INSERT INTO images (identity_id, path, sha1, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                            (self._identity_id(label), key, digest, st.st_size, st.st_mtime_ns),
+                        )
+                        self.conn.execute(
+                            "INSERT INTO faces (image_id, box_top, box_right, box_bottom, box_left, encoding) "
+                            "SELECT ?, box_top, box_right, box_bottom, box_left, encoding FROM faces WHERE image_id = ?",
+                            (cur.lastrowid, source[0]),
+                        )
+                        copied += 1
+                    else:
+                        pending.append((key, label, img_path, st, digest))
+            stale = [(image_id,) for ids in missing.values() for image_id in ids]
+            self.conn.executemany("DELETE FROM images WHERE id = ?", stale)
+
+        self._encode_and_insert(pending, model, workers, encoder)
+        with self.conn:
+            self.conn.execute("DELETE FROM identities WHERE id NOT IN (SELECT identity_id FROM images)")
+        unchanged = len(seen) - len(changed)
+        print(f"Base: {unchanged} sin cambios, {renamed} renombradas, {touched + copied} reutilizadas, "
+              f"{len(pending)} codificadas, {len(stale)} eliminadas.")
+
+    def add(self, img_paths, train_dir, model="hog"):
+        """
+        Codifica e inserta solo `img_paths` (recién guardadas en train_dir), en
+        una transacción. Devuelve {"encodings", "names"} de esas imágenes,
+        igual que EncodingCache.add.
+        """
+        train_dir = Path(train_dir)
+        img_paths = [Path(p) for p in img_paths]
+        encoded = encode_many(img_paths, model=model)
+        items = []
+        encodings = []
+        names = []
+        for img_path, (boxes, encs) in zip(img_paths, encoded):
+            if not boxes:
+                print(f"Sin rostro en {img_path}, se omite.")
+            key = img_path.relative_to(train_dir).as_posix()
+            label = img_path.relative_to(train_dir).parts[0]
+            items.append((key, label, img_path.stat(), file_digest(img_path), boxes, encs))
+            encodings.extend(encs)
+            names.extend([label] * len(encs))
+        self._insert_images(items)
+        return {"encodings": encodings, "names": names}
+
+    def forget(self, key):
+        """Borra una imagen (clave persona/archivo) y sus rostros. True si existía."""
+        with self.conn:
+            return self.conn.execute("DELETE FROM images WHERE path = ?", (key,)).rowcount > 0
+
+    def load_gallery(self):
+        """
+        Todos los rostros en una Gallery en memoria, en orden de inserción (las
+        altas incrementales quedan al final, como con Gallery.append).
+        """
+        identities = self.conn.execute("SELECT id, name FROM identities ORDER BY id").fetchall()
+        rows = self.conn.execute(
+            "SELECT images.identity_id, faces.encoding FROM faces "
+            "JOIN images ON images.id = faces.image_id ORDER BY faces.id"
+        ).fetchall()
+        if not rows:
+            return Gallery.empty()
+        position = {identity_id: i for i, (identity_id, _) in enumerate(identities)}
+        labels = np.fromiter((position[identity_id] for identity_id, _ in rows), dtype=np.int32, count=len(rows))
+        matrix = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32).reshape(len(rows), ENCODING_DIM)
+        return Gallery(matrix.copy(), labels, [name for _, name in identities])
+
+    def info(self):
+        return {
+            table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("identities", "images", "faces")
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Galería de embeddings en SQLite")
+    parser.add_argument("command", choices=["sync", "info", "export"])
+    parser.add_argument("--db", type=Path, default=DB_FILE)
+    parser.add_argument("--train", type=Path, default=DATA_DIR / "train")
+    parser.add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    with GalleryDB(args.db) as db:
+        if args.command == "sync":
+            db.sync(args.train, workers=args.workers)
+        if args.command == "export":
+            gallery = db.load_gallery()
+            gallery.save(args.gallery)
+            print(f"✓ Exportados {len(gallery)} embeddings a {args.gallery}")
+        counts = db.info()
+        print(f"{counts['identities']} personas, {counts['images']} imágenes, {counts['faces']} rostros en {args.db}")
+
+
+if __name__ == "__main__":
+    main()
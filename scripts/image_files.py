@@ -0,0 +1,9 @@
+"""
+Extensiones de imagen que leen los scripts.
+
+Módulo sin dependencias para que lo importen tanto las fuentes de frames
+(sources.py, con cv2) como la cache de encodings (encoding_cache.py, con
+dlib) sin que una arrastre a la otra.
+"""
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
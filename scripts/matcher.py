@@ -0,0 +1,291 @@
+"""
+Comparación de rostros contra la galería en una sola pasada.
+
+En lugar de llamar a compare_faces() y face_distance() por cada rostro (que
+calculan dos veces el mismo vector de distancias y convierten la lista de
+encodings a array en cada llamada), FaceMatcher mantiene la galería como una
+matriz contigua con las normas al cuadrado precalculadas y resuelve todos los
+rostros de un frame con un único producto de matrices:
+
+  ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q·g
+
+QuantizedMatcher hace lo mismo sobre la copia float16 o int8 de la galería
+(2x / 4x menos memoria y ancho de banda que float32, 4x / 8x frente a los
+float64 originales), a cambio de distancias aproximadas; drift_report()
+mide cuánto se desvían.
+
+HierarchicalMatcher compara primero con un centroide por persona y solo
+después con las fotos de las personas que pueden contener el más cercano.
+"""
+import numpy as np
+
+UNKNOWN_NAME = "Desconocido"
+DEFAULT_NPROBE = 8  # listas del índice IVF revisadas por consulta
+
+
+class MatchResult:
+    def __init__(self, indices, distances, accepted):
+        self.indices = indices  # índice de la fila más cercana (-1 si la galería está vacía)
+        self.distances = distances  # distancia euclídea a esa fila
+        self.accepted = accepted  # distancia <= tolerancia
+
+    def __len__(self):
+        return len(self.indices)
+
+
+class FaceMatcher:
+    def __init__(self, gallery, index=None, nprobe=DEFAULT_NPROBE):
+        self.gallery = gallery
+        # Sobre una galería memory-mapped float32 esto no copia: es una vista
+        self.matrix = np.ascontiguousarray(gallery.encodings, dtype=np.float32)
+        self.sq_norms = np.ascontiguousarray(gallery.sq_norms, dtype=np.float32)
+        # Índice aproximado opcional (ann_index.IVFIndex): solo acota los candidatos,
+        # la distancia final sigue siendo la exacta
+        self.index = index
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def squared_distances(self, queries):
+        """Matriz (M x N) de distancias al cuadrado; una sola llamada a BLAS."""
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        d2 = q @ self.matrix.T
+        d2 *= -2.0
+        d2 += self.sq_norms[np.newaxis, :]
+        d2 += np.einsum("ij,ij->i", q, q)[:, np.newaxis]
+        # Errores de redondeo pueden dejar valores apenas negativos
+        np.maximum(d2, 0.0, out=d2)
+        return d2
+
+    def match(self, queries, tolerance):
+        """Mejor coincidencia para cada uno de los M encodings de `queries`."""
+        m = len(queries)
+        if m == 0 or len(self) == 0:
+            return MatchResult(
+                np.full(m, -1, dtype=np.intp),
+                np.full(m, np.inf, dtype=np.float32),
+                np.zeros(m, dtype=bool),
+            )
+        if self.index is not None:
+            best, best_d2 = self.index.search(queries, self.matrix, self.sq_norms, self.nprobe)
+            distances = np.sqrt(best_d2)
+            return MatchResult(best, distances, distances <= tolerance)
+        d2 = self.squared_distances(queries)
+        best = np.argmin(d2, axis=1)
+        distances = np.sqrt(d2[np.arange(m), best])
+        return MatchResult(best, distances, distances <= tolerance)
+
+    def identify(self, queries, tolerance):
+        """Nombre reconocido para cada encoding (UNKNOWN_NAME si no hay coincidencia)."""
+        result = self.match(queries, tolerance)
+        return [
+            self.gallery.name_at(idx) if ok else UNKNOWN_NAME
+            for idx, ok in zip(result.indices.tolist(), result.accepted.tolist())
+        ]
+
+
+class QuantizedMatcher(FaceMatcher):
+    """
+    FaceMatcher sobre la copia cuantizada de la galería ("float16" o "int8").
+
+    Para int8 con escala s por dimensión, q·g = (q * s)·c: se escala la consulta
+    una vez y se multiplica directamente por los códigos. Los códigos se pasan
+    a float32 por bloques pequeños (caben en caché), así de memoria principal
+    solo se leen 2 o 1 bytes por dimensión.
+
+    Esa conversión se paga en cada consulta. La de int8 es barata, pero la de
+    float16 no tiene camino rápido en numpy: con 20k filas una consulta
+    suelta tarda ~12x más que con float32 (6.7 frente a 0.54 ms) y en lotes
+    da ~55% de su throughput. float16 solo compensa cuando la memoria manda;
+    int8 ocupa la mitad y cuesta ~2x por consulta suelta.
+    """
+
+    chunk_rows = 4096
+
+    def __init__(self, gallery, kind="int8"):
+        # Sin FaceMatcher.__init__: materializaría la matriz float32 completa y
+        # el matcher ocuparía más que el exacto
+        quantized = gallery.quantized(kind)
+        self.gallery = gallery
+        self.matrix = None  # solo se retienen los códigos
+        self.index = None
+        self.nprobe = DEFAULT_NPROBE
+        self.kind = kind
+        self.codes = quantized["codes"]
+        self.scale = quantized["scale"]
+        # Normas de los vectores cuantizados, coherentes con las distancias aproximadas
+        self.sq_norms = np.ascontiguousarray(quantized["sq_norms"], dtype=np.float32)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def squared_distances(self, queries):
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.codes.shape[1])
+        q_scaled = q if self.scale is None else q * self.scale
+        d2 = np.empty((len(q), len(self)), dtype=np.float32)
+        for start in range(0, len(self), self.chunk_rows):
+            block = self.codes[start:start + self.chunk_rows].astype(np.float32)
+            np.matmul(q_scaled, block.T, out=d2[:, start:start + len(block)])
+        d2 *= -2.0
+        d2 += self.sq_norms[np.newaxis, :]
+        d2 += np.einsum("ij,ij->i", q, q)[:, np.newaxis]
+        np.maximum(d2, 0.0, out=d2)
+        return d2
+
+
+def drift_report(gallery, kinds, tolerance, max_queries=200, noise=0.02, seed=0):
+    """
+    Desviación de las distancias cuantizadas frente a float64 para consultas
+    sintéticas (filas de la galería con ruido). Por tipo devuelve error medio y
+    máximo de la distancia, coincidencia del mejor índice, decisiones
+    aceptado/rechazado que cambian y megabytes de la copia.
+    """
+    count = len(gallery)
+    if count == 0:
+        return {}
+    # Acota la matriz de referencia (consultas x galería) en float64
+    n_queries = max(1, min(max_queries, 50_000_000 // count))
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, count, size=n_queries)
+    queries = np.asarray(gallery.encodings[rows], dtype=np.float64)
+    queries += rng.normal(0, noise, size=queries.shape)
+
+    exact = np.empty((n_queries, count), dtype=np.float64)
+    q_norms = np.einsum("ij,ij->i", queries, queries)[:, np.newaxis]
+    for start in range(0, count, QuantizedMatcher.chunk_rows):
+        block = np.asarray(gallery.encodings[start:start + QuantizedMatcher.chunk_rows], dtype=np.float64)
+        d2 = q_norms + np.einsum("ij,ij->i", block, block) - 2.0 * (queries @ block.T)
+        exact[:, start:start + len(block)] = np.sqrt(np.maximum(d2, 0.0))
+    exact_best = np.argmin(exact, axis=1)
+    exact_ok = exact[np.arange(n_queries), exact_best] <= tolerance
+
+    report = {}
+    for kind in kinds:
+        matcher = QuantizedMatcher(gallery, kind)
+        approx = np.sqrt(matcher.squared_distances(queries.astype(np.float32)))
+        error = np.abs(approx - exact)
+        result = matcher.match(queries.astype(np.float32), tolerance)
+        arrays = gallery.quantized(kind)
+        nbytes = sum(a.nbytes for a in arrays.values() if a is not None)
+        report[kind] = {
+            "megabytes": nbytes / 2**20,
+            "mean_abs_error": float(error.mean()),
+            "max_abs_error": float(error.max()),
+            "top1_agreement": float(np.mean(result.indices == exact_best)),
+            "decision_flips": int(np.sum(result.accepted != exact_ok)),
+        }
+    return report
+
+
+class HierarchicalMatcher(FaceMatcher):
+    """
+    Búsqueda en dos etapas que da el mismo resultado que la exhaustiva.
+
+    Primero se compara la consulta con el centroide de cada persona y se
+    calculan las distancias exactas solo a las fotos de las `top_k` personas
+    más cercanas. Con la mejor distancia d* encontrada, la desigualdad
+    triangular da una cota inferior para cualquier otra persona:
+    d(q, g) >= d(q, centroide) - radio, con radio = distancia máxima de sus
+    fotos al centroide. Solo se revisan las personas cuya cota queda por
+    debajo de d*; las demás no pueden contener un vecino más cercano.
+
+    Todas las consultas de un frame van juntas: cada etapa es un producto de
+    matrices contra las filas de la unión de personas candidatas, y a cada
+    consulta solo se le cuentan las de sus propias candidatas.
+    """
+
+    # Holgura para errores de redondeo en float32 al descartar por la cota
+    prune_slack = 1e-4
+    # Por debajo de estas filas un único producto contra toda la galería es
+    # más rápido que las dos etapas (bench_gallery: cruce hacia 5k filas)
+    exact_below = 5000
+
+    def __init__(self, gallery, top_k=3):
+        super().__init__(gallery)
+        self.top_k = top_k
+        self.labels = np.asarray(gallery.labels)
+        n_ids = len(gallery.names)
+        order = np.argsort(self.labels, kind="stable")
+        self.counts = np.bincount(self.labels, minlength=n_ids)
+        offsets = np.zeros(n_ids + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+        # Filas de cada persona, calculadas una vez
+        self.members = [order[offsets[k]:offsets[k + 1]] for k in range(n_ids)]
+        self.centroids = np.zeros((n_ids, self.matrix.shape[1]), dtype=np.float32)
+        self.radius = np.zeros(n_ids, dtype=np.float32)
+        # Personas sin fotos (p. ej. borradas con gallery.delete_identity): su
+        # distancia al centroide se toma infinita, así nunca son candidatas
+        self.empty = self.counts == 0
+        for k in np.flatnonzero(self.counts):
+            members = self.matrix[self.members[k]]
+            self.centroids[k] = members.mean(axis=0)
+            self.radius[k] = np.sqrt(np.max(np.sum((members - self.centroids[k]) ** 2, axis=1)))
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.rows_scanned = 0  # filas comparadas en total (para medir la poda)
+
+    def _nearest(self, q, q_norms, selected):
+        """
+        Fila más cercana a cada consulta entre las personas marcadas en
+        `selected` (M x personas). Las filas de todas las personas marcadas se
+        comparan con todas las consultas en un solo producto de matrices y
+        luego se descartan las que no tocaban a cada consulta.
+        """
+        m = len(q)
+        best = np.full(m, -1, dtype=np.intp)
+        best_d2 = np.full(m, np.inf, dtype=np.float32)
+        identities = np.flatnonzero(selected.any(axis=0))
+        if len(identities) == 0:
+            return best, best_d2
+        rows = np.concatenate([self.members[k] for k in identities])
+        d2 = q @ self.matrix[rows].T
+        d2 *= -2.0
+        d2 += self.sq_norms[rows][np.newaxis, :]
+        d2 += q_norms[:, np.newaxis]
+        np.maximum(d2, 0.0, out=d2)
+        d2[~selected[:, self.labels[rows]]] = np.inf
+        j = np.argmin(d2, axis=1)
+        found = d2[np.arange(m), j]
+        hit = np.isfinite(found)
+        best[hit] = rows[j[hit]]
+        best_d2[hit] = found[hit]
+        self.rows_scanned += int((selected * self.counts).sum())
+        return best, best_d2
+
+    def match(self, queries, tolerance):
+        m = len(queries)
+        if m == 0 or len(self) == 0:
+            return super().match(queries, tolerance)
+        if len(self) < self.exact_below:
+            self.rows_scanned += m * len(self)
+            return super().match(queries, tolerance)
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        q_norms = np.einsum("ij,ij->i", q, q)
+        dc2 = q @ self.centroids.T
+        dc2 *= -2.0
+        dc2 += self.centroid_norms[np.newaxis, :]
+        dc2 += q_norms[:, np.newaxis]
+        dc = np.sqrt(np.maximum(dc2, 0.0))
+        dc[:, self.empty] = np.inf
+        lower = dc - self.radius[np.newaxis, :]
+
+        # Etapa 1: para todas las consultas a la vez, las `top_k` personas con
+        # centroide más cercano (las vacías, a distancia infinita, quedan fuera)
+        top_k = max(1, min(self.top_k, int(np.count_nonzero(~self.empty))))
+        first = np.argpartition(dc, top_k - 1, axis=1)[:, :top_k]
+        stage1 = np.zeros(dc.shape, dtype=bool)
+        stage1[np.arange(m)[:, np.newaxis], first] = True
+        stage1 &= ~self.empty
+        best, best_d2 = self._nearest(q, q_norms, stage1)
+
+        # Etapa 2: solo las personas cuya cota no descarta un vecino mejor
+        bound = np.sqrt(best_d2) + self.prune_slack
+        stage2 = (lower < bound[:, np.newaxis]) & ~stage1 & ~self.empty
+        if stage2.any():
+            idx, d2 = self._nearest(q, q_norms, stage2)
+            better = d2 < best_d2
+            best[better] = idx[better]
+            best_d2[better] = d2[better]
+        # Sin filas candidatas queda -1 / inf: desconocido
+        distances = np.sqrt(best_d2)
+        return MatchResult(best, distances, distances <= tolerance)
@@ -0,0 +1,78 @@
+"""
+Filtro de movimiento barato para no ejecutar HOG sobre escenas estáticas.
+
+Compara una versión muy reducida y suavizada del frame en escala de grises
+con la referencia de la última detección. Si no cambió nada se omite la
+detección; si cambió algo, devuelve la región (ampliada con un margen) donde
+hubo movimiento para detectar solo ahí.
+"""
+import time
+
+import cv2
+
+
+class MotionGate:
+    def __init__(self, width=160, pixel_threshold=25, min_changed=0.002, margin=0.15,
+                 full_region_ratio=0.6, max_idle_sec=5.0):
+        self.width = width  # ancho al que se reduce el frame para comparar
+        self.pixel_threshold = pixel_threshold  # diferencia de gris que cuenta como cambio
+        self.min_changed = min_changed  # fracción mínima de píxeles cambiados
+        self.margin = margin  # margen alrededor de la región, relativo al frame
+        self.full_region_ratio = full_region_ratio  # región mayor que esto => frame completo
+        self.max_idle_sec = max_idle_sec  # forzar una detección completa cada tanto
+        self.frames_skipped = 0
+        self._reference = None
+        self._last_full = 0.0
+
+    def reset(self):
+        self._reference = None
+
+    def _prepare(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+        tiny_w = min(self.width, w)
+        tiny = cv2.resize(gray, (tiny_w, max(1, int(h * tiny_w / w))), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(tiny, (5, 5), 0)
+
+    def check(self, frame):
+        """
+        Devuelve None si no hubo movimiento (omitir detección) o la región
+        (top, right, bottom, left) en coordenadas de `frame` que hay que
+        analizar; el frame completo si es la primera vez o tocaba refrescar.
+        """
+        h, w = frame.shape[:2]
+        full = (0, w, h, 0)
+        tiny = self._prepare(frame)
+        now = time.perf_counter()
+
+        if self._reference is None or self._reference.shape != tiny.shape or now - self._last_full >= self.max_idle_sec:
+            self._reference = tiny
+            self._last_full = now
+            return full
+
+        diff = cv2.absdiff(tiny, self._reference)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        changed = cv2.countNonZero(mask)
+        if changed < self.min_changed * mask.size:
+            # Sin cambios: la referencia se mantiene para que un movimiento
+            # lento se acumule hasta superar el umbral
+            self.frames_skipped += 1
+            return None
+
+        self._reference = tiny
+        x, y, rw, rh = cv2.boundingRect(cv2.findNonZero(mask))
+        tiny_h, tiny_w = mask.shape
+        if rw * rh >= self.full_region_ratio * tiny_w * tiny_h:
+            self._last_full = now
+            return full
+
+        # Región en coordenadas del frame, ampliada con el margen
+        sx = w / tiny_w
+        sy = h / tiny_h
+        pad_x = int(self.margin * w)
+        pad_y = int(self.margin * h)
+        top = max(0, int(y * sy) - pad_y)
+        bottom = min(h, int((y + rh) * sy) + pad_y)
+        left = max(0, int(x * sx) - pad_x)
+        right = min(w, int((x + rw) * sx) + pad_x)
+        return (top, right, bottom, left)
@@ -0,0 +1,102 @@
+"""
+Medición de latencia por etapa del bucle de reconocimiento.
+
+Cada etapa (captura, resize, cvtColor, face_locations, face_encodings,
+matching, dibujo, imshow/waitKey) se mide con `with profiler.stage(nombre):`
+y se guardan las últimas `window` muestras. Se calculan p50/p95/p99 y los
+FPS de render, se pueden dibujar sobre el frame y se vuelcan periódicamente
+a un archivo JSONL (una línea por volcado).
+
+Es seguro usarlo desde varios hilos (el worker mide sus propias etapas).
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class StageProfiler:
+    def __init__(self, window=300, metrics_file=None, dump_every_sec=10.0):
+        self.window = window
+        self.metrics_file = metrics_file
+        self.dump_every_sec = dump_every_sec
+        self.show_overlay = False
+        self._samples = {}  # etapa -> deque de duraciones en ms (orden de inserción = orden de etapas)
+        self._frame_times = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._last_dump = time.perf_counter()
+        self._summary = {}
+        self._summary_time = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds * 1000.0)
+
+    def frame_done(self):
+        """Marca el fin de un frame dibujado (para los FPS) y vuelca si toca."""
+        now = time.perf_counter()
+        with self._lock:
+            self._frame_times.append(now)
+        if self.metrics_file is not None and now - self._last_dump >= self.dump_every_sec:
+            self._last_dump = now
+            self.dump()
+
+    def fps(self):
+        with self._lock:
+            if len(self._frame_times) < 2:
+                return 0.0
+            span = self._frame_times[-1] - self._frame_times[0]
+            return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def summary(self):
+        """{"fps": x, "stages": {etapa: {"count", "p50", "p95", "p99"}}} en ms."""
+        with self._lock:
+            snapshot = {name: np.fromiter(samples, dtype=np.float64) for name, samples in self._samples.items()}
+        stages = {}
+        for name, values in snapshot.items():
+            if len(values) == 0:
+                continue
+            pcts = np.percentile(values, PERCENTILES)
+            stages[name] = {"count": len(values)}
+            stages[name].update({f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, pcts)})
+        return {"fps": round(self.fps(), 2), "stages": stages}
+
+    def dump(self):
+        record = {"ts": time.time()}
+        record.update(self.summary())
+        with open(self.metrics_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def draw(self, frame, origin=(10, 120)):
+        """Dibuja la tabla de percentiles si el overlay está activo."""
+        if not self.show_overlay:
+            return
+        now = time.perf_counter()
+        # Recalcular percentiles unas pocas veces por segundo es suficiente
+        if now - self._summary_time >= 0.5:
+            self._summary = self.summary()
+            self._summary_time = now
+        x, y = origin
+        cv2.putText(frame, f"FPS {self._summary.get('fps', 0):.1f}   p50/p95/p99 ms", (x, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+        for name, stats in self._summary.get("stages", {}).items():
+            y += 16
+            text = f"{name:<15} {stats['p50']:6.1f} {stats['p95']:6.1f} {stats['p99']:6.1f}"
+            cv2.putText(frame, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
@@ -0,0 +1,149 @@
+"""
+Compactación de la galería en prototipos por identidad.
+
+Una persona reforzada muchas veces con `r` acumula decenas de embeddings casi
+idénticos y todos se comparan en cada consulta. compact() deja como máximo
+`max_per_identity` filas por persona, elegidas con k-center voraz: se empieza
+por la muestra más cercana a la media y se añade cada vez la que queda más
+lejos de las ya elegidas, así los prototipos cubren la variedad de ángulos y
+luces en lugar de repetir la foto más común. Con `min_spread` se deja de
+añadir en cuanto todas las muestras quedan a menos de esa distancia de un
+prototipo (duplicados).
+
+recall_report() mide el impacto dejando uno fuera: cada consulta es una
+fila con algo de ruido (una foto nueva de la misma persona) que se retira
+de ambas galerías antes de buscar, y se compara el nombre reconocido con la
+galería completa y con la compactada.
+
+Uso como script:
+  python scripts/prototypes.py --max 5
+  python scripts/prototypes.py --max 5 --save data/gallery_compact
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from gallery import Gallery
+from matcher import FaceMatcher
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+def k_center(points, k, min_spread=0.0):
+    """Índices (en `points`) de hasta k prototipos por k-center voraz."""
+    points = np.asarray(points, dtype=np.float32)
+    if len(points) <= k:
+        return np.arange(len(points))
+    mean = points.mean(axis=0)
+    first = int(np.argmin(np.linalg.norm(points - mean, axis=1)))
+    chosen = [first]
+    nearest = np.linalg.norm(points - points[first], axis=1)
+    while len(chosen) < k:
+        candidate = int(np.argmax(nearest))
+        if nearest[candidate] <= min_spread:
+            break
+        chosen.append(candidate)
+        np.minimum(nearest, np.linalg.norm(points - points[candidate], axis=1), out=nearest)
+    return np.sort(np.array(chosen))
+
+
+def compact(gallery, max_per_identity=5, min_spread=0.0):
+    """
+    Galería reducida a lo sumo `max_per_identity` filas por persona. Devuelve
+    (galería compacta, filas conservadas de la original); la tabla de nombres
+    es la misma.
+    """
+    if len(gallery) == 0:
+        return gallery, np.empty(0, dtype=np.int64)
+    labels = np.asarray(gallery.labels)
+    order = np.argsort(labels, kind="stable")
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    kept = []
+    for rows in np.split(order, bounds):
+        members = np.asarray(gallery.encodings[rows], dtype=np.float32)
+        kept.append(rows[k_center(members, max_per_identity, min_spread)])
+    kept = np.sort(np.concatenate(kept))
+    return gallery.take(kept), kept
+
+
+def recall_report(gallery, max_per_identity, tolerance, min_spread=0.0, noise=0.02, max_queries=5000, seed=0):
+    """
+    Compara galería completa y compactada con validación dejando uno fuera:
+    cada consulta es una fila (con ruido, como una foto nueva) que se quita
+    de la galería completa y de las muestras de su persona antes de elegir
+    sus prototipos, así ninguna de las dos la tiene memorizada. Solo se usan
+    filas de personas con al menos dos fotos. `recall_full`/`recall_compact`:
+    fracción de consultas reconocidas con su nombre correcto; `agreement`:
+    mismo resultado en ambas.
+    """
+    labels = np.asarray(gallery.labels)
+    counts = np.bincount(labels, minlength=len(gallery.names))
+    _, kept = compact(gallery, max_per_identity, min_spread)
+    eligible = np.flatnonzero(counts[labels] >= 2)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(eligible, size=min(len(eligible), max_queries), replace=False)
+    report = {"rows_full": len(gallery), "rows_compact": len(kept), "queries": len(rows)}
+    if len(rows) == 0:
+        return dict(report, recall_full=0.0, recall_compact=0.0, agreement=1.0)
+
+    queries = np.asarray(gallery.encodings[rows], dtype=np.float32)
+    queries += rng.normal(0, noise, size=queries.shape).astype(np.float32)
+    kept_mask = np.zeros(len(gallery), dtype=bool)
+    kept_mask[kept] = True
+    members = {}
+    matcher = FaceMatcher(gallery)
+    # Distancias a toda la galería por bloques de consultas (acota la memoria)
+    block = max(1, 20_000_000 // len(gallery))
+    hits_full = hits_compact = same = 0
+    tol2 = tolerance * tolerance
+    for start in range(0, len(rows), block):
+        d2 = matcher.squared_distances(queries[start:start + block])
+        for row, dist in zip(rows[start:start + block].tolist(), d2):
+            label = labels[row]
+            if label not in members:
+                members[label] = np.flatnonzero(labels == label)
+            others = members[label][members[label] != row]
+            dist[row] = np.inf
+            best_full = int(np.argmin(dist))
+            # Prototipos de su persona recalculados sin la consulta; las demás
+            # personas conservan los de la compactación global
+            protos = others[k_center(gallery.encodings[others], max_per_identity, min_spread)]
+            allowed = kept_mask & (labels != label)
+            allowed[protos] = True
+            candidates = np.flatnonzero(allowed)
+            best_compact = int(candidates[np.argmin(dist[candidates])])
+            name_full = labels[best_full] if dist[best_full] <= tol2 else -1
+            name_compact = labels[best_compact] if dist[best_compact] <= tol2 else -1
+            hits_full += name_full == label
+            hits_compact += name_compact == label
+            same += name_full == name_compact
+    n = len(rows)
+    return dict(report, recall_full=float(hits_full / n), recall_compact=float(hits_compact / n),
+                agreement=float(same / n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta la galería en prototipos por identidad")
+    parser.add_argument("--gallery", type=Path, default=DATA_DIR / "gallery")
+    parser.add_argument("--max", type=int, default=5, help="Máximo de embeddings por persona")
+    parser.add_argument("--min-spread", type=float, default=0.0,
+                        help="No añadir prototipos a menos de esta distancia de otro (duplicados)")
+    parser.add_argument("--tolerance", type=float, default=0.50)
+    parser.add_argument("--save", type=Path, default=None, help="Guardar la galería compacta en esta carpeta")
+    args = parser.parse_args()
+
+    gallery = Gallery.open(args.gallery)
+    compacted, _ = compact(gallery, args.max, args.min_spread)
+    report = recall_report(gallery, args.max, args.tolerance, args.min_spread)
+    print(f"Filas: {report['rows_full']} -> {report['rows_compact']} "
+          f"({len(gallery.names)} personas, máximo {args.max} por persona)")
+    print(f"Recall con {report['queries']} consultas: completa {report['recall_full']:.3f}, "
+          f"compacta {report['recall_compact']:.3f}, mismo resultado {report['agreement']:.3f}")
+    if args.save is not None:
+        compacted.save(args.save)
+        print(f"✓ Galería compacta guardada en {args.save}")
+
+
+if __name__ == "__main__":
+    main()
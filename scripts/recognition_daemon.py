@@ -0,0 +1,217 @@
+"""
+Demonio local de reconocimiento: mantiene dlib y la galería en memoria.
+
+Cargar el detector, el shape predictor y el encoder ResNet de dlib cuesta
+en cada ejecución de encode_faces.py o de un script por lotes, más la carga
+de la galería. Este proceso los carga una vez y atiende peticiones por un socket Unix (TCP local en Windows),
+así la latencia de cada petición es solo el cómputo.
+
+Operaciones (campo "op" del header, ver daemon_client.py para el protocolo):
+  ping       comprobación de vida
+  detect     imagen -> cajas
+  encode     imagen (+ cajas y landmarks opcionales) -> cajas y encodings float32
+  identify   imagen -> [{box, name, distance}] contra la galería
+  reload     vuelve a abrir data/gallery/ (tras reentrenar)
+  stats      peticiones atendidas, tiempo activo, filas de la galería
+
+Cada conexión tiene su hilo y responde en orden, así el cliente puede enviar
+muchas peticiones sin esperar. El cómputo de dlib se serializa con un lock.
+
+Uso:
+  python scripts/recognition_daemon.py
+  python scripts/recognition_daemon.py --address tcp:127.0.0.1:50555
+"""
+import argparse
+import io
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+import face_models
+import gallery as gallery_store
+from daemon_client import default_address, parse_address, recv_message, send_message
+from gallery import Gallery
+from matcher import FaceMatcher
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+GALLERY_DIR = DATA_DIR / "gallery"
+MODEL = "hog"
+TOLERANCE = 0.50
+
+
+def decode_image(header, payload):
+    """
+    Imagen RGB uint8 a partir del payload (archivo codificado o crudo). Los
+    archivos se decodifican con PIL, igual que face_models.load_image_file:
+    cv2.imdecode da píxeles algo distintos en JPEG y los encodings no
+    coincidirían con los del encoder local.
+    """
+    if header.get("format") == "raw":
+        return np.frombuffer(payload, dtype=np.uint8).reshape(header["shape"])
+    return face_models.load_image_file(io.BytesIO(payload))
+
+
+def _boxes_fit(boxes, image_shape):
+    return all(top >= 0 and left >= 0 and bottom <= image_shape[0] and right <= image_shape[1]
+               for top, right, bottom, left in boxes)
+
+
+class RecognitionDaemon:
+    def __init__(self, address, gallery_dir=GALLERY_DIR, model=MODEL, tolerance=TOLERANCE):
+        self.address = address
+        self.gallery_dir = Path(gallery_dir)
+        self.model = model
+        self.tolerance = tolerance
+        self.matcher = None
+        self.requests = 0
+        self.started = time.time()
+        self._compute_lock = threading.Lock()
+        self._server = None
+        self._stop = threading.Event()
+        self.reload()
+        # Cargar los modelos ya, no en la primera petición
+        face_models.preload(face_models.models_for(model))
+
+    def reload(self):
+        if gallery_store.exists(self.gallery_dir):
+            gallery = Gallery.open(self.gallery_dir)
+        else:
+            gallery = Gallery.empty()
+        # Asignación atómica: las peticiones en curso terminan con el matcher anterior
+        self.matcher = FaceMatcher(gallery)
+        return len(gallery)
+
+    def handle(self, header, payload):
+        """Resultado (dict) y payload binario de una petición."""
+        op = header.get("op")
+        if op == "ping":
+            return {"pong": True}, b"", None
+        if op == "stats":
+            return {
+                "requests": self.requests,
+                "uptime_sec": round(time.time() - self.started, 1),
+                "gallery_rows": len(self.matcher),
+                "model": self.model,
+            }, b"", None
+        if op == "reload":
+            with self._compute_lock:
+                rows = self.reload()
+            return {"gallery_rows": rows}, b"", None
+        if op not in ("detect", "encode", "identify"):
+            raise ValueError(f"Operación desconocida: {op}")
+
+        image = decode_image(header, payload)
+        model = header.get("model", self.model)
+        with self._compute_lock:
+            boxes = header.get("boxes") if op == "encode" else None
+            if boxes is not None and not _boxes_fit(boxes, image.shape):
+                # Caja de un sidecar que no cabe (imagen recortada): se detecta,
+                # igual que hace read_sidecar en el encoder local
+                boxes = None
+            sidecar = boxes is not None
+            if boxes is None:
+                boxes = face_models.face_locations(image, model=model)
+            boxes = [tuple(int(v) for v in box) for box in boxes]
+            if op == "detect":
+                return {"boxes": boxes}, b"", None
+            # Landmarks del sidecar (uno por caja): sin shape predictor, como encode_image
+            landmarks = header.get("landmarks") if sidecar else None
+            if landmarks is not None and len(landmarks) == len(boxes) and all(landmarks):
+                encodings = face_models.face_encodings_from_landmarks(image, list(zip(boxes, landmarks)))
+            else:
+                encodings = face_models.face_encodings(image, boxes)
+            encodings = np.asarray(encodings, dtype=np.float32)
+            encodings = encodings.reshape(len(boxes), -1) if boxes else np.empty((0, 128), dtype=np.float32)
+        if op == "encode":
+            return {"boxes": boxes}, encodings.tobytes(), list(encodings.shape)
+
+        matcher = self.matcher
+        tolerance = header.get("tolerance", self.tolerance)
+        result = matcher.match(encodings, tolerance)
+        faces = []
+        for box, idx, dist, ok in zip(boxes, result.indices.tolist(), result.distances.tolist(), result.accepted.tolist()):
+            faces.append({
+                "box": box,
+                "name": matcher.gallery.name_at(idx) if ok else None,
+                "distance": None if idx < 0 else round(dist, 4),
+            })
+        return {"faces": faces}, b"", None
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stop.is_set():
+                try:
+                    message = recv_message(conn)
+                except (ConnectionError, OSError, ValueError):
+                    return
+                if message is None:
+                    return
+                header, payload = message
+                response = {"id": header.get("id")}
+                out = b""
+                try:
+                    result, out, shape = self.handle(header, payload)
+                    response.update(ok=True, result=result)
+                    if shape is not None:
+                        response["shape"] = shape
+                except Exception as exc:  # un error en una petición no tumba la conexión
+                    response.update(ok=False, error=f"{type(exc).__name__}: {exc}")
+                    out = b""
+                self.requests += 1
+                try:
+                    send_message(conn, response, out)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.unlink(target)  # socket huérfano de una ejecución anterior
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(target)
+        self._server.listen()
+        print(f"Demonio escuchando en {self.address} ({len(self.matcher)} embeddings en la galería)")
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn, _ = self._server.accept()
+                except OSError:
+                    break
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self._server.close()
+            if kind == "unix" and os.path.exists(target):
+                os.unlink(target)
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Demonio de reconocimiento (modelos y galería en memoria)")
+    parser.add_argument("--address", default=default_address(), help="unix:/ruta.sock o tcp:host:puerto")
+    parser.add_argument("--gallery", type=Path, default=GALLERY_DIR)
+    parser.add_argument("--model", default=MODEL, choices=["hog", "cnn"])
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    daemon = RecognitionDaemon(args.address, args.gallery, args.model, args.tolerance)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\nDemonio detenido.")
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
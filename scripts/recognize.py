@@ -1,18 +1,34 @@
-import pickle
+import argparse
 from datetime import datetime
 from pathlib import Path
-import numpy as np
 import tkinter as tk
 from tkinter import simpledialog
 import re
 
 import cv2
-import face_recognition
 from tkinter import messagebox
 
+import ann_index
+import face_models
+import gallery as gallery_store
+from async_recognizer import RecognitionWorker
+from chip_cache import ChipCache
+from encoding_cache import EncodingCache, write_sidecar
+from gallery import Gallery
+from gallery_db import DB_FILE, GalleryDB
+from matcher import FaceMatcher, HierarchicalMatcher, QuantizedMatcher
+from motion import MotionGate
+from profiler import StageProfiler
+from prototypes import compact
+from scheduler import AdaptiveScheduler
+from sources import CameraSource, JsonlSink, WindowSink, open_source
+
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-ENC_FILE = DATA_DIR / "known_encodings.pkl"
+ENC_FILE = DATA_DIR / "known_encodings.pkl"  # formato antiguo, solo para migrar
+GALLERY_DIR = DATA_DIR / "gallery"
 TRAIN_DIR = DATA_DIR / "train"
+CACHE_FILE = DATA_DIR / "encodings_cache.pkl"
+ANN_INDEX_DIR = DATA_DIR / "ann_index"  # índice IVF de galerías sin directorio propio (SQLite, compactada)
 
 # Easter egg: si falta la imagen, termina el script
 EASTER_EGG_IMG = DATA_DIR / ".sysdata_2026" / "gorilla.jpg"
@@ -25,7 +41,23 @@ MODEL = "hog"  # "hog" rapido CPU; "cnn" requiere GPU/CUDA
 DOWNSCALE = 0.4  # 1.0 sin cambio; 0.4 = balance entre velocidad y precisión
 TOLERANCE = 0.50  # menor = mas estricto; mayor = mas permisivo (ajustado para face_distance)
 CAPTURE_COUNT = 5  # Numero de fotos a capturar al aprender
-DETECT_EVERY_N_FRAMES = 3  # Detectar cada 3 frames (balance fluidez/reconocimiento)
+DETECT_EVERY_N_FRAMES = 3  # Detectar cada 3 frames (balance fluidez/reconocimiento); valor inicial si ADAPTIVE
+ADAPTIVE = True  # Reajustar DETECT_EVERY_N_FRAMES y DOWNSCALE en vivo según FPS, latencia y tamaño de rostros
+TARGET_FPS = 25  # FPS de render que intenta mantener el ajuste adaptativo
+METRICS_FILE = DATA_DIR / "metrics.jsonl"  # Volcado periódico de latencias por etapa (None = desactivado)
+METRICS_EVERY_SEC = 10.0
+RESULT_POLICY = "freshest"  # "freshest" = último resultado; "complete" = el de más rostros reciente
+RESULT_MAX_AGE = 1.0  # Segundos que un resultado sigue siendo candidato con "complete"
+MOTION_GATE = True  # Omitir la detección si la escena no cambió y limitarla a la zona con movimiento
+ROI_FULL_EVERY = 10  # Modo ROI: detectar solo alrededor de las caras previas; barrido completo cada K detecciones (0 = desactivado)
+ANN_MIN_GALLERY = 50000  # Usar índice aproximado (IVF) a partir de este número de embeddings (0 = nunca)
+ANN_NPROBE = 8  # Listas revisadas por consulta: más = mejor recall, más latencia
+COMPACT_MAX_PER_IDENTITY = 0  # Comparar solo contra N prototipos por persona (0 = todas las fotos)
+HIERARCHICAL_TOP_K = 0  # >0: comparar primero con el centroide de cada persona y luego con las fotos de las K más cercanas (mismo resultado)
+GALLERY_DTYPE = "float32"  # "float16"/"int8": comparar contra la copia cuantizada (menos memoria, distancias aproximadas)
+GALLERY_BACKEND = "files"  # "files" = data/gallery/ + cache pickle; "sqlite" = data/gallery.sqlite3 (sabe de qué foto sale cada embedding)
+FACE_CHIPS = True  # Guardar el rostro alineado de cada foto aprendida (recodificar luego sin detectar: chip_cache.py reencode)
+GALLERY_COMPACT_SEGMENTS = 8  # Fusionar en segundo plano los segmentos de la galería al llegar a N (0 = nunca)
 
 
 def normalize_name(name: str) -> str:
@@ -39,21 +71,84 @@ def normalize_name(name: str) -> str:
     return normalized
 
 
+def open_store():
+    """Donde se guardan los encodings por imagen: cache pickle o base SQLite."""
+    if GALLERY_BACKEND == "sqlite":
+        return GalleryDB(DB_FILE)
+    return EncodingCache(CACHE_FILE, chips=ChipCache() if FACE_CHIPS else None)
+
+
 def load_encodings():
-    if not ENC_FILE.exists():
-        return {"encodings": [], "names": []}
-    with open(ENC_FILE, "rb") as f:
-        return pickle.load(f)
+    if GALLERY_BACKEND == "sqlite":
+        # Carga masiva de la base a una matriz en memoria
+        with GalleryDB(DB_FILE) as db:
+            return db.load_gallery()
+    if not gallery_store.exists(GALLERY_DIR):
+        if not ENC_FILE.exists():
+            return Gallery.empty()
+        # Migración única desde el pickle antiguo
+        gallery_store.migrate_pickle(ENC_FILE, GALLERY_DIR)
+        print(f"Migrado {ENC_FILE} a {GALLERY_DIR}")
+    return Gallery.open(GALLERY_DIR)
 
 
 def save_encodings(encodings, names):
-    data = {"encodings": encodings, "names": names}
-    with open(ENC_FILE, "wb") as f:
-        pickle.dump(data, f)
+    gallery = Gallery.from_lists(encodings, names)
+    gallery.save(GALLERY_DIR, quantize=() if GALLERY_DTYPE == "float32" else (GALLERY_DTYPE,))
+    return gallery
+
+
+def enroll_photos(gallery, img_paths):
+    """
+    Alta incremental: codifica solo las fotos recién capturadas y las añade
+    al final de la galería (en memoria y en disco). El resto de data/train/
+    no se vuelve a leer; la reconstrucción completa queda para --rebuild o
+    encode_faces.py.
+    """
+    store = open_store()
+    data = store.add(img_paths, TRAIN_DIR, model="hog")
+    if not data["encodings"]:
+        return gallery, 0
+    start = len(gallery)
+    gallery = gallery.append(data["encodings"], data["names"])
+    if GALLERY_BACKEND == "sqlite":
+        # Ya quedaron en la base (una transacción); no hay nada más que escribir
+        store.close()
+        return gallery, len(data["encodings"])
+    # Solo se escribe un segmento con las filas nuevas; se fusionan en segundo plano
+    segments = gallery_store.append_segment(GALLERY_DIR, gallery, start)
+    if GALLERY_COMPACT_SEGMENTS and segments >= GALLERY_COMPACT_SEGMENTS:
+        gallery_store.compact_segments(GALLERY_DIR, background=True)
+    return gallery, len(data["encodings"])
+
+
+def build_matcher(gallery):
+    """
+    Matcher exacto, con índice IVF si la galería es grande, o sobre la copia
+    cuantizada. Se elige uno solo: el IVF tiene prioridad sobre
+    HIERARCHICAL_TOP_K y este sobre GALLERY_DTYPE.
+    """
+    if COMPACT_MAX_PER_IDENTITY:
+        full_rows = len(gallery)
+        gallery, _ = compact(gallery, COMPACT_MAX_PER_IDENTITY)
+        print(f"Galería compactada: {full_rows} -> {len(gallery)} embeddings")
+    if ANN_MIN_GALLERY and len(gallery) >= ANN_MIN_GALLERY:
+        # La galería de SQLite y la compactada viven solo en memoria: su índice
+        # se guarda aparte para no repetir k-means en cada arranque y alta
+        index_dir = gallery.path if gallery.path is not None else ANN_INDEX_DIR
+        index = ann_index.load_or_build(gallery, path=index_dir)
+        return FaceMatcher(gallery, index=index, nprobe=ANN_NPROBE)
+    if HIERARCHICAL_TOP_K:
+        return HierarchicalMatcher(gallery, top_k=HIERARCHICAL_TOP_K)
+    if GALLERY_DTYPE != "float32":
+        return QuantizedMatcher(gallery, GALLERY_DTYPE)
+    return FaceMatcher(gallery)
 
 
 def save_face_image(frame, box, label):
     top, right, bottom, left = box
+    top, left = max(top, 0), max(left, 0)
+    bottom, right = min(bottom, frame.shape[0]), min(right, frame.shape[1])
     face = frame[top:bottom, left:right]
     # Normalizar el nombre de la carpeta
     normalized_label = normalize_name(label)
@@ -62,27 +157,25 @@ def save_face_image(frame, box, label):
     ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     out_path = dest_dir / f"{ts}.jpg"
     cv2.imwrite(str(out_path), face)
+    # Caja y landmarks medidos en el frame completo, en coordenadas del recorte:
+    # al codificar no hay que volver a detectar sobre un recorte tan ajustado
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    shape = face_models.raw_face_landmarks(rgb, [(top, right, bottom, left)])[0]
+    landmarks = [(p.x - left, p.y - top) for p in shape.parts()]
+    write_sidecar(out_path, (0, right - left, bottom - top, 0), landmarks)
     return out_path
 
 
 def rebuild_encodings_from_train():
-    encodings = []
-    names = []
-    for person_dir in TRAIN_DIR.iterdir():
-        if not person_dir.is_dir():
-            continue
-        label = person_dir.name
-        for img_path in person_dir.glob("*.*"):
-            image = face_recognition.load_image_file(img_path)
-            boxes = face_recognition.face_locations(image, model="hog")
-            if not boxes:
-                print(f"Sin rostro en {img_path}, se omite.")
-                continue
-            face_encs = face_recognition.face_encodings(image, boxes)
-            encodings.extend(face_encs)
-            names.extend([label] * len(face_encs))
-    save_encodings(encodings, names)
-    return encodings, names
+    if GALLERY_BACKEND == "sqlite":
+        # Solo se tocan las fotos nuevas, modificadas, borradas o renombradas
+        with GalleryDB(DB_FILE) as db:
+            db.sync(TRAIN_DIR, model="hog")
+            return db.load_gallery()
+    # La cache evita recodificar las imágenes que no cambiaron
+    cache = open_store()
+    data = cache.sync(TRAIN_DIR, model="hog")
+    return save_encodings(data["encodings"], data["names"])
 
 
 def capture_training_photos(video, label, capture_count=5):
@@ -90,6 +183,7 @@ def capture_training_photos(video, label, capture_count=5):
     Captura fotos controladas de múltiples ángulos con instrucciones visuales.
     Pide al usuario que mire hacia: frente, derecha, izquierda, arriba, abajo.
     OBLIGA a capturar de todos los ángulos - no salta ni omite.
+    Devuelve las rutas de las fotos guardadas (lista vacía si se cancela).
     """
     angles = [
         {"name": "Frente", "instruction": "Mira AL FRENTE", "color": (0, 255, 0)},
@@ -99,7 +193,7 @@ def capture_training_photos(video, label, capture_count=5):
         {"name": "Abajo", "instruction": "Mira hacia ABAJO", "color": (255, 100, 255)},
     ]
     
-    captured = 0
+    captured = []
     angle_idx = 0
     frames_in_angle = 0
     frames_per_capture = 90  # Capturar 1 foto cada 90 frames (3s) en ese ángulo
@@ -120,7 +214,7 @@ def capture_training_photos(video, label, capture_count=5):
         proc_frame = cv2.resize(frame, (0, 0), fx=DOWNSCALE, fy=DOWNSCALE)
         
         rgb_proc = cv2.cvtColor(proc_frame, cv2.COLOR_BGR2RGB)
-        boxes_proc = face_recognition.face_locations(rgb_proc, model=MODEL)
+        boxes_proc = face_models.face_locations(rgb_proc, model=MODEL)
         
         h, w = frame.shape[:2]
         
@@ -169,7 +263,7 @@ def capture_training_photos(video, label, capture_count=5):
         
         if key == ord("q"):
             print("\nEntrenamiento cancelado completamente.")
-            return 0
+            return []
         
         if key == 27:  # ESC - Omitir ángulo pero continuar
             print(f"  ⚠ Ángulo '{current_angle['name']}' omitido manualmente.")
@@ -185,9 +279,8 @@ def capture_training_photos(video, label, capture_count=5):
             top, right, bottom, left = boxes_proc[0]
             box_full = (int(top * inv), int(right * inv), int(bottom * inv), int(left * inv))
             
-            save_face_image(frame, box_full, label)
-            captured += 1
-            print(f"  ✓ Captura completada: {current_angle['name']} ({captured}/{len(angles)})")
+            captured.append(save_face_image(frame, box_full, label))
+            print(f"  ✓ Captura completada: {current_angle['name']} ({len(captured)}/{len(angles)})")
             
             # Pausa visual corta antes de siguiente ángulo
             for _ in range(15):  # 0.5 segundos aprox
@@ -210,9 +303,8 @@ def capture_training_photos(video, label, capture_count=5):
                     inv = 1.0 / DOWNSCALE
                     top, right, bottom, left = boxes_proc[0]
                     box_full = (int(top * inv), int(right * inv), int(bottom * inv), int(left * inv))
-                    save_face_image(frame, box_full, label)
-                    captured += 1
-                    print(f"  ✓ Captura de emergencia: {current_angle['name']} ({captured}/{len(angles)})")
+                    captured.append(save_face_image(frame, box_full, label))
+                    print(f"  ✓ Captura de emergencia: {current_angle['name']} ({len(captured)}/{len(angles)})")
                 else:
                     print(f"  ⚠ No se capturó rostro en '{current_angle['name']}' después de {max_wait_time // 30}s. Omitido.")
                 
@@ -222,115 +314,150 @@ def capture_training_photos(video, label, capture_count=5):
             else:
                 frames_in_angle += 1
     
-    print(f"\n✓ Completado: {captured} ángulos procesados (de {len(angles)} solicitados).\n")
+    print(f"\n✓ Completado: {len(captured)} ángulos procesados (de {len(angles)} solicitados).\n")
     return captured
 
 
+def draw_overlay(frame, boxes, names, tolerance, video, worker, scheduler=None):
+    for (top, right, bottom, left), name in zip(boxes, names):
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+        cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+
+    cv2.putText(frame, "q: salir  a: aprender/guardar  p: perfil", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    cv2.putText(frame, f"tol {tolerance:.2f}  -/+ ajusta  r: reforzar", (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    # Latencia captura->pantalla y frames que el hilo de captura descartó
+    latency_ms = video.frame_age() * 1000
+    cv2.putText(frame, f"lat {latency_ms:.0f}ms  descartados {video.frames_dropped}  encodings {worker.tracker.encoder_calls}", (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+    if worker.last_error is not None:
+        cv2.putText(frame, f"error ({worker.errors}): {worker.last_error}"[:80], (10, frame.shape[0] - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    if scheduler is not None:
+        cv2.putText(frame, scheduler.describe(), (10, 95), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reconocimiento facial en tiempo real")
+    parser.add_argument(
+        "--source",
+        default="0",
+        help="Índice de cámara, archivo de video, carpeta de imágenes o 'synthetic[:N]' (por defecto 0)",
+    )
+    parser.add_argument("--headless", action="store_true", help="Sin ventana: escribe eventos JSONL en lugar de dibujar")
+    parser.add_argument("--events", type=Path, default=None, help="Archivo JSONL de eventos para --headless (por defecto stdout)")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Procesar cada frame enviado en el mismo hilo, sin descartar (por defecto con --headless sin cámara)",
+    )
+    parser.add_argument("--max-frames", type=int, default=0, help="Detenerse tras N frames (0 = sin límite)")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Reconstruir la galería completa desde data/train/ antes de empezar (mantenimiento)",
+    )
+    return parser.parse_args()
+
+
 def main():
-    data = load_encodings()
-    known_encodings = data["encodings"]
-    known_names = data["names"]
+    args = parse_args()
+    # Los modelos de dlib se cargan en segundo plano mientras se abren la galería y la cámara
+    face_models.preload(face_models.models_for(MODEL), background=True)
+    if args.rebuild:
+        gallery = rebuild_encodings_from_train()
+        print(f"Galería reconstruida: {len(gallery)} embeddings ({len(gallery.names)} personas)")
+    else:
+        gallery = load_encodings()
+    matcher = build_matcher(gallery)
     tolerance = TOLERANCE
 
-    video = cv2.VideoCapture(0)
+    # Cámara (con hilo de captura), video, carpeta de imágenes o generador sintético
+    video = open_source(args.source, face_images=sorted(TRAIN_DIR.glob("*/*.jpg")))
     if not video.isOpened():
-        raise RuntimeError("No se pudo abrir la cámara")
-    
-    # Optimizar configuración de cámara para fluidez
-    video.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimizar buffer para menor latencia
-    video.set(cv2.CAP_PROP_FPS, 30)  # Establecer FPS a 30
-    video.set(cv2.CAP_PROP_FRAME_WIDTH, 640)  # Resolución reducida
-    video.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)  # Resolución reducida
+        raise RuntimeError("No se pudo abrir la cámara" if isinstance(video, CameraSource) else f"No se pudo abrir {args.source}")
+    sink = JsonlSink(args.events) if args.headless else WindowSink("Reconocimiento")
+    # Sin cámara y sin ventana no hay tiempo real que respetar: procesar todo
+    sync = args.sync or (args.headless and not isinstance(video, CameraSource))
+    adaptive = ADAPTIVE and not sync
+
+    # Latencias por etapa (p50/p95/p99); overlay con la tecla "p"
+    profiler = StageProfiler(metrics_file=METRICS_FILE, dump_every_sec=METRICS_EVERY_SEC)
+
+    # Detección y reconocimiento en segundo plano; el render no espera
+    worker = RecognitionWorker(
+        matcher, tolerance, model=MODEL, scale=DOWNSCALE, policy=RESULT_POLICY, max_age=RESULT_MAX_AGE,
+        motion_gate=MotionGate() if MOTION_GATE else None, roi_full_every=ROI_FULL_EVERY, profiler=profiler,
+    )
+    if not sync:
+        worker.start()
+
+    # Intervalo de detección y escala: fijos o ajustados en vivo
+    scheduler = AdaptiveScheduler(target_fps=TARGET_FPS, detect_every=DETECT_EVERY_N_FRAMES, scale=DOWNSCALE)
 
     frame_count = 0
-    boxes = []
-    names = []  # Guardar nombres detectados
-    encs = []  # Guardar encodings para funciones de aprender/reforzar
-    last_detection_time = 0  # Control de tiempo para detección
+    last_event_id = 0
 
     while True:
-        ret, frame = video.read()
+        with profiler.stage("capture"):
+            ret, frame = video.read()
         if not ret:
             break
 
         frame_count += 1
-        scale = DOWNSCALE
         
-        # Detectar y reconocer rostros solo cada N frames para mejorar fluidez
-        if frame_count % DETECT_EVERY_N_FRAMES == 0:
-            # Reducir aún más el frame para detección
-            proc_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
-
-            rgb = cv2.cvtColor(proc_frame, cv2.COLOR_BGR2RGB)
-            boxes_proc = face_recognition.face_locations(rgb, model=MODEL)
-            
-            # Solo calcular encodings si hay caras detectadas
-            if boxes_proc:
-                encs = face_recognition.face_encodings(rgb, boxes_proc)
-                
-                # Escalar las cajas de regreso al tamaño original
-                boxes = []
-                inv = 1.0 / scale
-                for (top, right, bottom, left) in boxes_proc:
-                    boxes.append(
-                        (
-                            int(top * inv),
-                            int(right * inv),
-                            int(bottom * inv),
-                            int(left * inv),
-                        )
-                    )
-                
-                # Reconocer rostros solo cuando se detectan
-                names = []
-                for enc in encs:
-                    name = "Desconocido"
-                    if len(known_encodings) > 0:
-                        # Usar compare_faces para mejor precisión
-                        matches = face_recognition.compare_faces(known_encodings, enc, tolerance=tolerance)
-                        if True in matches:
-                            # Si hay múltiples coincidencias, usar la de menor distancia
-                            face_distances = face_recognition.face_distance(known_encodings, enc)
-                            best_match_index = np.argmin(face_distances)
-                            if matches[best_match_index]:
-                                name = known_names[best_match_index]
-                    names.append(name)
+        # Enviar un frame al worker cada N frames; si está ocupado, solo se
+        # conserva el más reciente
+        if frame_count % scheduler.detect_every == 0:
+            if sync:
+                worker.process_frame(frame, frame_count)
             else:
-                # No hay caras, limpiar
-                boxes = []
-                names = []
-                encs = []
+                worker.submit(frame, frame_count)
 
-        # Dibujar resultados en cada frame usando los últimos datos detectados
-        for (top, right, bottom, left), name in zip(boxes, names):
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-            cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        # Últimos resultados disponibles, reescalados al frame actual
+        result = worker.latest()
+        if result.frame_id != last_event_id:
+            sink.event(result)
+            last_event_id = result.frame_id
+        if adaptive:
+            scheduler.observe(result)
+            scheduler.tick(video.frames_grabbed)
+            worker.scale = scheduler.scale
+        boxes = result.boxes_for(frame.shape, frame_count)
+        names = result.names
+        encs = result.encodings  # Guardar encodings para funciones de aprender/reforzar
 
-        cv2.putText(frame, "q: salir  a: aprender/guardar", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(frame, f"tol {tolerance:.2f}  -/+ ajusta  r: reforzar", (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        # Dibujar resultados en cada frame usando los últimos datos detectados
+        if not args.headless:
+            with profiler.stage("drawing"):
+                draw_overlay(frame, boxes, names, tolerance, video, worker, scheduler if adaptive else None)
+                profiler.draw(frame)
 
-        cv2.imshow("Reconocimiento", frame)
-        key = cv2.waitKey(1) & 0xFF  # 1ms para máxima fluidez
+        with profiler.stage("display"):
+            key = sink.show(frame)
+        profiler.frame_done()
+        if args.max_frames and frame_count >= args.max_frames:
+            break
         if key == ord("q"):
             break
+        if key == ord("p"):
+            profiler.show_overlay = not profiler.show_overlay
         if key == ord("-"):
             tolerance = max(0.20, round(tolerance - 0.02, 2))
+            worker.tolerance = tolerance
             print(f"Tolerancia ahora {tolerance:.2f} (mas estricto)")
         if key == ord("+") or key == ord("="):
             tolerance = min(0.80, round(tolerance + 0.02, 2))
+            worker.tolerance = tolerance
             print(f"Tolerancia ahora {tolerance:.2f} (mas permisivo)")
         if key == ord("r"):
             if not encs:
                 print("No hay rostro en cuadro para reforzar.")
                 continue
             # Verificar si el rostro actual está registrado
-            matches = face_recognition.compare_faces(known_encodings, encs[0], tolerance=tolerance)
-            if True not in matches:
+            match = matcher.match(encs[:1], tolerance)
+            if not match.accepted[0]:
                 print("Rostro no reconocido. Usa 'a' para aprender un rostro nuevo.")
                 continue
             
-            idx = matches.index(True)
-            existing_name = known_names[idx]
+            existing_name = matcher.gallery.name_at(match.indices[0])
             
             root = tk.Tk()
             root.withdraw()
@@ -348,23 +475,24 @@ def main():
             # Captura múltiple controlada con ángulos
             captured = capture_training_photos(video, existing_name, CAPTURE_COUNT)
             
-            if captured == 0:
+            if not captured:
                 print("No se pudo capturar ninguna foto. Intenta de nuevo.")
                 continue
             
-            # Reentrena con las nuevas fotos
-            known_encodings, known_names = rebuild_encodings_from_train()
-            print(f"Reforzado {existing_name} con {captured} fotos adicionales. Modelo actualizado.")
+            # Añade solo las nuevas fotos a la galería
+            gallery, added = enroll_photos(gallery, captured)
+            matcher = build_matcher(gallery)
+            worker.set_matcher(matcher)
+            print(f"Reforzado {existing_name} con {len(captured)} fotos adicionales ({added} embeddings). Modelo actualizado.")
         if key == ord("a"):
             if not encs:
                 print("No hay rostro en cuadro para aprender.")
                 continue
             
             # Verificar si el rostro ya está registrado
-            matches = face_recognition.compare_faces(known_encodings, encs[0], tolerance=tolerance)
-            if True in matches:
-                idx = matches.index(True)
-                existing_name = known_names[idx]
+            match = matcher.match(encs[:1], tolerance)
+            if match.accepted[0]:
+                existing_name = matcher.gallery.name_at(match.indices[0])
                 root = tk.Tk()
                 root.withdraw()
                 messagebox = __import__('tkinter').messagebox
@@ -388,16 +516,28 @@ def main():
             # Captura múltiple controlada con ángulos
             captured = capture_training_photos(video, label, CAPTURE_COUNT)
             
-            if captured == 0:
+            if not captured:
                 print("No se pudo capturar ninguna foto. Intenta de nuevo.")
                 continue
             
-            # Reentrena desde data/train para incluir las nuevas fotos
-            known_encodings, known_names = rebuild_encodings_from_train()
-            print(f"Guardadas {captured} fotos para {label} y actualizado {ENC_FILE}")
+            # Añade solo las nuevas fotos a la galería
+            gallery, added = enroll_photos(gallery, captured)
+            matcher = build_matcher(gallery)
+            worker.set_matcher(matcher)
+            print(f"Guardadas {len(captured)} fotos para {label} ({added} embeddings) y actualizado {GALLERY_DIR}")
 
+    worker.stop()
+    if METRICS_FILE is not None:
+        profiler.dump()
+    stats = video.stats()
+    if stats:
+        print(f"Frames: {stats['grabbed']} capturados, {stats['read']} procesados, {stats['dropped']} descartados")
+    else:
+        print(f"Frames: {frame_count} leídos, {worker.frames_processed} procesados")
+    if worker.motion_gate is not None:
+        print(f"Detecciones omitidas por escena estática: {worker.motion_gate.frames_skipped}")
     video.release()
-    cv2.destroyAllWindows()
+    sink.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+"""
+Ajuste en tiempo de ejecución del intervalo de detección y del escalado.
+
+DETECT_EVERY_N_FRAMES y DOWNSCALE fijos solo sirven para una máquina y una
+escena. AdaptiveScheduler mide los FPS de render, la latencia de
+detección+encoding y el tamaño de los rostros observados, y cada segundo
+ajusta ambos valores para mantener los FPS objetivo:
+
+  - si el render va lento, primero reduce la escala (el coste de HOG crece
+    con el número de píxeles) y, si ya está en el mínimo, detecta menos seguido
+  - si sobra margen, primero detecta más seguido y luego sube la escala
+
+La escala nunca baja de la que deja al rostro más pequeño visto recientemente
+en MIN_FACE_PX píxeles, el tamaño mínimo que HOG (upsample=1) detecta bien.
+
+Los FPS objetivo se limitan a los que entrega la fuente: si la cámara da 15
+FPS, el render nunca pasará de 15 por mucho que se reduzca la escala. Se
+miden con el contador de frames del hilo de captura (frames_grabbed, que
+avanza al ritmo de la cámara aunque el bucle esté ocupado) sobre el tiempo
+de reloj. Sin contador (video en disco, imágenes, fuente sintética) la
+fuente entrega tan rápido como se lee y no se limita.
+"""
+import math
+import time
+from collections import deque
+
+MIN_FACE_PX = 48
+
+
+class AdaptiveScheduler:
+    def __init__(self, target_fps=30.0, detect_every=3, scale=0.4, min_scale=0.25, max_scale=0.75,
+                 max_detect_every=15, scale_step=0.05, adjust_every_sec=1.0):
+        self.target_fps = target_fps
+        self.detect_every = detect_every
+        self.scale = scale
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.max_detect_every = max_detect_every
+        self.scale_step = scale_step
+        self.adjust_every_sec = adjust_every_sec
+        self.render_fps = 0.0
+        self.source_fps = math.inf  # techo que impone la cámara (inf si no se mide)
+        self.latency = 0.0  # media móvil de detección + encoding (s)
+        self._frames = 0
+        self._grabbed_start = None
+        self._window_start = time.perf_counter()
+        self._face_heights = deque(maxlen=20)  # alto del rostro más pequeño por resultado
+        self._last_frame_id = None
+
+    def tick(self, frames_grabbed=None):
+        """
+        Llamar una vez por frame dibujado, con el total de frames que lleva
+        capturados la fuente (None si no lo sabe). Reajusta cada `adjust_every_sec`.
+        """
+        self._frames += 1
+        if self._grabbed_start is None:
+            self._grabbed_start = frames_grabbed
+        now = time.perf_counter()
+        elapsed = now - self._window_start
+        if elapsed >= self.adjust_every_sec:
+            self.render_fps = self._frames / elapsed
+            if frames_grabbed is not None and self._grabbed_start is not None:
+                self.source_fps = (frames_grabbed - self._grabbed_start) / elapsed
+            else:
+                self.source_fps = math.inf
+            self._frames = 0
+            self._grabbed_start = frames_grabbed
+            self._window_start = now
+            self._adjust()
+
+    def observe(self, result):
+        """Registra un resultado del worker (se ignora si ya se vio)."""
+        if result.frame_id == self._last_frame_id or result.elapsed <= 0:
+            return
+        self._last_frame_id = result.frame_id
+        self.latency = result.elapsed if self.latency == 0 else 0.8 * self.latency + 0.2 * result.elapsed
+        if result.boxes:
+            self._face_heights.append(min(bottom - top for top, _, bottom, _ in result.boxes))
+
+    def scale_floor(self):
+        """Escala mínima que mantiene el rostro más pequeño reciente detectable."""
+        if not self._face_heights:
+            return self.min_scale
+        smallest = max(1, min(self._face_heights))
+        return min(self.max_scale, max(self.min_scale, MIN_FACE_PX / smallest))
+
+    def effective_target(self):
+        """FPS objetivo acotados a los que entrega la fuente."""
+        return min(self.target_fps, self.source_fps)
+
+    def _adjust(self):
+        floor = self.scale_floor()
+        target = self.effective_target()
+        # No tiene sentido enviar frames más rápido de lo que el worker procesa
+        min_every = max(1, math.ceil(self.latency * target))
+        if self.scale < floor:
+            self.scale = round(floor, 2)
+
+        # Con una cámara más lenta que target_fps, el render sigue a la cámara:
+        # bajar la escala o detectar menos no lo acelera
+        if self.render_fps < 0.9 * target:
+            if self.scale - self.scale_step >= floor:
+                self.scale = round(self.scale - self.scale_step, 2)
+            elif self.detect_every < self.max_detect_every:
+                self.detect_every += 1
+        elif self.render_fps >= 0.98 * target:
+            if self.detect_every > min_every:
+                self.detect_every -= 1
+            elif self.scale + self.scale_step <= self.max_scale:
+                self.scale = round(self.scale + self.scale_step, 2)
+        self.detect_every = max(1, min(self.detect_every, self.max_detect_every))
+
+    def describe(self):
+        return (f"fps {self.render_fps:.0f}/{self.effective_target():.0f}  cada {self.detect_every}  "
+                f"escala {self.scale:.2f}  det {self.latency * 1000:.0f}ms")
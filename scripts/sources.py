@@ -0,0 +1,226 @@
+"""
+Fuentes de frames y salidas intercambiables para el bucle de reconocimiento.
+
+Fuentes (todas con read() -> (ret, frame) como cv2.VideoCapture):
+  CameraSource     cámara por índice, con hilo de captura (capture.LatestFrameReader)
+  VideoFileSource  archivo de video, frame a frame sin descartar
+  ImageDirSource   carpeta de imágenes en orden alfabético
+  SyntheticSource  generador determinista (semilla fija) que pega rostros de
+                   data/train sobre un fondo y los desplaza
+
+Salidas:
+  WindowSink       cv2.imshow + waitKey (modo normal)
+  JsonlSink        escribe eventos de reconocimiento en JSONL, sin dibujar
+
+open_source("0" | "video.mp4" | "carpeta/" | "synthetic" | "synthetic:300")
+elige la fuente a partir de un texto, como recibe recognize.py --source.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from capture import LatestFrameReader
+from image_files import IMAGE_EXTS
+
+
+class FrameSource:
+    frames_dropped = 0
+    frames_grabbed = None  # frames capturados a ritmo propio (solo cámaras con hilo)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        raise NotImplementedError
+
+    def frame_age(self):
+        """Segundos desde la captura del último frame (0 si no aplica)."""
+        return 0.0
+
+    def stats(self):
+        return {}
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    def __init__(self, index=0, width=640, height=480, fps=30):
+        self.reader = LatestFrameReader(index)
+        if self.reader.isOpened():
+            # Configurar antes de arrancar el hilo de captura
+            self.reader.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimizar buffer para menor latencia
+            self.reader.set(cv2.CAP_PROP_FPS, fps)
+            self.reader.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.reader.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            self.reader.start()
+
+    @property
+    def frames_dropped(self):
+        return self.reader.frames_dropped
+
+    @property
+    def frames_grabbed(self):
+        return self.reader.frames_grabbed
+
+    def isOpened(self):
+        return self.reader.isOpened()
+
+    def read(self):
+        return self.reader.read()
+
+    def frame_age(self):
+        return self.reader.frame_age()
+
+    def stats(self):
+        return self.reader.stats()
+
+    def release(self):
+        self.reader.release()
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path):
+        self.path = Path(path)
+        self.capture = cv2.VideoCapture(str(path))
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageDirSource(FrameSource):
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = sorted(p for p in self.path.rglob("*") if p.suffix.lower() in IMAGE_EXTS)
+        self._idx = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        while self._idx < len(self.files):
+            img_path = self.files[self._idx]
+            self._idx += 1
+            frame = cv2.imread(str(img_path))
+            if frame is not None:
+                return True, frame
+            print(f"No se pudo leer {img_path}, se omite.")
+        return False, None
+
+
+class SyntheticSource(FrameSource):
+    """
+    Frames deterministas: fondo con ruido fijo y hasta `faces` recortes de
+    rostros (tomados de `face_images`) que se desplazan por la escena. Sin
+    imágenes de rostros se usan rectángulos, útil solo para medir el bucle.
+    """
+
+    def __init__(self, n_frames=300, width=640, height=480, faces=2, face_images=(), seed=0):
+        self.n_frames = n_frames
+        self.width = width
+        self.height = height
+        self._idx = 0
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+        sprites = []
+        for img_path in list(face_images)[:faces]:
+            img = cv2.imread(str(img_path))
+            if img is None:
+                continue
+            side = min(height // 2, 160)
+            sprites.append(cv2.resize(img, (side, int(side * img.shape[0] / img.shape[1]))))
+        while len(sprites) < faces:
+            sprites.append(np.full((120, 100, 3), 200, dtype=np.uint8))
+        self.sprites = [s[: height - 1, : width - 1] for s in sprites]
+        # Trayectoria de cada sprite: posición inicial y velocidad fijas por la semilla
+        self.paths = [
+            (rng.uniform(0, 1), rng.uniform(0, 1), rng.uniform(-4, 4), rng.uniform(-3, 3))
+            for _ in self.sprites
+        ]
+
+    def read(self):
+        if self._idx >= self.n_frames:
+            return False, None
+        frame = self.background.copy()
+        for sprite, (fx, fy, vx, vy) in zip(self.sprites, self.paths):
+            sh, sw = sprite.shape[:2]
+            span_x = self.width - sw
+            span_y = self.height - sh
+            # Rebote en los bordes (onda triangular) para que sea periódico
+            x = int(abs((fx * span_x + vx * self._idx) % (2 * span_x) - span_x)) if span_x > 0 else 0
+            y = int(abs((fy * span_y + vy * self._idx) % (2 * span_y) - span_y)) if span_y > 0 else 0
+            frame[y:y + sh, x:x + sw] = sprite
+        self._idx += 1
+        return True, frame
+
+
+def open_source(spec, face_images=()):
+    """Crea la fuente a partir de un texto (índice de cámara, ruta o 'synthetic[:N]')."""
+    spec = str(spec)
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if spec == "synthetic" or spec.startswith("synthetic:"):
+        n_frames = int(spec.split(":", 1)[1]) if ":" in spec else 300
+        return SyntheticSource(n_frames=n_frames, face_images=face_images)
+    path = Path(spec)
+    if path.is_dir():
+        return ImageDirSource(path)
+    if path.is_file():
+        return VideoFileSource(path)
+    raise ValueError(f"Fuente no reconocida: {spec}")
+
+
+class WindowSink:
+    def __init__(self, window_name="Reconocimiento"):
+        self.window_name = window_name
+
+    def show(self, frame):
+        """Muestra el frame y devuelve la tecla pulsada (0xFF si ninguna)."""
+        cv2.imshow(self.window_name, frame)
+        return cv2.waitKey(1) & 0xFF  # 1ms para máxima fluidez
+
+    def event(self, result):
+        pass
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class JsonlSink:
+    """Salida sin ventana: una línea JSON por resultado de reconocimiento."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8") if path else sys.stdout
+
+    def show(self, frame):
+        return 0xFF
+
+    def event(self, result):
+        faces = [
+            {"box": list(box), "name": name, "distance": None if dist is None else round(float(dist), 4)}
+            for box, name, dist in zip(result.boxes, result.names, result.distances)
+        ]
+        record = {
+            "frame": result.frame_id,
+            "ts": round(time.time(), 3),
+            "elapsed_ms": round(result.elapsed * 1000, 2),
+            "faces": faces,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+        else:
+            self._file.flush()
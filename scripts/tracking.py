@@ -0,0 +1,178 @@
+"""
+Seguimiento de rostros entre detecciones para no recodificar a la misma persona.
+
+Cada detección se asocia por IoU con la posición prevista de los tracks
+existentes. Un rostro se codifica y compara con la galería una sola vez,
+cuando su track empieza; si el track se pierde (sale de cuadro, lo tapan),
+al volver es un track nuevo y se codifica otra vez. En régimen estable el
+encoder corre una vez por persona nueva.
+
+La re-verificación periódica es opcional: con `reverify_sec` se recodifica
+cada track cada tantos segundos, y con `low_confidence_sec` los que quedan
+cerca o por encima de la tolerancia. Sirve para corregir un primer encoding
+malo (rostro movido o de perfil) a cambio de más llamadas al encoder;
+bench_recognition.py mide las dos variantes.
+
+Entre detecciones (detect_every > 1) las cajas se extrapolan con la
+velocidad de cada track (Track.predict), así no se quedan atrás del rostro.
+"""
+import itertools
+import time
+
+from matcher import UNKNOWN_NAME
+
+MAX_PREDICT_FRAMES = 15  # límite de la extrapolación si la detección se retrasa
+
+
+def extrapolate(box, velocity, steps, max_frames=MAX_PREDICT_FRAMES):
+    """Caja desplazada `steps` frames a `velocity` (píxeles por frame por lado)."""
+    steps = min(max(steps, 0), max_frames)
+    return tuple(int(round(v + d * steps)) for v, d in zip(box, velocity))
+
+
+def boxes_overlap(box_a, box_b):
+    return (min(box_a[1], box_b[1]) > max(box_a[3], box_b[3])
+            and min(box_a[2], box_b[2]) > max(box_a[0], box_b[0]))
+
+
+def iou(box_a, box_b):
+    """Intersección sobre unión de dos cajas (top, right, bottom, left)."""
+    top = max(box_a[0], box_b[0])
+    right = min(box_a[1], box_b[1])
+    bottom = min(box_a[2], box_b[2])
+    left = max(box_a[3], box_b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    if inter == 0:
+        return 0.0
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    def __init__(self, track_id, box, frame_id=None):
+        self.id = track_id
+        self.box = box
+        self.frame_id = frame_id  # frame de la última detección
+        self.velocity = (0.0, 0.0, 0.0, 0.0)  # píxeles por frame de cada lado de la caja
+        self.observations = 1  # detecciones asociadas (la primera no da velocidad)
+        self.encoding = None
+        self.best_index = -1  # fila de la galería más cercana
+        self.distance = float("inf")
+        self.misses = 0
+        self.verified_at = None  # momento de la última codificación
+
+    def predict(self, frame_id, max_frames=MAX_PREDICT_FRAMES):
+        """Caja prevista en `frame_id` (como mucho `max_frames` hacia adelante)."""
+        if frame_id is None or self.frame_id is None:
+            return self.box
+        return extrapolate(self.box, self.velocity, frame_id - self.frame_id, max_frames)
+
+    def observe(self, box, frame_id):
+        """Nueva detección: actualiza la velocidad (media móvil) y la caja."""
+        if frame_id is not None and self.frame_id is not None and frame_id > self.frame_id:
+            steps = frame_id - self.frame_id
+            measured = tuple((new - old) / steps for new, old in zip(box, self.box))
+            if self.observations > 1:
+                measured = tuple(0.5 * v + 0.5 * m for v, m in zip(self.velocity, measured))
+            self.velocity = measured
+        self.box = box
+        self.frame_id = frame_id
+        self.observations += 1
+
+    def name(self, gallery, tolerance):
+        # El nombre se recalcula con la tolerancia actual sin recodificar
+        if self.best_index < 0 or self.distance > tolerance:
+            return UNKNOWN_NAME
+        return gallery.name_at(self.best_index)
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_misses=3, reverify_sec=None,
+                 low_confidence_sec=None, confidence_margin=0.05):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.reverify_sec = reverify_sec
+        self.low_confidence_sec = low_confidence_sec
+        self.confidence_margin = confidence_margin
+        self.tracks = []
+        self.encoder_calls = 0
+        self._ids = itertools.count(1)
+
+    def associate(self, boxes, regions=None, frame_id=None):
+        """
+        Asocia las cajas detectadas en `frame_id` con los tracks (greedy por
+        IoU contra su caja prevista para ese frame). Devuelve la lista de
+        tracks alineada con `boxes`; los no emparejados se crean y los tracks
+        sin detección acumulan fallos hasta descartarse. Si la detección se
+        limitó a `regions`, los tracks que quedan fuera de todas ellas no se
+        penalizan.
+        """
+        predicted = [track.predict(frame_id) for track in self.tracks]
+        pairs = sorted(
+            ((iou(predicted[t_idx], box), t_idx, b_idx)
+             for t_idx in range(len(self.tracks))
+             for b_idx, box in enumerate(boxes)),
+            reverse=True,
+        )
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for overlap, t_idx, b_idx in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t_idx in used_tracks or assigned[b_idx] is not None:
+                continue
+            track = self.tracks[t_idx]
+            track.observe(boxes[b_idx], frame_id)
+            track.misses = 0
+            assigned[b_idx] = track
+            used_tracks.add(t_idx)
+
+        survivors = []
+        for t_idx, track in enumerate(self.tracks):
+            if t_idx not in used_tracks:
+                if regions is not None and not any(boxes_overlap(track.box, r) for r in regions):
+                    survivors.append(track)
+                    continue
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for b_idx, box in enumerate(boxes):
+            if assigned[b_idx] is None:
+                track = Track(next(self._ids), box, frame_id)
+                assigned[b_idx] = track
+                survivors.append(track)
+        self.tracks = survivors
+        return assigned
+
+    def lost(self):
+        """True si algún track buscado en la última detección no apareció."""
+        return any(track.misses > 0 for track in self.tracks)
+
+    def visible(self):
+        """Tracks vistos en la última detección (o fuera de la región analizada)."""
+        return [track for track in self.tracks if track.misses == 0]
+
+    def needs_encoding(self, track, tolerance, now=None):
+        """True para un track nuevo, o si toca la re-verificación opcional."""
+        if track.verified_at is None:
+            return True
+        now = time.perf_counter() if now is None else now
+        age = now - track.verified_at
+        if track.distance > tolerance - self.confidence_margin and self.low_confidence_sec is not None:
+            return age >= self.low_confidence_sec
+        return self.reverify_sec is not None and age >= self.reverify_sec
+
+    def update_identity(self, track, encoding, best_index, distance, now=None):
+        track.encoding = encoding
+        track.best_index = int(best_index)
+        track.distance = float(distance)
+        track.verified_at = time.perf_counter() if now is None else now
+        self.encoder_calls += 1
+
+    def invalidate(self):
+        """Fuerza re-verificar todos los tracks (p. ej. tras cambiar la galería)."""
+        for track in self.tracks:
+            track.verified_at = None
+            track.best_index = -1
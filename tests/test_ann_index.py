@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import ann_index  # noqa: E402
+from ann_index import IVFIndex, gallery_digest, load_or_build  # noqa: E402
+from gallery import Gallery  # noqa: E402
+
+
+def _gallery(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.1, size=(rows, 128)).astype(np.float32)
+    return Gallery.from_lists(encodings, [f"p{i % 50}" for i in range(rows)])
+
+
+def _count_builds(monkeypatch):
+    builds = []
+    original = IVFIndex.build.__func__
+
+    def build(cls, *args, **kwargs):
+        builds.append(1)
+        return original(cls, *args, **kwargs)
+
+    monkeypatch.setattr(IVFIndex, "build", classmethod(build))
+    return builds
+
+
+def test_digest_covers_every_row():
+    gallery = _gallery(2000)
+    before = gallery_digest(gallery.encodings, len(gallery))
+    # Fila fuera de la muestra equiespaciada de 257 filas que se usaba antes
+    gallery.encodings[3, 0] += 1.0
+    assert gallery_digest(gallery.encodings, len(gallery)) != before
+
+
+def test_edited_row_rebuilds_index(tmp_path, monkeypatch):
+    builds = _count_builds(monkeypatch)
+    gallery = _gallery(2000)
+    load_or_build(gallery, path=tmp_path)
+    load_or_build(gallery, path=tmp_path)
+    assert len(builds) == 1
+
+    gallery.encodings[3] = gallery.encodings[1500]
+    index = load_or_build(gallery, path=tmp_path)
+    assert len(builds) == 2
+    assert index.digest == gallery_digest(gallery.encodings, len(gallery))
+
+
+def test_appended_rows_extend_saved_index(tmp_path, monkeypatch):
+    builds = _count_builds(monkeypatch)
+    gallery = _gallery(2000)
+    assert gallery.path is None
+    first = load_or_build(gallery, path=tmp_path)
+    assert ann_index.exists(tmp_path)
+
+    grown = gallery.append(_gallery(100, seed=1).encodings, ["nuevo"] * 100)
+    index = load_or_build(grown, path=tmp_path)
+    assert len(builds) == 1
+    assert len(index) == len(grown)
+    np.testing.assert_array_equal(index.assignments[:len(first)], first.assignments)
+    np.testing.assert_array_equal(index.centroids, first.centroids)
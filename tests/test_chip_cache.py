@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import encoding_cache  # noqa: E402
+from chip_cache import CHIP_SHAPE, ChipCache  # noqa: E402
+from encoding_cache import EncodingCache  # noqa: E402
+
+
+def _chips(n, value):
+    return np.full((n,) + CHIP_SHAPE, value, dtype=np.uint8)
+
+
+def test_get_reuses_memmap_until_put(tmp_path):
+    cache = ChipCache(tmp_path / "face_chips.bin")
+    cache.put("a", _chips(2, 1))
+    assert cache.get("a")[:, 0, 0, 0].tolist() == [1, 1]
+    mmap = cache._mmap
+    cache.get("a")
+    assert cache._mmap is mmap
+
+    cache.put("b", _chips(1, 7))
+    assert cache.get("b")[0, 0, 0, 0] == 7
+    assert cache._mmap is not mmap
+    assert len(cache._mmap) == 3
+
+
+def test_prune_reopens_compacted_file(tmp_path):
+    cache = ChipCache(tmp_path / "face_chips.bin")
+    cache.put("a", _chips(3, 1))
+    cache.put("b", _chips(1, 2))
+    cache.get("a")
+    cache.prune({"b"})
+    assert cache.count == 1
+    assert cache.get("b")[0, 0, 0, 0] == 2
+    assert "a" not in cache
+
+
+def test_reencode_batches_chips(tmp_path, monkeypatch):
+    train = tmp_path / "train"
+    chips = ChipCache(tmp_path / "face_chips.bin")
+    cache = EncodingCache(tmp_path / "encodings_cache.pkl", chips=chips)
+    for i in range(5):
+        img = train / "ana" / f"{i}.jpg"
+        img.parent.mkdir(parents=True, exist_ok=True)
+        img.write_bytes(bytes([i]))
+        digest = f"sha{i}"
+        # La foto 0 no tiene rostros: no aporta recortes al lote
+        chips.put(digest, _chips(0 if i == 0 else 2, i))
+        cache.entries[f"ana/{i}.jpg"] = {"size": 1, "mtime_ns": 0, "sha1": digest, "boxes": [], "encodings": []}
+
+    calls = []
+
+    def encode(batch, num_jitters=1):
+        calls.append(len(batch))
+        return [np.full(128, chip[0, 0, 0], dtype=np.float64) for chip in batch]
+
+    monkeypatch.setattr(encoding_cache, "REENCODE_BATCH", 4)
+    monkeypatch.setattr(encoding_cache.face_models, "face_encodings_from_chips", encode)
+    report = cache.reencode(train, num_jitters=2)
+
+    assert report == {"from_chips": 5, "from_images": 0, "removed": 0}
+    assert calls == [4, 4]
+    assert cache.num_jitters == 2
+    for i in range(5):
+        encs = cache.entries[f"ana/{i}.jpg"]["encodings"]
+        assert encs.shape == (0 if i == 0 else 2, 128)
+        assert np.all(encs == i)
+
+
+def test_chip_journal_replays_and_stops_at_truncated_line(tmp_path):
+    path = tmp_path / "face_chips.bin"
+    cache = ChipCache(path)
+    for i, digest in enumerate("abcdef"):
+        cache.put(digest, _chips(1, i))
+    cache.save(full=True)
+    cache.put("g", _chips(2, 9))
+    cache.save()
+    cache.put("h", _chips(1, 10))
+    cache.save()
+    assert cache.journal_count == 2
+
+    reloaded = ChipCache(path)
+    assert len(reloaded) == 8
+    assert reloaded.get("g")[:, 0, 0, 0].tolist() == [9, 9]
+
+    lines = cache.journal_path.read_text(encoding="utf-8")
+    cache.journal_path.write_text(lines[:-5], encoding="utf-8")
+    truncated = ChipCache(path)
+    assert "g" in truncated and "h" not in truncated
+    assert truncated._journal_broken
+    # La fila de "h" que quedó tras `count` se sobrescribe con el siguiente alta
+    truncated.put("i", _chips(1, 11))
+    truncated.save()
+    assert not truncated.journal_path.exists()
+    assert ChipCache(path).get("i")[0, 0, 0, 0] == 11
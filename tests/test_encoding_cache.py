@@ -0,0 +1,77 @@
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from encoding_cache import EncodingCache  # noqa: E402
+
+
+def _entry(i):
+    return {"size": i, "mtime_ns": i, "sha1": f"sha{i}", "boxes": [(0, 1, 1, 0)],
+            "encodings": np.full((1, 128), i, dtype=np.float32)}
+
+
+def _saved_cache(path, n=6):
+    cache = EncodingCache(path)
+    for i in range(n):
+        cache.entries[f"ana/{i}.jpg"] = _entry(i)
+    cache.save()
+    return cache
+
+
+def test_journal_replays_after_crash(tmp_path):
+    path = tmp_path / "encodings_cache.pkl"
+    cache = _saved_cache(path)
+    pickled = path.read_bytes()
+    for i in (6, 7):
+        cache.entries[f"ana/{i}.jpg"] = _entry(i)
+        cache._append([f"ana/{i}.jpg"])
+    # El alta solo escribió el diario: el pickle sigue como estaba
+    assert path.read_bytes() == pickled
+    assert cache.journal_path.exists()
+
+    # Sin cerrar nada (un corte de luz): el siguiente arranque lee pickle + diario
+    reloaded = EncodingCache(path)
+    assert len(reloaded.entries) == 8
+    assert reloaded.journal_count == 2
+    assert reloaded.entries["ana/7.jpg"]["encodings"][0, 0] == 7
+
+
+def test_truncated_journal_keeps_complete_records(tmp_path):
+    path = tmp_path / "encodings_cache.pkl"
+    cache = _saved_cache(path)
+    for i in (6, 7):
+        cache.entries[f"ana/{i}.jpg"] = _entry(i)
+        cache._append([f"ana/{i}.jpg"])
+    data = cache.journal_path.read_bytes()
+    cache.journal_path.write_bytes(data[:-40])  # el último registro quedó a medias
+
+    reloaded = EncodingCache(path)
+    assert "ana/6.jpg" in reloaded.entries
+    assert "ana/7.jpg" not in reloaded.entries
+    assert reloaded._journal_broken
+
+    # No se añade detrás de la basura: el siguiente alta reescribe el pickle
+    reloaded.entries["ana/8.jpg"] = _entry(8)
+    reloaded._append(["ana/8.jpg"])
+    assert not reloaded.journal_path.exists()
+    with open(path, "rb") as f:
+        assert set(pickle.load(f)["entries"]) == {f"ana/{i}.jpg" for i in (0, 1, 2, 3, 4, 5, 6, 8)}
+    assert len(EncodingCache(path).entries) == 8
+
+
+def test_journal_with_other_num_jitters_is_ignored(tmp_path):
+    path = tmp_path / "encodings_cache.pkl"
+    cache = _saved_cache(path)
+    cache.entries["ana/6.jpg"] = _entry(6)
+    cache._append(["ana/6.jpg"])
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    data["num_jitters"] = 10
+    with open(path, "wb") as f:
+        pickle.dump(data, f)
+    # El diario se escribió con num_jitters=1: sus encodings no valen
+    assert "ana/6.jpg" not in EncodingCache(path).entries
@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import gallery as gallery_store  # noqa: E402
+from gallery import Gallery  # noqa: E402
+
+
+def _rows(n, seed):
+    return np.random.default_rng(seed).normal(0, 0.1, size=(n, 128)).astype(np.float32)
+
+
+def _saved(path, n=6):
+    Gallery.from_lists(_rows(n, 0), ["ana", "beto"] * (n // 2)).save(path)
+    return Gallery.open(path)
+
+
+def test_append_segment_writes_only_new_rows(tmp_path):
+    base = _saved(tmp_path)
+    new = _rows(3, 1)
+    grown = base.append(new, ["carla"] * 3)
+    assert gallery_store.append_segment(tmp_path, grown, len(base)) == 2
+
+    reopened = Gallery.open(tmp_path)
+    assert len(reopened) == 9
+    np.testing.assert_array_equal(reopened.encodings[6:], new)
+    assert reopened.row_names()[6:] == ["carla"] * 3
+    assert [count for _, count, _ in gallery_store.segment_info(tmp_path)["segments"]] == [6, 3]
+    # Otro proceso ya añadió filas: `start` no coincide y no se escribe nada
+    with pytest.raises(ValueError):
+        gallery_store.append_segment(tmp_path, grown, len(base))
+
+
+def test_delete_identity_applies_tombstones(tmp_path):
+    base = _saved(tmp_path)
+    gallery_store.append_segment(tmp_path, base.append(_rows(2, 1), ["ana", "carla"]), len(base))
+
+    assert gallery_store.delete_identity(tmp_path, "ana") == 4
+    assert gallery_store.delete_identity(tmp_path, "nadie") == 0
+    reopened = Gallery.open(tmp_path)
+    assert sorted(set(reopened.row_names())) == ["beto", "carla"]
+    assert len(reopened) == 4
+    assert sorted(tmp_path.glob("tomb_*.npy"))
+
+    assert gallery_store.compact_segments(tmp_path)
+    info = gallery_store.segment_info(tmp_path)
+    assert info["count"] == 4 and len(info["segments"]) == 1 and info["segments"][0][2] == 0
+    assert not list(tmp_path.glob("tomb_*"))
+    assert sorted(set(Gallery.open(tmp_path).row_names())) == ["beto", "carla"]
+
+
+def test_compaction_keeps_open_readers_valid(tmp_path):
+    reader = _saved(tmp_path)
+    assert isinstance(reader.encodings, np.memmap)
+    before = np.array(reader.encodings)
+    gallery_store.append_segment(tmp_path, reader.append(_rows(2, 1), ["carla"] * 2), len(reader))
+    old_segment = gallery_store.segment_info(tmp_path)["segments"][0][0]
+
+    assert gallery_store.compact_segments(tmp_path)
+    assert not (tmp_path / old_segment).exists()
+    # El lector sigue viendo su foto: el segmento borrado sigue mapeado
+    np.testing.assert_array_equal(reader.encodings, before)
+    compacted = Gallery.open(tmp_path)
+    assert len(compacted) == 8
+    np.testing.assert_array_equal(compacted.encodings[:6], before)
+
+
+def test_cleanup_only_removes_generated_files(tmp_path):
+    Gallery.from_lists(_rows(4, 0), ["ana"] * 4).save(tmp_path)
+    live = gallery_store.segment_info(tmp_path)["segments"][0][0]
+    keep = ["ivf.json", "ivf_centroids.npy", "notas.npy", "seg_backup.npy", "tomb_extra.npy"]
+    for name in keep:
+        (tmp_path / name).write_bytes(b"x")
+    (tmp_path / "seg_mios").mkdir()
+    # Restos de escrituras cortadas y del formato v1
+    drop = ["seg_000099.tmp", "seg_000098", "tomb_000097.npy", "tomb_000096.tmp.npy", "header.json", "encodings.npy"]
+    (tmp_path / "seg_000099.tmp").mkdir()
+    (tmp_path / "seg_000098").mkdir()
+    for name in drop[2:]:
+        (tmp_path / name).write_bytes(b"x")
+
+    gallery_store.compact_segments(tmp_path)  # un segmento sin lápidas: no compacta
+    gallery_store.delete_identity(tmp_path, "nadie")  # no borra nada: no limpia
+    Gallery.open(tmp_path).save(tmp_path)  # guardado completo: limpia
+
+    names = {p.name for p in tmp_path.iterdir()}
+    assert set(keep) | {"seg_mios", "manifest.json"} <= names
+    assert not names & set(drop)
+    assert live not in names  # el segmento anterior quedó reemplazado
+    assert len(Gallery.open(tmp_path)) == 4
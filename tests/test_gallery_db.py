@@ -0,0 +1,126 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import gallery_db  # noqa: E402
+from gallery_db import GalleryDB  # noqa: E402
+
+
+class RecordingEncoder:
+    """Encoder falso: un rostro por imagen con el primer byte del archivo en el encoding."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, paths):
+        self.calls.append([Path(p).relative_to(p.parent.parent).as_posix() for p in paths])
+        return [([(0, 10, 10, 0)], [np.full(128, Path(p).read_bytes()[0], dtype=np.float32)]) for p in paths]
+
+    @property
+    def encoded(self):
+        return [key for call in self.calls for key in call]
+
+
+def _write(train, key, value):
+    path = train / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes([value]) * 16)
+    return path
+
+
+@pytest.fixture
+def synced(tmp_path):
+    train = tmp_path / "train"
+    for i, key in enumerate(["ana/1.jpg", "ana/2.jpg", "beto/1.jpg"]):
+        _write(train, key, i + 1)
+    db = GalleryDB(tmp_path / "gallery.sqlite3")
+    encoder = RecordingEncoder()
+    db.sync(train, encoder=encoder)
+    assert sorted(encoder.encoded) == ["ana/1.jpg", "ana/2.jpg", "beto/1.jpg"]
+    yield db, train
+    db.close()
+
+
+def _faces(db):
+    gallery = db.load_gallery()
+    return sorted(zip(gallery.row_names(), gallery.encodings[:, 0].astype(int).tolist()))
+
+
+def test_unchanged_tree_encodes_nothing(synced):
+    db, train = synced
+    encoder = RecordingEncoder()
+    db.sync(train, encoder=encoder)
+    assert encoder.calls == []
+    assert _faces(db) == [("ana", 1), ("ana", 2), ("beto", 3)]
+
+
+def test_rename_and_move_keep_faces(synced):
+    db, train = synced
+    (train / "ana" / "2.jpg").rename(train / "ana" / "dos.jpg")
+    (train / "carla").mkdir()
+    (train / "beto" / "1.jpg").rename(train / "carla" / "1.jpg")
+    encoder = RecordingEncoder()
+    db.sync(train, encoder=encoder)
+    assert encoder.encoded == []
+    assert _faces(db) == [("ana", 1), ("ana", 2), ("carla", 3)]
+    # La persona sin imágenes desaparece
+    assert db.info() == {"identities": 2, "images": 3, "faces": 3}
+
+
+def test_touch_updates_stat_without_encoding(synced):
+    db, train = synced
+    path = train / "ana" / "1.jpg"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    encoder = RecordingEncoder()
+    db.sync(train, encoder=encoder)
+    assert encoder.encoded == []
+    mtime = db.conn.execute("SELECT mtime_ns FROM images WHERE path = 'ana/1.jpg'").fetchone()[0]
+    assert mtime == st.st_mtime_ns + 10**9
+
+
+def test_copy_reuses_faces_and_modified_is_encoded(synced):
+    db, train = synced
+    shutil.copyfile(train / "ana" / "1.jpg", train / "beto" / "copia.jpg")
+    # Mismo nombre, contenido nuevo (otro tamaño: no depende de la resolución del mtime)
+    (train / "ana" / "2.jpg").write_bytes(bytes([9]) * 32)
+    encoder = RecordingEncoder()
+    db.sync(train, encoder=encoder)
+    assert encoder.encoded == ["ana/2.jpg"]
+    assert _faces(db) == [("ana", 1), ("ana", 9), ("beto", 1), ("beto", 3)]
+
+
+def test_delete_removes_faces(synced):
+    db, train = synced
+    (train / "ana" / "1.jpg").unlink()
+    encoder = RecordingEncoder()
+    db.sync(train, encoder=encoder)
+    assert encoder.encoded == []
+    assert _faces(db) == [("ana", 2), ("beto", 3)]
+
+
+def test_new_images_are_inserted_in_batches(synced, monkeypatch):
+    db, train = synced
+    for i in range(5):
+        _write(train, f"dani/{i}.jpg", 10 + i)
+    batches = []
+    insert = GalleryDB._insert_images
+
+    def recording_insert(self, items):
+        batches.append([key for key, *_ in items])
+        insert(self, items)
+
+    monkeypatch.setattr(gallery_db, "INSERT_BATCH", 2)
+    monkeypatch.setattr(GalleryDB, "_insert_images", recording_insert)
+    encoder = RecordingEncoder()
+    db.sync(train, encoder=encoder)
+    # Una sola llamada al encoder con solo lo nuevo; se guarda en lotes de 2
+    assert encoder.calls == [[f"dani/{i}.jpg" for i in range(5)]]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert db.info()["faces"] == 8
@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import gallery as gallery_store  # noqa: E402
+from gallery import Gallery  # noqa: E402
+from matcher import FaceMatcher, HierarchicalMatcher, QuantizedMatcher  # noqa: E402
+
+
+def _gallery(rng, people=6, per_person=4):
+    centers = rng.normal(0, 0.1, size=(people, 128))
+    encodings = [c + rng.normal(0, 0.02, size=128) for c in centers for _ in range(per_person)]
+    names = [f"p{i}" for i in range(people) for _ in range(per_person)]
+    return Gallery.from_lists(encodings, names), centers
+
+
+def test_hierarchical_matches_after_delete_identity(tmp_path):
+    rng = np.random.default_rng(0)
+    gallery, centers = _gallery(rng)
+    gallery.save(tmp_path)
+    assert gallery_store.delete_identity(tmp_path, "p2") == 4
+    reopened = Gallery.open(tmp_path)
+    assert "p2" in reopened.names and "p2" not in reopened.row_names()
+
+    # Consultas junto al centroide de la persona borrada y de las demás
+    queries = centers.astype(np.float32)
+    for top_k in (1, 3):
+        hier = HierarchicalMatcher(reopened, top_k=top_k)
+        hier.exact_below = 0  # forzar las dos etapas en una galería pequeña
+        result = hier.match(queries, tolerance=0.5)
+        exact = FaceMatcher(reopened).match(queries, tolerance=0.5)
+        assert np.array_equal(result.indices, exact.indices)
+        assert "p2" not in hier.identify(queries, tolerance=0.5)
+
+
+def test_quantized_matcher_has_base_attributes():
+    rng = np.random.default_rng(1)
+    gallery, centers = _gallery(rng)
+    exact = FaceMatcher(gallery)
+    for kind in ("float16", "int8"):
+        matcher = QuantizedMatcher(gallery, kind)
+        # Solo se retienen códigos, escala y normas: nunca la matriz float32
+        assert matcher.matrix is None
+        assert matcher.nprobe == exact.nprobe and matcher.index is None
+        retained = sum(a.nbytes for a in (matcher.codes, matcher.scale, matcher.sq_norms) if a is not None)
+        assert retained < exact.matrix.nbytes
+        queries = centers.astype(np.float32)
+        np.testing.assert_array_equal(matcher.match(queries, 0.6).indices // 4, np.arange(len(centers)))
+
+
+def test_hierarchical_batch_equals_exact():
+    rng = np.random.default_rng(2)
+    gallery, centers = _gallery(rng, people=40, per_person=6)
+    exact = FaceMatcher(gallery)
+    rows = rng.integers(0, len(gallery), size=64)
+    queries = np.asarray(gallery.encodings[rows], dtype=np.float32) + rng.normal(0, 0.05, size=(64, 128)).astype(np.float32)
+    queries = np.vstack([queries, rng.normal(0, 0.1, size=(8, 128)).astype(np.float32)])
+    expected = exact.match(queries, 0.5)
+    for top_k in (1, 3, 10):
+        matcher = HierarchicalMatcher(gallery, top_k=top_k)
+        matcher.exact_below = 0
+        result = matcher.match(queries, 0.5)
+        np.testing.assert_array_equal(result.indices, expected.indices)
+        np.testing.assert_allclose(result.distances, expected.distances, atol=1e-5)
+        # Un frame entero y consulta a consulta dan lo mismo
+        singles = [matcher.match(q[np.newaxis, :], 0.5).indices[0] for q in queries]
+        np.testing.assert_array_equal(singles, expected.indices)
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from gallery import Gallery  # noqa: E402
+from prototypes import recall_report  # noqa: E402
+
+
+def _two_cluster_gallery(rng, people=4):
+    """Cada persona: 6 fotos de frente y 4 de perfil a 0.6 de distancia."""
+    encodings = []
+    names = []
+    for i in range(people):
+        center = rng.normal(0, 0.3, size=128)
+        offset = rng.normal(0, 1, size=128)
+        offset *= 0.6 / np.linalg.norm(offset)
+        for base, count in ((center, 6), (center + offset, 4)):
+            encodings.extend(base + rng.normal(0, 0.005, size=(count, 128)))
+            names.extend([f"p{i}"] * count)
+    return Gallery.from_lists(encodings, names)
+
+
+def test_compaction_can_lower_recall():
+    gallery = _two_cluster_gallery(np.random.default_rng(0))
+    report = recall_report(gallery, max_per_identity=1, tolerance=0.5)
+    # Con un solo prototipo (de frente) las fotos de perfil dejan de reconocerse;
+    # con la galería completa, aun sin la propia consulta, sí
+    assert report["rows_compact"] == 4
+    assert report["recall_full"] == 1.0
+    assert report["recall_compact"] < 0.8
+
+
+def test_query_row_is_left_out():
+    # Personas con dos fotos muy separadas: sin dejar uno fuera la consulta
+    # se encontraría a sí misma y el recall sería 1.0 por construcción
+    rng = np.random.default_rng(1)
+    encodings = []
+    names = []
+    for i in range(5):
+        center = rng.normal(0, 0.3, size=128)
+        offset = rng.normal(0, 1, size=128)
+        encodings.extend([center, center + offset * 0.8 / np.linalg.norm(offset)])
+        names.extend([f"p{i}"] * 2)
+    gallery = Gallery.from_lists(encodings, names)
+    report = recall_report(gallery, max_per_identity=5, tolerance=0.5)
+    assert report["recall_full"] == 0.0
+    assert report["recall_compact"] == report["recall_full"]
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import scheduler as scheduler_module  # noqa: E402
+from scheduler import AdaptiveScheduler  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run(monkeypatch, camera_fps, render_fps, seconds=10, with_counter=True):
+    """Simula el bucle: la cámara captura a su ritmo y se dibuja a `render_fps`."""
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "perf_counter", clock)
+    sched = AdaptiveScheduler(target_fps=25, detect_every=3, scale=0.4)
+    for _ in range(int(seconds * render_fps)):
+        clock.now += 1.0 / render_fps
+        grabbed = int(clock.now * camera_fps) if with_counter else None
+        sched.tick(grabbed)
+    return sched
+
+
+def test_slow_camera_does_not_degrade(monkeypatch):
+    # Cámara de 15 FPS y bucle con trabajo de sobra: el render va a 15 FPS
+    # porque no hay más frames, no porque falte tiempo
+    sched = _run(monkeypatch, camera_fps=15, render_fps=15)
+    assert abs(sched.source_fps - 15) < 1
+    # Con el objetivo acotado a 15 FPS sobra margen: puede subir, nunca bajar
+    assert sched.scale >= 0.4
+    assert sched.detect_every <= 3
+
+
+def test_slow_render_with_fast_camera_degrades(monkeypatch):
+    # La cámara da 30 FPS y el bucle solo dibuja 15: sí hay que aliviarlo
+    sched = _run(monkeypatch, camera_fps=30, render_fps=15)
+    assert sched.scale < 0.4
+
+
+def test_without_counter_target_is_not_capped(monkeypatch):
+    sched = _run(monkeypatch, camera_fps=15, render_fps=15, with_counter=False)
+    assert sched.effective_target() == 25
+    assert sched.scale < 0.4
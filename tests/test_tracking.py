@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from tracking import FaceTracker  # noqa: E402
+
+BOX = (100, 200, 200, 100)  # top, right, bottom, left
+
+
+def _shift(box, dx):
+    top, right, bottom, left = box
+    return (top, right + dx, bottom, left + dx)
+
+
+def _encode_needed(tracker, tracks, now, distance=0.3):
+    """Simula el worker: codifica solo los tracks que lo piden."""
+    for track in tracks:
+        if tracker.needs_encoding(track, 0.5, now):
+            tracker.update_identity(track, None, 0, distance, now)
+
+
+def test_new_detection_creates_track():
+    tracker = FaceTracker()
+    tracks = tracker.associate([BOX, _shift(BOX, 300)], frame_id=1)
+    assert len(tracker.tracks) == 2
+    assert tracks[0].id != tracks[1].id
+
+
+def test_overlapping_detection_keeps_track():
+    tracker = FaceTracker()
+    first = tracker.associate([BOX], frame_id=1)[0]
+    second = tracker.associate([_shift(BOX, 10)], frame_id=2)[0]
+    assert second is first
+    assert first.box == _shift(BOX, 10)
+    assert len(tracker.tracks) == 1
+
+
+def test_track_expires_after_max_misses():
+    tracker = FaceTracker(max_misses=2)
+    tracker.associate([BOX], frame_id=1)
+    for frame_id in range(2, 4):
+        tracker.associate([], frame_id=frame_id)
+        assert len(tracker.tracks) == 1 and tracker.lost()
+    tracker.associate([], frame_id=4)
+    assert tracker.tracks == []
+
+
+def test_encoder_runs_once_per_track_by_default():
+    tracker = FaceTracker()
+    for frame_id in range(1, 200):
+        tracks = tracker.associate([BOX], frame_id=frame_id)
+        _encode_needed(tracker, tracks, now=frame_id * 0.1, distance=0.48)
+    assert tracker.encoder_calls == 1
+    # Perder el rostro y volver a verlo es un track nuevo: se codifica otra vez
+    for frame_id in range(200, 205):
+        tracker.associate([], frame_id=frame_id)
+    tracks = tracker.associate([BOX], frame_id=205)
+    _encode_needed(tracker, tracks, now=20.5)
+    assert tracker.encoder_calls == 2
+
+
+def test_reverify_is_opt_in():
+    tracker = FaceTracker(reverify_sec=2.0, low_confidence_sec=0.5)
+    for frame_id in range(1, 101):  # 10 s a 10 detecciones/s
+        tracks = tracker.associate([BOX], frame_id=frame_id)
+        _encode_needed(tracker, tracks, now=frame_id * 0.1)
+    assert tracker.encoder_calls == 5
+
+
+def test_boxes_are_predicted_between_detections():
+    tracker = FaceTracker()
+    # Detección cada 3 frames con el rostro moviéndose 10 px por frame
+    for frame_id in (3, 6, 9, 12):
+        track = tracker.associate([_shift(BOX, 10 * frame_id)], frame_id=frame_id)[0]
+    assert track.predict(14) == _shift(BOX, 140)
+    # Tras una detección retrasada (6 frames, 90 px) la caja vieja ya no se
+    # solapa lo suficiente, pero la prevista sí
+    fast = FaceTracker()
+    for frame_id in (3, 6, 9):
+        fast_track = fast.associate([_shift(BOX, 15 * frame_id)], frame_id=frame_id)[0]
+    assert fast.associate([_shift(BOX, 15 * 15)], frame_id=15)[0] is fast_track
+    assert len(fast.tracks) == 1
+
+
+def test_result_boxes_follow_track_velocity():
+    from async_recognizer import RecognitionResult
+
+    result = RecognitionResult(10, (480, 640), [BOX], ["p"], [None], 0.0, velocities=[(0, 10, 0, 10)])
+    assert result.boxes_for((480, 640)) == [BOX]
+    assert result.boxes_for((480, 640), frame_id=12) == [_shift(BOX, 20)]
+    # Reescalado después de extrapolar
+    assert result.boxes_for((240, 320), frame_id=12) == [(50, 110, 100, 60)]